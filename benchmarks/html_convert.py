@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Compare the speed of converting the lines of the side-by-side HTML diff of
+the disassembly of two binaries with convert_lines() (as the HTML presenter
+does) and with the character-by-character convert() it replaced. Two builds
+of the same library make a typical input:
+
+    PYTHONPATH=. python3 benchmarks/html_convert.py \\
+        /usr/lib/x86_64-linux-gnu/libz.so.1 /some/other/build/libz.so.1
+"""
+
+import io
+import sys
+import html
+import time
+import argparse
+import subprocess
+
+from diffoscope.diff import SideBySideDiff, DIFFON, DIFFOFF
+from diffoscope.difference import Difference
+from diffoscope.presenters.html.html import convert_lines, LINESIZE, \
+    TABSIZE, WORDBREAK, CONVERT_BATCH
+
+
+def convert_per_character(s, ponct=0, tag=''):
+    i = 0
+    t = io.StringIO()
+    for c in s:
+        # used by diffs
+        if c == DIFFON:
+            t.write('<%s>' % tag)
+        elif c == DIFFOFF:
+            t.write('</%s>' % tag)
+
+        # special highlighted chars
+        elif c == "\t" and ponct == 1:
+            n = TABSIZE - (i % TABSIZE)
+            if n == 0:
+                n = TABSIZE
+            t.write('<span class="diffponct">\xbb</span>'+'\xa0'*(n-1))
+        elif c == " " and ponct == 1:
+            t.write('<span class="diffponct">\xb7</span>')
+        elif c == "\n" and ponct == 1:
+            t.write('<br/><span class="diffponct">\\</span>')
+        elif ord(c) < 32:
+            conv = u"\\x%x" % ord(c)
+            t.write('<em>%s</em>' % conv)
+            i += len(conv)
+        else:
+            t.write(html.escape(c))
+            i += 1
+
+        if WORDBREAK.count(c) == 1:
+            t.write('\u200b')
+            i = 0
+        if i > LINESIZE:
+            i = 0
+            t.write('\u200b')
+
+    return t.getvalue()
+
+
+def disassemble(path):
+    return subprocess.check_output(
+        ['objdump', '-d', path],
+        universal_newlines=True,
+    )
+
+
+def per_character(lines):
+    for tag, batch in lines:
+        for s in batch:
+            convert_per_character(s, 1, tag)
+
+
+def batched(lines):
+    for tag, batch in lines:
+        convert_lines(batch, 1, tag)
+
+
+def measure(fn, lines, iterations):
+    best = float('inf')
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(lines)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('binary1')
+    parser.add_argument('binary2')
+    parser.add_argument('--iterations', type=int, default=3)
+    args = parser.parse_args()
+
+    difference = Difference.from_text(
+        disassemble(args.binary1),
+        disassemble(args.binary2),
+        args.binary1,
+        args.binary2,
+    )
+    if difference is None:
+        sys.exit("The disassemblies do not differ")
+
+    # Group the lines of each side like side_by_side_rows() does.
+    items = [
+        args for t, args in SideBySideDiff(difference.unified_diff).items()
+        if t == 'L'
+    ]
+    lines = []
+    for k in range(0, len(items), CONVERT_BATCH):
+        for tag, side in (('del', 1), ('ins', 3)):
+            lines.append((tag, [x[side] or '' for x in items[k:k + CONVERT_BATCH]]))
+
+    for tag, batch in lines:
+        assert convert_lines(batch, 1, tag) == \
+            [convert_per_character(s, 1, tag) for s in batch]
+    print("Lines: {} ({} characters)".format(
+        len(items),
+        sum(len(s) for _, batch in lines for s in batch),
+    ))
+
+    before = measure(per_character, lines, args.iterations)
+    after = measure(batched, lines, args.iterations)
+    print("per character: {:8.3f} ms".format(before * 1000))
+    print("convert_lines: {:8.3f} ms".format(after * 1000))
+    print("speedup:       {:8.1f}x".format(before / after))
+
+
+if __name__ == '__main__':
+    main()
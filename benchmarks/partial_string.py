@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Time how long it takes to compose an HTML page the way the HTML presenter
+does, ie. one PartialString with a hole for each child node that is then
+filled with the output of that child, for a growing number of children.
+The time per child should stay about the same.
+
+    PYTHONPATH=. python3 benchmarks/partial_string.py --children 4000
+"""
+
+import time
+import argparse
+
+from diffoscope.presenters.utils import PartialString
+
+
+def node_output(children, size):
+    # Mimics diffoscope.presenters.html.html.output_node
+    t, cont = PartialString.cont()
+    t = cont(t, PartialString.numl(
+        "<div>{0}</div>\n{-1}", 1, cont,
+    ).pformatl("x" * size))
+    for child in children:
+        t = cont(t, PartialString.numl(
+            '<div class="difference">\n{0}</div>\n{-1}', 1, cont,
+        ).pformatl(PartialString.of(child)))
+    return cont(t, "")
+
+
+def compose(n, size):
+    children = [object() for _ in range(n)]
+    page = node_output(children, size).frame("<html>\n", "</html>\n")
+    for child in children:
+        page = page.pformat({child: node_output((), size)})
+    return page.format()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--children', type=int, default=4000)
+    parser.add_argument('--size', type=int, default=2000,
+                        help="Size of the output of each child")
+    args = parser.parse_args()
+
+    n = args.children // 8
+    while n <= args.children:
+        start = time.perf_counter()
+        out = compose(n, args.size)
+        elapsed = time.perf_counter() - start
+        print("{:6d} children, {:6.1f} MB: {:8.3f} s ({:.1f} us per child)".format(
+            n,
+            len(out) / 1e6,
+            elapsed,
+            elapsed / n * 1e6,
+        ))
+        n *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -22,6 +22,7 @@ import os.path
 import logging
 import subprocess
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 from diffoscope.tempfiles import get_temporary_directory
 from diffoscope.difference import Difference
@@ -52,7 +53,7 @@ class ApkContainer(Archive):
 
         logger.debug("Extracting %s to %s", self.source.name, self._unpacked)
 
-        subprocess.check_call((
+        scheduler.check_call((
             'apktool', 'd', '-k', '-m', '-o', self._unpacked, self.source.path,
         ), shell=False, stderr=None, stdout=subprocess.PIPE)
 
@@ -22,6 +22,7 @@ import os.path
 import logging
 import subprocess
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 
 from .utils.file import File
@@ -45,7 +46,7 @@ class Bzip2Container(Archive):
         dest_path = self.get_path_name(dest_dir)
         logger.debug('bzip2 extracting to %s', dest_path)
         with open(dest_path, 'wb') as fp:
-            subprocess.check_call(
+            scheduler.check_call(
                 ["bzip2", "--decompress", "--stdout", self.source.path],
                 shell=False, stdout=fp, stderr=subprocess.PIPE)
         return dest_path
@@ -24,6 +24,7 @@ import struct
 import logging
 import subprocess
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 from diffoscope.difference import Difference
 
@@ -51,7 +52,7 @@ class CbfsContainer(Archive):
     @tool_required('cbfstool')
     def entries(self, path):
         cmd = ['cbfstool', path, 'print']
-        output = subprocess.check_output(cmd, shell=False).decode('utf-8')
+        output = scheduler.check_output(cmd, shell=False).decode('utf-8')
         header = True
         for line in output.rstrip('\n').split('\n'):
             if header:
@@ -77,7 +78,7 @@ class CbfsContainer(Archive):
         dest_path = os.path.join(dest_dir, os.path.basename(member_name))
         cmd = ['cbfstool', self.source.path, 'extract', '-n', member_name, '-f', dest_path]
         logger.debug("cbfstool extract %s to %s", member_name, dest_path)
-        subprocess.check_call(cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        scheduler.check_call(cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
         return dest_path
 
 
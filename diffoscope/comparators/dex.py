@@ -22,6 +22,7 @@ import os.path
 import logging
 import subprocess
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 
 from .utils.file import File
@@ -48,7 +49,7 @@ class DexContainer(Archive):
     def extract(self, member_name, dest_dir):
         dest_path = os.path.join(dest_dir, member_name)
         logger.debug('dex extracting to %s', dest_path)
-        subprocess.check_call(['enjarify', '-o', dest_path, self.source.path],
+        scheduler.check_call(['enjarify', '-o', dest_path, self.source.path],
                               shell=False, stderr=None, stdout=subprocess.PIPE)
         return dest_path
 
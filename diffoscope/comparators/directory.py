@@ -24,10 +24,12 @@ import subprocess
 import collections
 import itertools
 
+from diffoscope import scheduler
 from diffoscope.exc import RequiredToolNotFound
 from diffoscope.tools import tool_required
 from diffoscope.config import Config
 from diffoscope.progress import Progress
+from diffoscope.streaming import Stream
 from diffoscope.difference import Difference
 
 from .binary import FilesystemFile
@@ -87,7 +89,7 @@ def lsattr(path):
     """
 
     try:
-        output = subprocess.check_output(
+        output = scheduler.check_output(
             ['lsattr', '-d', path],
             shell=False,
             stderr=subprocess.STDOUT,
@@ -182,27 +184,28 @@ class FilesystemDirectory(Directory):
 
     def compare(self, other, source=None):
         differences = []
+        difference = Difference(None, self.path, other.path, source)
 
-        listing_diff = Difference.from_text(
-            '\n'.join(list_files(self.path)),
-            '\n'.join(list_files(other.path)),
-            self.path,
-            other.path,
-            source='file list',
-        )
-        if listing_diff:
-            differences.append(listing_diff)
+        with Stream(difference) as stream:
+            listing_diff = Difference.from_text(
+                '\n'.join(list_files(self.path)),
+                '\n'.join(list_files(other.path)),
+                self.path,
+                other.path,
+                source='file list',
+            )
+            if listing_diff:
+                differences.append(stream.add(listing_diff))
 
-        differences.extend(compare_meta(self.name, other.name))
+            differences.extend(map(stream.add, compare_meta(self.name, other.name)))
 
-        my_container = DirectoryContainer(self)
-        other_container = DirectoryContainer(other)
-        differences.extend(my_container.compare(other_container))
+            my_container = DirectoryContainer(self)
+            other_container = DirectoryContainer(other)
+            differences.extend(map(stream.add, my_container.compare(other_container)))
 
         if not differences:
             return None
 
-        difference = Difference(None, self.path, other.path, source)
         difference.add_details(differences)
         return difference
 
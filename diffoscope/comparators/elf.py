@@ -20,11 +20,15 @@
 import os
 import re
 import logging
+import hashlib
 import subprocess
 import collections
 
-from diffoscope.exc import OutputParsingError
+from diffoscope import feeders, executor, scheduler
+from diffoscope.exc import ContainerExtractionError
+from diffoscope.config import Config
 from diffoscope.tools import get_tool_name, tool_required
+from diffoscope.excludes import command_excluded
 from diffoscope.tempfiles import get_named_temporary_file
 from diffoscope.difference import Difference
 
@@ -32,8 +36,14 @@ from .deb import DebFile, get_build_id_map
 from .utils.file import File
 from .utils.command import Command
 from .utils.container import Container
+from .utils.disassembly import compare_disassembly_shards
+from .utils.elfreader import ElfFormatError, open_elf
 from .utils.libarchive import list_libarchive
 
+# Average size of an instruction, used to estimate how many lines the
+# disassembly of a code section will have.
+DISASSEMBLY_BYTES_PER_LINE = 4
+
 DEBUG_SECTION_GROUPS = (
     'rawline',
     'info',
@@ -55,6 +65,12 @@ logger = logging.getLogger(__name__)
 
 
 class Readelf(Command):
+    # Matches the first non-blank line this command can output, and how many
+    # blank lines precede it; used to split the output of ReadelfCombined.
+    # None means it cannot be combined.
+    OUTPUT_START_RE = None
+    OUTPUT_LEADING_BLANK_LINES = 1
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # we don't care about the name of the archive
@@ -87,16 +103,27 @@ class ReadelfFileHeader(Readelf):
 
 
 class ReadelfProgramHeader(Readelf):
+    OUTPUT_START_RE = re.compile(
+        rb'^(Elf file type is |There are no program headers)',
+    )
+
     def readelf_options(self):
         return ['--program-header']
 
 
 class ReadelfSections(Readelf):
+    OUTPUT_START_RE = re.compile(rb'^There are (no|\d+) section')
+    OUTPUT_LEADING_BLANK_LINES = 0
+
     def readelf_options(self):
         return ['--sections']
 
 
 class ReadelfSymbols(Readelf):
+    OUTPUT_START_RE = re.compile(
+        rb"^(Symbol table '|Dynamic symbol information is not available)",
+    )
+
     def readelf_options(self):
         return ['--symbols']
 
@@ -106,6 +133,10 @@ class ReadelfSymbols(Readelf):
 
 
 class ReadelfRelocs(Readelf):
+    OUTPUT_START_RE = re.compile(
+        rb"^(Relocation section '|There are no (dynamic )?relocations)",
+    )
+
     def readelf_options(self):
         return ['--relocs']
 
@@ -115,6 +146,10 @@ class ReadelfRelocs(Readelf):
 
 
 class ReadelfDynamic(Readelf):
+    OUTPUT_START_RE = re.compile(
+        rb'^(Dynamic section at offset|There is no dynamic section)',
+    )
+
     def readelf_options(self):
         return ['--dynamic']
 
@@ -124,6 +159,8 @@ class ReadelfDynamic(Readelf):
 
 
 class ReadelfNotes(Readelf):
+    OUTPUT_START_RE = re.compile(rb'^Displaying notes found')
+
     def readelf_options(self):
         return ['--notes']
 
@@ -133,6 +170,11 @@ class ReadelfNotes(Readelf):
 
 
 class RedaelfVersionInfo(Readelf):
+    OUTPUT_START_RE = re.compile(
+        rb"^(Version (symbols|definition|needs) section '|"
+        rb"No version information found)",
+    )
+
     def readelf_options(self):
         return ['--version-info']
 
@@ -162,12 +204,77 @@ READELF_DEBUG_DUMP_COMMANDS = [
     for x in DEBUG_SECTION_GROUPS
 ]
 
+# Unlike the other groups, this one also dumps .eh_frame which is present in
+# almost every ELF file, debug symbols or not.
+ReadelfDebugDumpFrames = READELF_DEBUG_DUMP_COMMANDS[
+    DEBUG_SECTION_GROUPS.index('frames')
+]
+ReadelfDebugDumpFrames.OUTPUT_START_RE = re.compile(
+    rb'^Contents of the \.(eh_frame|z?debug_frame) section',
+)
+ReadelfDebugDumpFrames.OUTPUT_LEADING_BLANK_LINES = 0
+
+
+class ReadelfCombined(Readelf):
+    """
+    Run several Readelf commands in a single readelf process.
+
+    readelf prints the output of each option in a fixed order, regardless of
+    the order they were given in, so `commands` must be listed in that order
+    for split_output() to attribute each line to the right command.
+    """
+
+    def __init__(self, path, commands, *args, **kwargs):
+        self._commands = commands
+        super().__init__(path, *args, **kwargs)
+
+    def readelf_options(self):
+        return [y for x in self._commands for y in x(self.path).readelf_options()]
+
+    def split_output(self, lines, out_files):
+        """
+        Write the output each command would have produced on its own to the
+        matching file of `out_files` while reading `lines`. Returns False if
+        the output does not look as expected.
+        """
+        current = None
+        blanks = []
+        for line in lines:
+            if not line.strip():
+                blanks.append(line)
+                continue
+            for x, command in enumerate(self._commands):
+                if x != current and command.OUTPUT_START_RE.match(line):
+                    if current is not None and x < current:
+                        return False
+                    # Blank lines between the output of two commands may
+                    # belong to either of them.
+                    leading = command.OUTPUT_LEADING_BLANK_LINES
+                    if len(blanks) < leading or \
+                            (current is None and len(blanks) != leading):
+                        return False
+                    if current is not None:
+                        out_files[current].writelines(blanks[:len(blanks) - leading])
+                    blanks = blanks[len(blanks) - leading:]
+                    current = x
+                    break
+            if current is None:
+                return False
+            out_files[current].writelines(blanks)
+            out_files[current].write(line)
+            blanks = []
+        if current is not None:
+            out_files[current].writelines(blanks)
+        for x in out_files:
+            x.flush()
+        return True
+
 
 class ReadElfSection(Readelf):
     @staticmethod
     def base_options():
         if not hasattr(ReadElfSection, '_base_options'):
-            output = subprocess.check_output(
+            output = scheduler.check_output(
                 [get_tool_name('readelf'), '--help'],
                 shell=False,
                 stderr=subprocess.DEVNULL,
@@ -258,12 +365,123 @@ READELF_COMMANDS = (
 )
 
 
+# Commands that can be run with ReadelfCombined, in the order readelf outputs
+# them. --file-header is left out as it changes the output of --sections and
+# --program-header.
+READELF_COMBINED_COMMANDS = (
+    ReadelfSections,
+    ReadelfProgramHeader,
+    ReadelfDynamic,
+    ReadelfRelocs,
+    ReadelfSymbols,
+    RedaelfVersionInfo,
+    ReadelfDebugDumpFrames,
+    ReadelfNotes,
+)
+
+
 def _compare_elf_data(path1, path2):
-    return [
-        Difference.from_command(x, path1, path2)
+    return Difference.from_commands(
+        (x, path1, path2)
         for x in list(READELF_COMMANDS) + READELF_DEBUG_DUMP_COMMANDS
+    )
+
+
+def _has_debug_sections(sections_output):
+    with open(sections_output.name, 'rb') as f:
+        return any(
+            re.match(rb'\s*\[\s*\d+\]\s+\.(z?debug|gdb_index|trace_)', x)
+            for x in f
+        )
+
+
+def _read_lines(path):
+    with open(path, 'rb') as f:
+        yield from f
+
+
+def _run_readelf_combined(path, commands):
+    """
+    Return a feeder per command and the temporary files they read from, or
+    None if the output of a combined readelf cannot be used.
+    """
+    if path == '/dev/null':
+        return [feeders.empty() for _ in commands], []
+
+    # The output is split into a file per command as it is read, as it can
+    # be large (eg. symbols or relocations).
+    outputs = [get_named_temporary_file() for _ in commands]
+    command = ReadelfCombined(path, commands)
+    command.start()
+    try:
+        split = command.split_output(command.stdout, outputs)
+    except:  # noqa
+        command.terminate()
+        command.wait()
+        raise
+    if not split:
+        command.terminate()
+    returncode = command.wait()
+    command.stdout.close()
+    if not split or returncode != 0 or command.stderr_content:
+        # Leave it to the individual commands to report any problem
+        return None, None
+
+    return [
+        feeders.from_raw_reader(_read_lines(x.name), command.filter)
+        for x in outputs
+    ], outputs
+
+
+def _compare_elf_data_combined(path1, path2):
+    """
+    Like _compare_elf_data() but with two readelf processes per file instead
+    of one per command: --file-header on its own, and the rest of
+    READELF_COMBINED_COMMANDS together. The debug dump groups other than
+    frames are only run separately if there are debug sections at all;
+    otherwise their output would be empty.
+    """
+    commands = [
+        x for x in READELF_COMBINED_COMMANDS
+        if not command_excluded(x(path1).shell_cmdline())
     ]
 
+    run1 = executor.submit(_run_readelf_combined, path1, commands)
+    feeders2, outputs2 = _run_readelf_combined(path2, commands)
+    feeders1, outputs1 = run1.result()
+    if feeders1 is None or feeders2 is None:
+        return _compare_elf_data(path1, path2)
+
+    differences = dict(zip(commands, executor.run_all(
+        (
+            Difference.from_feeder,
+            (feeder1, feeder2, path1, path2),
+            {'source': klass(path1).shell_cmdline()},
+        )
+        for klass, feeder1, feeder2 in zip(commands, feeders1, feeders2)
+    )))
+
+    has_debug_sections = ReadelfSections not in commands or any(
+        _has_debug_sections(x[commands.index(ReadelfSections)])
+        for x in (outputs1, outputs2) if x
+    )
+
+    # Keep the same order as _compare_elf_data()
+    order = []
+    for klass in list(READELF_COMMANDS) + READELF_DEBUG_DUMP_COMMANDS:
+        if klass in READELF_COMBINED_COMMANDS:
+            # Either done above or excluded
+            differences.setdefault(klass, None)
+        elif klass in READELF_DEBUG_DUMP_COMMANDS and not has_debug_sections:
+            continue
+        order.append(klass)
+
+    remaining = [x for x in order if x not in differences]
+    differences.update(zip(remaining, Difference.from_commands(
+        (x, path1, path2) for x in remaining
+    )))
+    return [differences[x] for x in order]
+
 
 def _should_skip_section(name, type):
     for x in READELF_COMMANDS:
@@ -277,7 +495,22 @@ def _should_skip_section(name, type):
     return False
 
 
+# Sections whose contents change the disassembly of code sections: symbols
+# and their names, relocations and debugging information.
+CONTEXT_SECTION_TYPES = {
+    'SYMTAB', 'DYNSYM', 'STRTAB', 'REL', 'RELA', 'VERSYM', 'VERNEED',
+}
+CONTEXT_SECTION_PREFIXES = ('.debug', '.zdebug')
+
+# Without debugging information of their own, objdump looks for it in
+# separate files using the build ID and .gnu_debuglink.
+CONTEXT_SEPARATE_DEBUG_TYPES = {'NOTE'}
+CONTEXT_SEPARATE_DEBUG_NAMES = {'.gnu_debuglink'}
+
+
 class ElfSection(File):
+    FINGERPRINT_INCLUDES_CONTEXT = False
+
     def __init__(self, elf_container, member_name):
         super().__init__(container=elf_container)
         self._name = member_name
@@ -297,6 +530,10 @@ class ElfSection(File):
     def path(self):
         return self.container.source.path
 
+    @property
+    def section_size(self):
+        return self.container.section_sizes[self._name]
+
     def cleanup(self):
         pass
 
@@ -309,9 +546,17 @@ class ElfSection(File):
     def is_device(self):
         return False
 
+    @property
+    def fingerprint(self):
+        return self.container.section_fingerprint(self)
+
     def has_same_content_as(self, other):
-        # Always force diff of the section
-        return False
+        # Only skip the comparison when everything the output of the section
+        # comparison depends on is known to be identical.
+        if not isinstance(other, ElfSection):
+            return False
+        fingerprint = self.fingerprint
+        return fingerprint is not None and fingerprint == other.fingerprint
 
     @property
     def fuzzy_hash(self):
@@ -332,28 +577,54 @@ class ElfSection(File):
 
 
 class ElfCodeSection(ElfSection):
+    # The disassembly also depends on the symbols, relocations and debugging
+    # information (for line numbers) found elsewhere in the file.
+    FINGERPRINT_INCLUDES_CONTEXT = True
+
     def compare(self, other, source=None):
         # Normally disassemble with line numbers, but if the command is
         # excluded, fallback to disassembly, and if that is also excluded,
         # fallback to a hexdump.
-        diff, excluded = Difference.from_command_exc(
+        diff, excluded = self._compare_disassembly(
             ObjdumpDisassembleSection,
-            self.path,
-            other.path,
-            command_args=[self._name],
+            other,
         )
         if not excluded:
             return diff
-        diff, excluded = Difference.from_command_exc(
+        diff, excluded = self._compare_disassembly(
             ObjdumpDisassembleSectionNoLineNumbers,
-            self.path,
-            other.path,
-            command_args=[self._name],
+            other,
         )
         if not excluded:
             return diff
         return super().compare(other, source)
 
+    def _should_shard(self, other):
+        # The whole disassembly would likely get close to the limit of what
+        # we can diff, so compare it function by function instead.
+        if '/dev/null' in (self.path, other.path):
+            return False
+        size = max(self.section_size, other.section_size)
+        estimated_lines = size // DISASSEMBLY_BYTES_PER_LINE
+        return estimated_lines * 2 >= Config().max_diff_input_lines
+
+    def _compare_disassembly(self, klass, other):
+        if not self._should_shard(other):
+            return Difference.from_command_exc(
+                klass,
+                self.path,
+                other.path,
+                command_args=[self._name],
+            )
+        if command_excluded(klass(self.path, self._name).shell_cmdline()):
+            return None, True
+        return compare_disassembly_shards(
+            klass,
+            self.path,
+            other.path,
+            [self._name],
+        ), False
+
 
 class ElfStringSection(ElfSection):
     def compare(self, other, source=None):
@@ -365,41 +636,23 @@ class ElfStringSection(ElfSection):
         )
 
 
-@tool_required('readelf')
 def get_build_id(path):
     try:
-        output = subprocess.check_output(
-            [get_tool_name('readelf'), '--notes', path],
-            stderr=subprocess.DEVNULL,
-        )
-    except subprocess.CalledProcessError as e:
+        with open_elf(path) as elf:
+            return elf.build_id()
+    except (OSError, ElfFormatError) as e:
         logger.debug("Unable to get Build ID for %s: %s", path, e)
         return None
 
-    m = re.search(r'^\s+Build ID: ([0-9a-f]+)$', output.decode('utf-8'), flags=re.MULTILINE)
-    if not m:
-        return None
-
-    return m.group(1)
-
 
-@tool_required('readelf')
 def get_debug_link(path):
     try:
-        output = subprocess.check_output(
-            [get_tool_name('readelf'), '--string-dump=.gnu_debuglink', path],
-            stderr=subprocess.DEVNULL,
-        )
-    except subprocess.CalledProcessError as e:
-        logger.debug("Unable to get Build Id for %s: %s", path, e)
-        return None
-
-    m = re.search(r'^\s+\[\s+0\]\s+(\S+)$', output.decode('utf-8', errors='replace'), flags=re.MULTILINE)
-    if not m:
+        with open_elf(path) as elf:
+            return elf.debug_link()
+    except (OSError, ElfFormatError) as e:
+        logger.debug("Unable to get debuglink for %s: %s", path, e)
         return None
 
-    return m.group(1)
-
 
 class ElfContainer(Container):
     auto_diff_metadata = False
@@ -414,50 +667,36 @@ class ElfContainer(Container):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         logger.debug("Creating ElfContainer for %s", self.source.path)
-
-        cmd = [get_tool_name('readelf'), '--wide', '--section-headers', self.source.path]
-        output = subprocess.check_output(cmd, shell=False, stderr=subprocess.DEVNULL)
-        has_debug_symbols = False
+        self._fingerprints = None
 
         try:
-            output = output.decode('utf-8').split('\n')
-            if output[1].startswith('File:'):
-                output = output[2:]
-            output = output[5:]
-
-            # Entries of readelf --section-headers have the following columns:
-            # [Nr]  Name  Type  Address  Off  Size  ES  Flg  Lk  Inf  Al
-            self._sections = collections.OrderedDict()
-            for line in output:
-                if line.startswith('Key to Flags'):
-                    break
-
-                # Strip number column because there may be spaces in the brakets
-                line = line.split(']', 1)[1].split()
-                name, type, flags = line[0], line[1], line[6] + '_'
+            with open_elf(self.source.path) as elf:
+                sections = elf.sections
+        except (OSError, ElfFormatError) as e:
+            raise ContainerExtractionError(self.source.path, e)
 
-                if name.startswith('.debug') or name.startswith('.zdebug'):
-                    has_debug_symbols = True
+        has_debug_symbols = False
+        self._sections = collections.OrderedDict()
+        self.section_sizes = collections.Counter()
+        for section in sections[1:]:
+            name, type = section.name, section.type_name
+            self.section_sizes[name] += section.size
 
-                if _should_skip_section(name, type):
-                    continue
+            if name.startswith('.debug') or name.startswith('.zdebug'):
+                has_debug_symbols = True
 
-                # Use first match, with last option being '_' as fallback
-                elf_class = [
-                    ElfContainer.SECTION_FLAG_MAPPING[x]
-                    for x in flags if x in ElfContainer.SECTION_FLAG_MAPPING
-                ][0]
+            if _should_skip_section(name, type):
+                continue
 
-                logger.debug("Adding section %s (%s) as %s", name, type, elf_class)
-                self._sections[name] = elf_class(self, name)
+            # Use first match, with last option being '_' as fallback
+            elf_class = [
+                ElfContainer.SECTION_FLAG_MAPPING[x]
+                for x in section.flag_letters + '_'
+                if x in ElfContainer.SECTION_FLAG_MAPPING
+            ][0]
 
-        except Exception as e:
-            command = ' '.join(cmd)
-            logger.debug(
-                "OutputParsingError in %s from `%s` output - %s:%s",
-                self.__class__.__name__, command, e.__class__.__name__, e,
-            )
-            raise OutputParsingError(command, self)
+            logger.debug("Adding section %s (%s) as %s", name, type, elf_class)
+            self._sections[name] = elf_class(self, name)
 
         if not has_debug_symbols:
             self._install_debug_symbols()
@@ -515,7 +754,7 @@ class ElfContainer(Container):
         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
 
         def objcopy(*args):
-            subprocess.check_call(
+            scheduler.check_call(
                 (get_tool_name('objcopy'),) + args,
                 shell=False,
                 stderr=subprocess.DEVNULL,
@@ -550,6 +789,80 @@ class ElfContainer(Container):
 
         logger.debug('Installed debug symbols at %s', dest_path)
 
+    def _compute_fingerprints(self):
+        with open_elf(self.source.path) as elf:
+            if elf.is_archive_member:
+                # readelf and objdump will dump the section of every object
+                # in the archive, not only the ones we have read.
+                return {}
+
+            header = '{} {} {}'.format(
+                elf.elf_class,
+                elf.e_machine,
+                elf.e_type,
+            ).encode('utf-8')
+            relocated = {
+                x.info for x in elf.sections
+                if x.type_name in {'REL', 'RELA'}
+            }
+
+            separate_debug = not any(
+                x.name in ('.debug_info', '.zdebug_info') for x in elf.sections
+            )
+
+            context = hashlib.sha1(header)
+            for section in elf.sections:
+                if section.type_name in CONTEXT_SECTION_TYPES or \
+                        section.name.startswith(CONTEXT_SECTION_PREFIXES) or \
+                        (separate_debug and (
+                            section.type_name in CONTEXT_SEPARATE_DEBUG_TYPES or
+                            section.name in CONTEXT_SEPARATE_DEBUG_NAMES
+                        )):
+                    context.update(section.name.encode('utf-8'))
+                    context.update(elf.section_data(section))
+
+            fingerprints = {}
+            for section in elf.sections:
+                if section.name not in self._sections:
+                    continue
+                if section.name not in fingerprints:
+                    fingerprints[section.name] = hashlib.sha1(header)
+                h = fingerprints[section.name]
+                h.update('{} {} {} {}\n'.format(
+                    section.type,
+                    section.flags,
+                    section.addr,
+                    section.index in relocated,
+                ).encode('utf-8'))
+                h.update(elf.section_data(section))
+
+            result = {}
+            for name, h in fingerprints.items():
+                if self._sections[name].FINGERPRINT_INCLUDES_CONTEXT:
+                    h.update(context.digest())
+                result[name] = h.hexdigest()
+            return result
+
+    def section_fingerprint(self, section):
+        """
+        Return a digest of the parts of the file that the comparison of
+        `section` depends on, or None if it cannot be determined.
+        """
+        if section.path != self.source.path:
+            # eg. .gnu_debuglink after installing debug symbols
+            return None
+        if self._fingerprints is None:
+            try:
+                self._fingerprints = self._compute_fingerprints()
+            except (OSError, ElfFormatError) as e:
+                logger.debug(
+                    "Unable to compute section fingerprints for %s: %s",
+                    self.source.path,
+                    e,
+                )
+                self._fingerprints = {}
+        return self._fingerprints.get(section.name)
+
     def get_member_names(self):
         return self._sections.keys()
 
@@ -562,7 +875,7 @@ class ElfFile(File):
     FILE_TYPE_RE = re.compile(r'^ELF ')
 
     def compare_details(self, other, source=None):
-        return _compare_elf_data(self.path, other.path)
+        return _compare_elf_data_combined(self.path, other.path)
 
 
 class StaticLibFile(File):
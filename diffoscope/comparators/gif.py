@@ -21,6 +21,7 @@ import re
 import logging
 import subprocess
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 from diffoscope.config import Config
 from diffoscope.difference import Difference
@@ -51,7 +52,7 @@ class Gifbuild(Command):
 @tool_required('identify')
 def is_image_static(image):
     try:
-        return subprocess.check_output((
+        return scheduler.check_output((
             'identify',
             '-format', '%n',
             image.path,
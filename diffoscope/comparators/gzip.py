@@ -19,8 +19,8 @@
 
 import re
 import logging
-import subprocess
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 from diffoscope.difference import Difference
 
@@ -46,7 +46,7 @@ class GzipContainer(Archive):
         dest_path = self.get_path_name(dest_dir)
         logger.debug('gzip extracting to %s', dest_path)
         with open(dest_path, 'wb') as fp:
-            subprocess.check_call(
+            scheduler.check_call(
                 ["gzip", "--decompress", "--stdout", self.source.path],
                 shell=False, stdout=fp, stderr=None)
         return dest_path
@@ -23,6 +23,7 @@ import logging
 import platform
 import subprocess
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 from diffoscope.profiling import profile
 from diffoscope.difference import Difference
@@ -79,7 +80,7 @@ class HiFile(File):
         if not hasattr(HiFile, 'hi_version'):
             try:
                 with profile('command', 'ghc'):
-                    output = subprocess.check_output(
+                    output = scheduler.check_output(
                         ['ghc', '--numeric-version'],
                     )
             except (OSError, subprocess.CalledProcessError):
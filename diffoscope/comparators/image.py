@@ -22,6 +22,7 @@ import base64
 import logging
 import subprocess
 
+from diffoscope import executor, scheduler
 from diffoscope.config import Config
 from diffoscope.tools import tool_required
 from diffoscope.tempfiles import get_named_temporary_file
@@ -89,7 +90,7 @@ def pixel_difference(image1_path, image2_path):
     compared_filename = get_named_temporary_file(suffix='.png').name
 
     try:
-        subprocess.check_call((
+        scheduler.check_call((
             'compare',
             image1_path,
             image2_path,
@@ -111,7 +112,7 @@ def pixel_difference(image1_path, image2_path):
 def flicker_difference(image1_path, image2_path):
     compared_filename = get_named_temporary_file(suffix='.gif').name
 
-    subprocess.check_call((
+    scheduler.check_call((
         'convert',
         '-delay', '50',
         image1_path,
@@ -129,7 +130,7 @@ def flicker_difference(image1_path, image2_path):
 
 @tool_required('identify')
 def get_image_size(image_path):
-    return subprocess.check_output((
+    return scheduler.check_output((
         'identify',
         '-format', '%[h]x%[w]',
         image_path,
@@ -147,12 +148,10 @@ class JPEGImageFile(File):
     FILE_TYPE_RE = re.compile(r'\bJPEG image data\b')
 
     def compare_details(self, other, source=None):
-        content_diff = Difference.from_command(
-            Img2Txt,
-            self.path,
-            other.path,
-            source="Image content",
-        )
+        content_diff, metadata_diff = Difference.from_commands([
+            (Img2Txt, self.path, other.path, {'source': "Image content"}),
+            (Identify, self.path, other.path, {'source': "Image metadata"}),
+        ])
         if content_diff is not None and Config().compute_visual_diffs and \
                 same_size(self, other):
             try:
@@ -167,15 +166,7 @@ class JPEGImageFile(File):
                 ])
             except subprocess.CalledProcessError:  # noqa
                 pass
-        return [
-            content_diff,
-            Difference.from_command(
-                Identify,
-                self.path,
-                other.path,
-                source="Image metadata",
-            ),
-        ]
+        return [content_diff, metadata_diff]
 
 
 class ICOImageFile(File):
@@ -184,6 +175,14 @@ class ICOImageFile(File):
     def compare_details(self, other, source=None):
         differences = []
 
+        metadata_diff = executor.submit(
+            Difference.from_command,
+            Identify,
+            self.path,
+            other.path,
+            source="Image metadata",
+        )
+
         # img2txt does not support .ico files directly so convert to .PNG.
         try:
             png_a, png_b = [ICOImageFile.convert(x) for x in (self, other)]
@@ -210,12 +209,7 @@ class ICOImageFile(File):
                     ])
             differences.append(content_diff)
 
-        differences.append(Difference.from_command(
-            Identify,
-            self.path,
-            other.path,
-            source="Image metadata",
-        ))
+        differences.append(metadata_diff.result())
 
         return differences
 
@@ -224,6 +218,6 @@ class ICOImageFile(File):
     def convert(file):
         result = get_named_temporary_file(suffix='.png').name
 
-        subprocess.check_call(('convert', file.path, result))
+        scheduler.check_call(('convert', file.path, result))
 
         return result
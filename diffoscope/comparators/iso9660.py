@@ -20,6 +20,7 @@
 import re
 import subprocess
 
+from diffoscope import executor, scheduler
 from diffoscope.tools import tool_required
 from diffoscope.difference import Difference
 
@@ -30,7 +31,7 @@ from .utils.libarchive import LibarchiveContainer
 
 @tool_required('isoinfo')
 def get_iso9660_names(path):
-    return subprocess.check_output((
+    return scheduler.check_output((
         'isoinfo',
         '-R',  # Always use RockRidge for names
         '-f',
@@ -87,18 +88,22 @@ class Iso9660File(File):
         return False
 
     def compare_details(self, other, source=None):
-        differences = []
-
-        for klass in (ISO9660PVD, ISO9660Listing):
-            differences.append(Difference.from_command(
-                klass, self.path, other.path,
-            ))
-
-        for x in ('joliet', 'rockridge'):
+        extensions = [
+            executor.submit(
+                Difference.from_command,
+                ISO9660Listing, self.path, other.path, command_args=(x,),
+            )
+            for x in ('joliet', 'rockridge')
+        ]
+
+        differences = Difference.from_commands(
+            (klass, self.path, other.path)
+            for klass in (ISO9660PVD, ISO9660Listing)
+        )
+
+        for future in extensions:
             try:
-                differences.append(Difference.from_command(
-                    ISO9660Listing, self.path, other.path, command_args=(x,),
-                ))
+                differences.append(future.result())
             except subprocess.CalledProcessError:
                 # Probably no joliet or rockridge data
                 pass
@@ -20,12 +20,29 @@
 
 import re
 import os.path
+import logging
+import weakref
+import threading
+import concurrent.futures
 
+from diffoscope import executor
 from diffoscope.tools import tool_required
+from diffoscope.profiling import profile
+from diffoscope.excludes import command_excluded
+from diffoscope.tempfiles import get_named_temporary_file
 from diffoscope.difference import Difference
 
 from .utils.file import File
 from .utils.command import Command
+from .utils.disassembly import Shard, shard_feeder
+
+logger = logging.getLogger(__name__)
+
+JAVAP_ARGS = ['javap', '-verbose', '-constants', '-s', '-l', '-private']
+
+# Starting a JVM takes much longer than javap takes over a class file, so
+# we pass this many class files to each javap.
+JAVAP_BATCH_SIZE = 256
 
 
 class Javap(Command):
@@ -35,7 +52,7 @@ class Javap(Command):
 
     @tool_required('javap')
     def cmdline(self):
-        return ['javap', '-verbose', '-constants', '-s', '-l', '-private', self.path]
+        return JAVAP_ARGS + [self.path]
 
     def filter(self, line):
         if re.match(r'^(Classfile %s$|  Last modified |  MD5 checksum )' % re.escape(self.real_path), line.decode('utf-8')):
@@ -43,8 +60,215 @@ class Javap(Command):
         return line
 
 
+class JavapBatch(Command):
+    """
+    Run javap over several class files. Its output is the concatenation of
+    what Javap would output for each of them, each starting with a
+    "Classfile <path>" line.
+    """
+
+    def __init__(self, paths):
+        super().__init__(paths[0])
+        self.paths = paths
+
+    @tool_required('javap')
+    def cmdline(self):
+        return JAVAP_ARGS + self.paths
+
+
+def split_javap_output(paths, lines, out_file):
+    """
+    Write the output of a JavapBatch over `paths` to `out_file`, filtered
+    like Javap would, and return the Shard for each of `paths`, or None if
+    the output cannot be split.
+    """
+    commands = iter([Javap(x) for x in paths])
+    shards = []
+    command = start = None
+    offset = 0
+
+    def add_shard():
+        if command is not None:
+            shards.append(Shard(
+                command.path,
+                start,
+                offset - start,
+                None,
+                None,
+            ))
+
+    for line in lines:
+        if line.startswith(b'Classfile '):
+            add_shard()
+            command = next(commands, None)
+            if command is None or \
+                    line.rstrip(b'\n') != b'Classfile ' + os.fsencode(command.real_path):
+                return None
+            start = offset
+        elif command is None:
+            return None
+        line = command.filter(line)
+        out_file.write(line)
+        offset += len(line)
+    add_shard()
+    out_file.flush()
+
+    if len(shards) != len(paths):
+        return None
+    return shards
+
+
+class JavapBatchOutputs(object):
+    """
+    The javap output of the class files that differ between `container` and
+    `other` (matched by name), obtained by running javap over
+    JAVAP_BATCH_SIZE of them at a time instead of once per class file.
+    """
+
+    def __init__(self, container, other):
+        self.other = other
+        self._out_files = []
+        self._shards = ({}, {})
+
+        changed = self.changed_members(container, other)
+        try:
+            if not changed:
+                return
+
+            chunks = [
+                changed[x:x + JAVAP_BATCH_SIZE]
+                for x in range(0, len(changed), JAVAP_BATCH_SIZE)
+            ]
+            calls = [
+                (self.run, ([(x[0], x[side]) for x in chunk], shards), {})
+                for side, shards in enumerate(self._shards, 1)
+                for chunk in chunks
+            ]
+            with profile('command', 'javap (batched)'):
+                executor.run_all(calls)
+        finally:
+            for _, member, other_member in changed:
+                member.cleanup()
+                other_member.cleanup()
+
+        logger.debug(
+            "Ran javap over %d changed class files of %s in %d batches",
+            len(changed),
+            container.source.name,
+            len(calls),
+        )
+
+    @staticmethod
+    def changed_members(container, other):
+        """
+        Return (name, member, other member) for each class file that differs
+        between `container` and `other`. These are left extracted for javap
+        to read, and must be cleaned up by the caller.
+        """
+        other_names = set(other.get_member_names())
+        changed = []
+        try:
+            for name in container.get_member_names():
+                if not name.endswith('.class') or name not in other_names:
+                    continue
+                member = container.get_member(name)
+                other_member = other.get_member(name)
+                changed.append((name, member, other_member))
+                if member.has_same_content_as(other_member):
+                    changed.pop()
+                    member.cleanup()
+                    other_member.cleanup()
+        except:  # noqa
+            for _, member, other_member in changed:
+                member.cleanup()
+                other_member.cleanup()
+            raise
+        return changed
+
+    def run(self, members, shards):
+        try:
+            paths = [x.path for _, x in members]
+            command = JavapBatch(paths)
+            out_file = get_named_temporary_file()
+            self._out_files.append(out_file)
+
+            command.start()
+            try:
+                result = split_javap_output(paths, command.stdout, out_file)
+            finally:
+                if command.poll() is None:
+                    command.terminate()
+                returncode = command.wait()
+        finally:
+            for _, x in members:
+                x.cleanup()
+
+        # Let the classes be compared one by one instead, so that errors are
+        # reported just like before.
+        if result is None or returncode != 0 or command.stderr_content:
+            logger.debug(
+                "Could not use batched javap output (exit code: %d)",
+                returncode,
+            )
+            return
+
+        for (name, _), shard in zip(members, result):
+            shards[name] = (out_file.name, shard)
+
+    def get(self, name):
+        """
+        Return ((path, Shard), (path, Shard)) for the class file `name` in
+        each container, or None.
+        """
+        try:
+            return self._shards[0][name], self._shards[1][name]
+        except KeyError:
+            return None
+
+
+# The JavapBatchOutputs of each container, as (other container, Future).
+_batch_outputs = weakref.WeakKeyDictionary()
+_batch_outputs_lock = threading.Lock()
+
+
+def get_batch_outputs(file, other):
+    container = file.container
+    if container is None or other.container is None or \
+            file.name != other.name:
+        return None
+    if command_excluded(Javap(file.path).shell_cmdline()):
+        return None
+
+    # The lock is only held to find who builds the outputs of a container,
+    # so that class files of other containers are not held back meanwhile.
+    with _batch_outputs_lock:
+        entry = _batch_outputs.get(container)
+        build = entry is None or entry[0] is not other.container
+        if build:
+            entry = (other.container, concurrent.futures.Future())
+            _batch_outputs[container] = entry
+    future = entry[1]
+
+    if build:
+        try:
+            future.set_result(JavapBatchOutputs(container, other.container))
+        except Exception as e:
+            future.set_exception(e)
+    return future.result().get(file.name)
+
+
 class ClassFile(File):
     FILE_TYPE_RE = re.compile(r'^compiled Java class data\b')
 
     def compare_details(self, other, source=None):
-        return [Difference.from_command(Javap, self.path, other.path)]
+        shards = get_batch_outputs(self, other)
+        if shards is None:
+            return [Difference.from_command(Javap, self.path, other.path)]
+
+        return [Difference.from_feeder(
+            shard_feeder(*shards[0]),
+            shard_feeder(*shards[1]),
+            self.path,
+            other.path,
+            source=Javap(self.path).shell_cmdline(),
+        )]
@@ -19,8 +19,8 @@
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
 import re
-import subprocess
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 from diffoscope.difference import Difference
 
@@ -74,7 +74,7 @@ class MachoFile(File):
     @staticmethod
     @tool_required('lipo')
     def get_arch_from_macho(path):
-        lipo_output = subprocess.check_output(['lipo', '-info', path]).decode('utf-8')
+        lipo_output = scheduler.check_output(['lipo', '-info', path]).decode('utf-8')
         lipo_match = MachoFile.RE_EXTRACT_ARCHS.match(lipo_output)
         if lipo_match is None:
             raise ValueError('lipo -info on Mach-O file %s did not produce expected output. Output was: %s' % path, lipo_output)
@@ -91,12 +91,14 @@ class MachoFile(File):
                                                 self.name, other.name, source='architectures'))
 
         # Compare common architectures for differences
+        calls = []
         for common_arch in set(my_archs) & set(other_archs):
-            differences.append(Difference.from_command(OtoolHeaders, self.path, other.path, command_args=[common_arch],
-                                                       comment="Mach-O headers for architecture %s" % common_arch))
-            differences.append(Difference.from_command(OtoolLibraries, self.path, other.path, command_args=[common_arch],
-                                                       comment="Mach-O load commands for architecture %s" % common_arch))
-            differences.append(Difference.from_command(OtoolDisassemble, self.path, other.path, command_args=[common_arch],
-                                                       comment="Code for architecture %s" % common_arch))
+            calls.append((OtoolHeaders, self.path, other.path, {'command_args': [common_arch],
+                          'comment': "Mach-O headers for architecture %s" % common_arch}))
+            calls.append((OtoolLibraries, self.path, other.path, {'command_args': [common_arch],
+                          'comment': "Mach-O load commands for architecture %s" % common_arch}))
+            calls.append((OtoolDisassemble, self.path, other.path, {'command_args': [common_arch],
+                          'comment': "Code for architecture %s" % common_arch}))
+        differences.extend(Difference.from_commands(calls))
 
         return differences
@@ -45,5 +45,7 @@ class PdfFile(File):
     FILE_TYPE_RE = re.compile(r'^PDF document\b')
 
     def compare_details(self, other, source=None):
-        return [Difference.from_command(Pdftotext, self.path, other.path),
-                Difference.from_command(Pdftk, self.path, other.path)]
+        return Difference.from_commands([
+            (Pdftotext, self.path, other.path),
+            (Pdftk, self.path, other.path),
+        ])
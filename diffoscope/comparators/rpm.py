@@ -25,6 +25,7 @@ import logging
 import binascii
 import subprocess
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 from diffoscope.tempfiles import get_temporary_directory
 from diffoscope.difference import Difference
@@ -99,7 +100,7 @@ class RpmContainer(Archive):
         dest_path = os.path.join(dest_dir, 'content')
         cmd = ['rpm2cpio', self.source.path]
         with open(dest_path, 'wb') as dest:
-            subprocess.check_call(cmd, shell=False, stdout=dest, stderr=subprocess.PIPE)
+            scheduler.check_call(cmd, shell=False, stdout=dest, stderr=subprocess.PIPE)
         return dest_path
 
 
@@ -26,6 +26,7 @@ import functools
 import subprocess
 import collections
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 from diffoscope.difference import Difference
 from diffoscope.tempfiles import get_temporary_directory
@@ -256,7 +257,7 @@ class SquashfsContainer(Archive):
 
         logger.debug("Extracting %s to %s", self.source.path, self._temp_dir)
 
-        output = subprocess.check_output((
+        output = scheduler.check_output((
             'unsquashfs',
             '-n',
             '-f',
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import mmap
+import contextlib
+import collections
+
+from .hexdump import HEXDUMP_LINE_SIZE
+
+# Size of the blocks used to resynchronise the two inputs after they diverge.
+DELTA_BLOCK_SIZE = 64
+
+# How far ahead we initially look for a block when resynchronising; this is
+# doubled (along with the distance we probe at) until a match is found, so
+# that resynchronising after a small change is cheap.
+DELTA_WINDOW = 4 * DELTA_BLOCK_SIZE
+
+# Matching regions are compared in chunks of at most this size.
+DELTA_COMPARE_CHUNK = 64 * 1024
+
+# Number of lines of hexdump shown for each side of a changed region.
+DELTA_MAX_HEXDUMP_LINES = 64
+
+DeltaOp = collections.namedtuple('DeltaOp', 'kind start1 end1 start2 end2')
+
+
+@contextlib.contextmanager
+def open_mmap(path):
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            yield b''
+            return
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def common_prefix_len(a, i, b, j):
+    """Length of the common prefix of a[i:] and b[j:]."""
+    limit = min(len(a) - i, len(b) - j)
+    n = 0
+    chunk = DELTA_COMPARE_CHUNK
+    while n < limit:
+        size = min(chunk, limit - n)
+        if a[i + n:i + n + size] == b[j + n:j + n + size]:
+            n += size
+        elif size == 1:
+            break
+        else:
+            chunk = max(1, size // 16)
+    return n
+
+
+def common_suffix_len(a, i, b, j, limit):
+    """Length of the common suffix of a[:i] and b[:j], up to `limit`."""
+    n = 0
+    chunk = DELTA_COMPARE_CHUNK
+    while n < limit:
+        size = min(chunk, limit - n)
+        if a[i - n - size:i - n] == b[j - n - size:j - n]:
+            n += size
+        elif size == 1:
+            break
+        else:
+            chunk = max(1, size // 16)
+    return n
+
+
+def resynchronise(a, i, b, j):
+    """
+    Find the nearest offsets (x, y), x >= i and y >= j, at which a block of
+    a[x:] matches a block of b[y:], or return None. Candidates are found with
+    bytes.find() in a window that grows along with the probing distance, so
+    the cost is bounded by the size of the region that differs.
+
+    a[i] and b[j] are expected to differ, so the first blocks probed start
+    just after them.
+    """
+    distance = 1
+    window = DELTA_WINDOW
+    while True:
+        candidates = []
+        if i + distance + DELTA_BLOCK_SIZE <= len(a):
+            y = b.find(
+                a[i + distance:i + distance + DELTA_BLOCK_SIZE],
+                j,
+                j + distance + window,
+            )
+            if y != -1:
+                candidates.append((i + distance, y))
+        if j + distance + DELTA_BLOCK_SIZE <= len(b):
+            x = a.find(
+                b[j + distance:j + distance + DELTA_BLOCK_SIZE],
+                i,
+                i + distance + window,
+            )
+            if x != -1:
+                candidates.append((x, j + distance))
+        if candidates:
+            return min(candidates, key=lambda c: (c[0] - i) + (c[1] - j))
+        if i + distance + DELTA_BLOCK_SIZE > len(a) and \
+                j + distance + DELTA_BLOCK_SIZE > len(b):
+            return None
+        distance = distance * 2 if distance > 1 else DELTA_BLOCK_SIZE
+        window *= 2
+
+
+def binary_delta(a, b):
+    """
+    Compute the differences between two byte sequences (e.g. memory maps) as
+    a list of DeltaOp, whose kind is one of "insert", "delete" or "modify".
+    """
+    ops = []
+
+    def add(start1, end1, start2, end2):
+        if start1 == end1:
+            kind = 'insert'
+        elif start2 == end2:
+            kind = 'delete'
+        else:
+            kind = 'modify'
+        ops.append(DeltaOp(kind, start1, end1, start2, end2))
+
+    i = j = 0
+    while True:
+        n = common_prefix_len(a, i, b, j)
+        i += n
+        j += n
+        if i == len(a) and j == len(b):
+            break
+        found = resynchronise(a, i, b, j)
+        if found is None:
+            add(i, len(a), j, len(b))
+            break
+        x, y = found
+        # The match may extend backwards into what we skipped over.
+        n = common_suffix_len(a, x, b, y, min(x - i, y - j))
+        add(i, x - n, j, y - n)
+        i, j = x, y
+
+    return ops
+
+
+def describe_range(start, end):
+    return '0x{:08x}-0x{:08x} ({} bytes)'.format(start, end, end - start)
+
+
+def delta_hexdump(data, start, end):
+    lines = []
+    stop = min(end, start + DELTA_MAX_HEXDUMP_LINES * HEXDUMP_LINE_SIZE)
+    for offset in range(start, stop, HEXDUMP_LINE_SIZE):
+        buf = data[offset:min(offset + HEXDUMP_LINE_SIZE, stop)]
+        lines.append('{:08x}: {:<40} {}\n'.format(
+            offset,
+            ' '.join(buf[x:x + 2].hex() for x in range(0, len(buf), 2)),
+            ''.join(chr(c) if 0x20 <= c < 0x7f else '.' for c in buf),
+        ))
+    if stop < end:
+        lines.append('[ {} more bytes ]\n'.format(end - stop))
+    return lines
+
+
+def delta_texts(a, b, ops, max_lines=float('inf')):
+    """
+    Render `ops` as a pair of texts suitable for diffing: each changed region
+    gets a header line common to both sides followed by the hexdump of that
+    region on each side. Regions are no longer rendered once either text has
+    `max_lines` lines, as diff would not read any further anyway.
+    """
+    text1, text2 = [], []
+    for count, op in enumerate(ops):
+        if max(len(text1), len(text2)) >= max_lines:
+            rest = '[ {} more changed regions ]\n'.format(len(ops) - count)
+            text1.append(rest)
+            text2.append(rest)
+            break
+        header = '[ {}: {} -> {} ]\n'.format(
+            op.kind,
+            describe_range(op.start1, op.end1),
+            describe_range(op.start2, op.end2),
+        )
+        text1.append(header)
+        text2.append(header)
+        text1.extend(delta_hexdump(a, op.start1, op.end1))
+        text2.extend(delta_hexdump(b, op.start2, op.end2))
+    return ''.join(text1), ''.join(text2)
+
+
+def delta_summary(ops):
+    counts = collections.OrderedDict(
+        (kind, [0, 0]) for kind in ('insert', 'delete', 'modify')
+    )
+    for op in ops:
+        counts[op.kind][0] += 1
+        counts[op.kind][1] += max(op.end1 - op.start1, op.end2 - op.start2)
+    return 'Binary delta: {}'.format(', '.join(
+        '{} {} ({} bytes)'.format(count, kind, size)
+        for kind, (count, size) in counts.items()
+    ))
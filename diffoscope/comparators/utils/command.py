@@ -18,12 +18,16 @@
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
 import io
+import os
 import abc
 import logging
 import shlex
 import subprocess
 import threading
 
+from diffoscope.ioloop import IOLoop, READ_SIZE, set_nonblocking
+from diffoscope.scheduler import Scheduler
+
 logger = logging.getLogger(__name__)
 
 
@@ -34,23 +38,30 @@ class Command(object, metaclass=abc.ABCMeta):
     def start(self):
         logger.debug("Executing %s", ' '.join([shlex.quote(x) for x in self.cmdline()]))
         self._stdin = self.stdin()
+        self._slot = Scheduler().acquire(self.cmdline()[0])
         # "stdin" used to be a feeder but we didn't need the functionality so
         # it was simplified into the current form. it can be recovered from git
         # the extra functionality is needed in the future. alternatively,
         # consider using a shell pipeline ("sh -ec $script") to implement what
         # you need, because that involves much less code - like it or not (I
         # don't) shell is still the most readable option for composing processes
-        self._process = subprocess.Popen(self.cmdline(),
-                                         shell=False, close_fds=True,
-                                         env=self.env(),
-                                         stdin=self._stdin,
-                                         stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE)
+        try:
+            self._process = subprocess.Popen(self.cmdline(),
+                                             shell=False, close_fds=True,
+                                             env=self.env(),
+                                             stdin=self._stdin,
+                                             stdout=subprocess.PIPE,
+                                             stderr=subprocess.PIPE)
+        except:  # noqa
+            Scheduler().release(self._slot)
+            raise
+        self._slot.pid = self._process.pid
+        self._returncode = None
         self._stderr = io.BytesIO()
         self._stderr_line_count = 0
-        self._stderr_reader = threading.Thread(target=self._read_stderr)
-        self._stderr_reader.daemon = True
-        self._stderr_reader.start()
+        self._stderr_partial = []
+        self._stderr_done = threading.Event()
+        IOLoop().call_soon(self._watch_stderr)
 
     @property
     def path(self):
@@ -80,8 +91,18 @@ class Command(object, metaclass=abc.ABCMeta):
         return self._process.terminate()
 
     def wait(self):
-        self._stderr_reader.join()
-        returncode = self._process.wait()
+        """
+        Wait for the process to exit and give up its Scheduler slot. Every
+        started command must be waited for, even after terminate(). Further
+        calls return the same exit code straight away.
+        """
+        if self._returncode is not None:
+            return self._returncode
+        try:
+            self._stderr_done.wait()
+            returncode = self._process.wait()
+        finally:
+            Scheduler().release(self._slot)
         logger.debug(
             "%s returned (exit code: %d)",
             ' '.join([shlex.quote(x) for x in self.cmdline()]),
@@ -89,18 +110,50 @@ class Command(object, metaclass=abc.ABCMeta):
         )
         if self._stdin:
             self._stdin.close()
+        self._returncode = returncode
         return returncode
 
     MAX_STDERR_LINES = 50
 
-    def _read_stderr(self):
-        for line in iter(self._process.stderr.readline, b''):
-            self._stderr_line_count += 1
-            if self._stderr_line_count <= Command.MAX_STDERR_LINES:
-                self._stderr.write(line)
+    # stderr is collected by the I/O loop thread, so the methods below must
+    # not block.
+
+    def _watch_stderr(self):
+        fd = self._process.stderr.fileno()
+        set_nonblocking(fd)
+        IOLoop().add_reader(fd, self._read_stderr)
+
+    def _add_stderr_line(self, line):
+        self._stderr_line_count += 1
+        if self._stderr_line_count <= Command.MAX_STDERR_LINES:
+            self._stderr.write(line)
+
+    def _read_stderr(self, fd):
+        try:
+            data = os.read(fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+
+        if data:
+            *lines, rest = data.split(b'\n')
+            if lines:
+                lines[0] = b''.join(self._stderr_partial) + lines[0]
+                self._stderr_partial = []
+                for line in lines:
+                    self._add_stderr_line(line + b'\n')
+            if rest:
+                self._stderr_partial.append(rest)
+            return
+
+        if self._stderr_partial:
+            self._add_stderr_line(b''.join(self._stderr_partial))
         if self._stderr_line_count > Command.MAX_STDERR_LINES:
             self._stderr.write('[ {} lines ignored ]\n'.format(self._stderr_line_count - Command.MAX_STDERR_LINES).encode('utf-8'))
+        IOLoop().remove_reader(fd)
         self._process.stderr.close()
+        self._stderr_done.set()
 
     @property
     def stderr_content(self):
@@ -17,14 +17,10 @@
 # You should have received a copy of the GNU General Public License
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
-import io
 import os
 import sys
 import logging
-import binascii
 
-from diffoscope.tools import tool_required
-from diffoscope.exc import RequiredToolNotFound
 from diffoscope.config import Config
 from diffoscope.excludes import any_excluded
 from diffoscope.profiling import profile
@@ -32,7 +28,9 @@ from diffoscope.difference import Difference
 
 from ..missing_file import MissingFile
 
-from .command import Command
+from .hexdump import differing_ranges, hexdump_feeder, renumber_hunks, \
+    regular_file_sizes, HEXDUMP_LINE_SIZE
+from .binary_delta import binary_delta, delta_summary, delta_texts, open_mmap
 from .specialize import specialize
 
 try:
@@ -43,12 +41,6 @@ except ImportError:  # noqa
 logger = logging.getLogger(__name__)
 
 
-class Xxd(Command):
-    @tool_required('xxd')
-    def cmdline(self):
-        return ['xxd', self.path]
-
-
 def compare_root_paths(path1, path2):
     from ..directory import FilesystemDirectory, FilesystemFile, compare_directories
 
@@ -113,22 +105,69 @@ def bail_if_non_existing(*paths):
 
 
 def compare_binary_files(file1, file2, source=None):
-    try:
-        if source is None:
-            source = [file1.name, file2.name]
-        return Difference.from_command(
-            Xxd, file1.path, file2.path,
-            source=source, has_internal_linenos=True)
-    except RequiredToolNotFound:
-        hexdump1 = hexdump_fallback(file1.path)
-        hexdump2 = hexdump_fallback(file2.path)
-        comment = 'xxd not available in path. Falling back to Python hexlify.\n'
-        return Difference.from_text(hexdump1, hexdump2, file1.name, file2.name, source, comment)
-
-
-def hexdump_fallback(path):
-    hexdump = io.StringIO()
-    with open(path, 'rb') as f:
-        for buf in iter(lambda: f.read(32), b''):
-            hexdump.write('%s\n' % binascii.hexlify(buf).decode('us-ascii'))
-    return hexdump.getvalue()
+    if source is None:
+        source = [file1.name, file2.name]
+
+    # If the files are the same size, only dump the regions that differ (plus
+    # some context) instead of the whole files; otherwise content may have
+    # been shifted and we need to dump everything.
+    ranges = None
+    sizes = regular_file_sizes(file1.path, file2.path)
+    if sizes is not None and sizes[0] == sizes[1]:
+        with profile('differing_ranges', file1), \
+                open(file1.path, 'rb') as f1, open(file2.path, 'rb') as f2:
+            ranges = differing_ranges(f1, f2)
+        if not ranges:
+            return None
+
+    # Rather than feeding diff(1) more than it will accept and only reporting
+    # a checksum, describe how the files differ at the byte level.
+    if sizes is not None:
+        if ranges is None:
+            dumped = max(sizes)
+        else:
+            dumped = sum(end - start for start, end in ranges)
+        if -(-dumped // HEXDUMP_LINE_SIZE) >= Config().max_diff_input_lines:
+            return compare_binary_delta(file1, file2, source)
+
+    difference = Difference.from_feeder(
+        hexdump_feeder(file1.path, ranges),
+        hexdump_feeder(file2.path, ranges),
+        file1.path,
+        file2.path,
+        source=source,
+        has_internal_linenos=True,
+    )
+    if ranges is not None and difference and difference.unified_diff:
+        difference = Difference(
+            renumber_hunks(difference.unified_diff),
+            file1.path,
+            file2.path,
+            source=source,
+            has_internal_linenos=True,
+        )
+    return difference
+
+
+def compare_binary_delta(file1, file2, source):
+    with open_mmap(file1.path) as data1, open_mmap(file2.path) as data2:
+        with profile('binary_delta', file1):
+            ops = binary_delta(data1, data2)
+        if not ops:
+            return None
+        text1, text2 = delta_texts(
+            data1,
+            data2,
+            ops,
+            Config().max_diff_input_lines,
+        )
+
+    return Difference.from_text(
+        text1,
+        text2,
+        file1.path,
+        file2.path,
+        source=source,
+        comment=delta_summary(ops),
+        has_internal_linenos=True,
+    )
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import re
+import hashlib
+import logging
+import subprocess
+import collections
+
+from diffoscope import feeders, executor
+from diffoscope.profiling import profile
+from diffoscope.tempfiles import get_named_temporary_file
+from diffoscope.difference import Difference
+
+logger = logging.getLogger(__name__)
+
+# Function headers in the output of `objdump --disassemble`, eg.
+# "0000000000001139 <main>:"
+FUNCTION_HEADER_RE = re.compile(rb'^[0-9a-f]+ <(.*)>:$')
+
+# What changes in the disassembly of a function when code before it grows or
+# shrinks, and is left out when telling whether it only moved: the address of
+# the function and of each instruction, the encoded instructions (which hold
+# relative offsets), and absolute branch targets and RIP-relative operands.
+ADDRESS_RES = (
+    (re.compile(rb'^[0-9a-f]+ <'), b'<'),
+    (re.compile(rb'^ *[0-9a-f]+:\t(?:[0-9a-f ]*(?:\t|$))?'), b''),
+    (re.compile(rb'\b[0-9a-f]+ <'), b'<'),
+    (re.compile(rb'-?0x[0-9a-f]+\(%rip\)'), b'(%rip)'),
+)
+
+# A contiguous part of a disassembly, stored in a temporary file.
+Shard = collections.namedtuple(
+    'Shard',
+    'name offset length digest normalized_digest',
+)
+
+
+def normalize_addresses(line):
+    for pattern, replacement in ADDRESS_RES:
+        line = pattern.sub(replacement, line)
+    return line
+
+
+def split_disassembly(lines, out_file):
+    """
+    Write `lines` to `out_file` and return an OrderedDict of the Shard for
+    each function, keyed by (name, occurrence) so that functions with the
+    same name (eg. static functions from different compilation units) can
+    still be told apart. Lines before the first function are keyed by
+    (None, 0). The normalized_digest of a Shard ignores addresses, so that
+    functions that only moved can be told apart from the others.
+    """
+    shards = collections.OrderedDict()
+    occurrences = collections.Counter()
+    key, start, offset = (None, 0), 0, 0
+    h, n = hashlib.sha1(), hashlib.sha1()
+
+    def add_shard():
+        if offset > start:
+            shards[key] = Shard(
+                key[0],
+                start,
+                offset - start,
+                h.digest(),
+                n.digest(),
+            )
+
+    for line in lines:
+        m = FUNCTION_HEADER_RE.match(line)
+        if m:
+            add_shard()
+            name = m.group(1).decode('utf-8', errors='replace')
+            key = (name, occurrences[name])
+            occurrences[name] += 1
+            start, h, n = offset, hashlib.sha1(), hashlib.sha1()
+        out_file.write(line)
+        h.update(line)
+        n.update(normalize_addresses(line))
+        offset += len(line)
+    add_shard()
+    out_file.flush()
+    return shards
+
+
+def read_shard(path, shard):
+    with open(path, 'rb') as f:
+        f.seek(shard.offset)
+        remaining = shard.length
+        for line in f:
+            if remaining <= 0:
+                break
+            line = line[:remaining]
+            remaining -= len(line)
+            yield line
+
+
+def shard_feeder(path, shard):
+    if shard is None:
+        return feeders.empty()
+    return feeders.from_raw_reader(read_shard(path, shard))
+
+
+def run_disassembly(command, out_file):
+    """
+    Run `command`, splitting its (filtered) output into function shards
+    stored in `out_file`.
+    """
+    with profile('command', command.cmdline()[0]):
+        command.start()
+        try:
+            shards = split_disassembly(
+                (command.filter(x) for x in command.stdout),
+                out_file,
+            )
+        except:  # noqa
+            command.terminate()
+            command.wait()
+            raise
+        returncode = command.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(
+            returncode,
+            command.cmdline(),
+            output=command.stderr.getvalue(),
+        )
+    return shards
+
+
+def compare_disassembly_shards(klass, path1, path2, command_args):
+    """
+    Compare the disassemblies produced by `klass` function by function,
+    matching functions by name. Only the functions whose disassembly differs
+    are diffed, in parallel, each diff being bounded on its own. Those that
+    differ only in addresses, having just moved, come last.
+    """
+    command1 = klass(path1, *command_args)
+    command2 = klass(path2, *command_args)
+
+    with get_named_temporary_file() as out1, \
+            get_named_temporary_file() as out2:
+        # Both are waited for before the temporary files are closed, even
+        # if one of them fails.
+        shards1, shards2 = executor.run_all((
+            (run_disassembly, (command1, out1), {}),
+            (run_disassembly, (command2, out2), {}),
+        ))
+
+        keys = list(shards1) + [x for x in shards2 if x not in shards1]
+        changed = [
+            (key, shards1.get(key), shards2.get(key))
+            for key in keys
+            if getattr(shards1.get(key), 'digest', None) !=
+            getattr(shards2.get(key), 'digest', None)
+        ]
+        moved = set(
+            key for key, shard1, shard2 in changed
+            if shard1 and shard2 and
+            shard1.normalized_digest == shard2.normalized_digest
+        )
+        changed.sort(key=lambda x: x[0] in moved)
+        reordered = [x for x in shards1 if x in shards2] != \
+            [x for x in shards2 if x in shards1]
+        logger.debug(
+            "%d of %d functions differ (%d only in addresses) in %s",
+            len(changed),
+            len(keys),
+            len(moved),
+            command1.shell_cmdline(),
+        )
+
+        details = [x for x in executor.run_all(
+            (
+                Difference.from_feeder,
+                (
+                    shard_feeder(out1.name, shard1),
+                    shard_feeder(out2.name, shard2),
+                    path1,
+                    path2,
+                ),
+                {
+                    'source': command1.shell_cmdline()
+                    if key[0] is None else key[0],
+                    'comment': "Only addresses differ"
+                    if key in moved else None,
+                },
+            )
+            for key, shard1, shard2 in changed
+        ) if x]
+
+    if not changed and not reordered:
+        return None
+    comment = "Disassembly compared function by function; {} of {} " \
+        "functions differ".format(
+            sum(1 for x in changed if x[0][0] is not None),
+            sum(1 for x in keys if x[0] is not None),
+        )
+    moved_functions = sum(1 for x in moved if x[0] is not None)
+    if moved_functions:
+        comment += ", {} of them only in addresses".format(moved_functions)
+    difference = Difference(
+        None,
+        path1,
+        path2,
+        source=command1.shell_cmdline(),
+        comment=comment,
+    )
+    if reordered:
+        difference.add_comment("Functions are in a different order")
+    difference.add_details(details)
+    return difference
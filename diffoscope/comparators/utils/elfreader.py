@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import struct
+import binascii
+import contextlib
+import collections
+
+from .binary_delta import open_mmap
+
+ELF_MAGIC = b'\x7fELF'
+AR_MAGIC = b'!<arch>\n'
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+SHN_XINDEX = 0xffff
+
+SHT_NOBITS = 8
+SHT_NOTE = 7
+
+NT_GNU_BUILD_ID = 3
+
+# Section types, named as in the output of `readelf --section-headers`.
+SECTION_TYPES = {
+    0: 'NULL',
+    1: 'PROGBITS',
+    2: 'SYMTAB',
+    3: 'STRTAB',
+    4: 'RELA',
+    5: 'HASH',
+    6: 'DYNAMIC',
+    7: 'NOTE',
+    8: 'NOBITS',
+    9: 'REL',
+    10: 'SHLIB',
+    11: 'DYNSYM',
+    14: 'INIT_ARRAY',
+    15: 'FINI_ARRAY',
+    16: 'PREINIT_ARRAY',
+    17: 'GROUP',
+    18: 'SYMTAB SECTION INDICES',
+    19: 'RELR',
+    0x6ffffff5: 'GNU_ATTRIBUTES',
+    0x6ffffff6: 'GNU_HASH',
+    0x6ffffff7: 'GNU_LIBLIST',
+    0x6ffffffd: 'VERDEF',
+    0x6ffffffe: 'VERNEED',
+    0x6fffffff: 'VERSYM',
+}
+
+# Section flags, with the letters used for them by `readelf --section-headers`.
+SECTION_FLAGS = (
+    (0x1, 'W'),
+    (0x2, 'A'),
+    (0x4, 'X'),
+    (0x10, 'M'),
+    (0x20, 'S'),
+    (0x40, 'I'),
+    (0x80, 'L'),
+    (0x100, 'O'),
+    (0x200, 'G'),
+    (0x400, 'T'),
+    (0x800, 'C'),
+    (0x80000000, 'E'),
+)
+
+# Layout of the ELF header fields we need, after e_ident, and of the section
+# headers, keyed by ELF class.
+_HEADER_FORMATS = {
+    ELFCLASS32: '16xHHIIIIIHHHHHH',
+    ELFCLASS64: '16xHHIQQQIHHHHHH',
+}
+_SECTION_HEADER_FORMATS = {
+    ELFCLASS32: 'IIIIIIIIII',
+    ELFCLASS64: 'IIQQQQIIQQ',
+}
+_ENDIANNESS = {
+    ELFDATA2LSB: '<',
+    ELFDATA2MSB: '>',
+}
+
+
+class ElfFormatError(ValueError):
+    pass
+
+
+class ElfSectionHeader(collections.namedtuple('ElfSectionHeader', (
+    'index', 'name', 'type', 'flags', 'addr', 'offset', 'size', 'link', 'info',
+    'addralign', 'entsize',
+))):
+    @property
+    def type_name(self):
+        return SECTION_TYPES.get(self.type, '0x{:x}'.format(self.type))
+
+    @property
+    def flag_letters(self):
+        return ''.join(x for bit, x in SECTION_FLAGS if self.flags & bit)
+
+
+def _find_archive_member(data):
+    """
+    Return the offset of the first ELF object in the ar(1) archive `data`,
+    which is the one `readelf` would show first.
+    """
+    offset = len(AR_MAGIC)
+    while offset + 60 <= len(data):
+        header = data[offset:offset + 60]
+        if header[58:60] != b'`\n':
+            raise ElfFormatError("Invalid archive member header")
+        try:
+            size = int(header[48:58])
+        except ValueError:
+            raise ElfFormatError("Invalid archive member size")
+        name = header[:16].rstrip()
+        offset += 60
+        if name.startswith(b'#1/'):
+            # BSD-style long name, stored at the start of the member
+            skip = int(name[3:])
+        else:
+            skip = 0
+        if name not in (b'/', b'//', b'/SYM64/') and \
+                data[offset + skip:offset + skip + 4] == ELF_MAGIC:
+            return offset + skip
+        offset += size + (size & 1)
+    raise ElfFormatError("No ELF object found in archive")
+
+
+class ElfReader(object):
+    """
+    Read the ELF header and section table of a memory-mapped ELF file (or of
+    the first object in a static library) without running readelf(1).
+    """
+
+    def __init__(self, data):
+        self._data = data
+        self.is_archive_member = data[:len(AR_MAGIC)] == AR_MAGIC
+        if self.is_archive_member:
+            self._base = _find_archive_member(data)
+        else:
+            self._base = 0
+
+        ident = self._read(0, 16)
+        if ident[:4] != ELF_MAGIC:
+            raise ElfFormatError("Not an ELF file")
+        self.elf_class = ident[4]
+        try:
+            self._prefix = _ENDIANNESS[ident[5]]
+            header_format = _HEADER_FORMATS[self.elf_class]
+        except KeyError:
+            raise ElfFormatError("Unsupported ELF class or data encoding")
+
+        (
+            self.e_type, self.e_machine, _, _, _, shoff, _, _, _, _,
+            shentsize, shnum, shstrndx,
+        ) = self._unpack(header_format, 0)
+
+        self.sections = self._read_sections(shoff, shentsize, shnum, shstrndx)
+
+    def _read(self, offset, size):
+        start = self._base + offset
+        if offset < 0 or size < 0 or start + size > len(self._data):
+            raise ElfFormatError("Truncated ELF file")
+        return self._data[start:start + size]
+
+    def _unpack(self, fmt, offset):
+        fmt = self._prefix + fmt
+        return struct.unpack(fmt, self._read(offset, struct.calcsize(fmt)))
+
+    def _read_sections(self, shoff, shentsize, shnum, shstrndx):
+        if shoff == 0:
+            return []
+
+        section_format = _SECTION_HEADER_FORMATS[self.elf_class]
+        if shentsize < struct.calcsize(self._prefix + section_format):
+            raise ElfFormatError("Invalid section header size")
+
+        def header(index):
+            return self._unpack(section_format, shoff + index * shentsize)
+
+        # With more than 0xff00 sections, the real count and the index of the
+        # section name string table are stored in the first section header.
+        first = header(0)
+        if shnum == 0:
+            shnum = first[5]
+        if shstrndx == SHN_XINDEX:
+            shstrndx = first[6]
+
+        headers = [header(x) for x in range(shnum)]
+        if shstrndx >= shnum:
+            raise ElfFormatError("Invalid section name string table index")
+        names = self._read(headers[shstrndx][4], headers[shstrndx][5])
+
+        result = []
+        for index, fields in enumerate(headers):
+            end = names.find(b'\0', fields[0])
+            if end == -1:
+                raise ElfFormatError("Invalid section name")
+            name = names[fields[0]:end].decode('utf-8', errors='replace')
+            result.append(ElfSectionHeader(index, name, *fields[1:]))
+        return result
+
+    def get_section(self, name):
+        for x in self.sections:
+            if x.name == name:
+                return x
+        return None
+
+    def section_data(self, section):
+        """
+        Return the raw (possibly compressed) contents of `section` as bytes.
+        """
+        if section.type == SHT_NOBITS:
+            return b''
+        return self._read(section.offset, section.size)
+
+    def notes(self):
+        """
+        Yield (name, type, descriptor) for each note in the note sections.
+        """
+        for section in self.sections:
+            if section.type != SHT_NOTE:
+                continue
+            data = self.section_data(section)
+            align = 8 if section.addralign == 8 else 4
+            offset = 0
+            while offset + 12 <= len(data):
+                namesz, descsz, note_type = struct.unpack(
+                    self._prefix + 'III',
+                    data[offset:offset + 12],
+                )
+                offset += 12
+                name = data[offset:offset + namesz].rstrip(b'\0')
+                offset += (namesz + 3) & ~3
+                desc = data[offset:offset + descsz]
+                offset += (descsz + align - 1) & ~(align - 1)
+                yield name, note_type, desc
+
+    def build_id(self):
+        for name, note_type, desc in self.notes():
+            if name == b'GNU' and note_type == NT_GNU_BUILD_ID:
+                return binascii.hexlify(desc).decode('ascii')
+        return None
+
+    def debug_link(self):
+        section = self.get_section('.gnu_debuglink')
+        if section is None:
+            return None
+        data = self.section_data(section)
+        filename = data[:data.find(b'\0')] if b'\0' in data else data
+        if not filename:
+            return None
+        return filename.decode('utf-8', errors='replace')
+
+
+@contextlib.contextmanager
+def open_elf(path):
+    with open_mmap(path) as data:
+        yield ElfReader(data)
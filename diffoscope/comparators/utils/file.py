@@ -24,6 +24,7 @@ import magic
 import logging
 import subprocess
 
+from diffoscope import scheduler
 from diffoscope.exc import RequiredToolNotFound, OutputParsingError, \
     ContainerExtractionError
 from diffoscope.tools import tool_required
@@ -349,7 +350,7 @@ class File(object, metaclass=abc.ABCMeta):
 
     @tool_required('cmp')
     def cmp_external(self, other):
-        return subprocess.call(
+        return scheduler.call(
             ('cmp', '-s', self.path, other.path),
             shell=False,
             close_fds=True,
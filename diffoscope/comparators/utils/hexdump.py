@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import re
+import os
+import stat
+import binascii
+
+from diffoscope import feeders
+from diffoscope.diff import DiffParser, diff_split_lines
+
+# Number of bytes shown on each line, as per xxd(1).
+HEXDUMP_LINE_SIZE = 16
+
+# Files are read and formatted this many bytes at a time.
+HEXDUMP_CHUNK_SIZE = HEXDUMP_LINE_SIZE * 4096
+
+# Number of unchanged lines shown around each differing region. This must be
+# larger than the context diff(1) is invoked with (-U7) so that hunks look the
+# same as when the whole files are dumped.
+HEXDUMP_CONTEXT_LINES = 8
+
+_PRINTABLE = bytes(x if 0x20 <= x < 0x7f else ord('.') for x in range(256))
+_GROUP_RE = re.compile(b'(....)')
+_OFFSET_RE = re.compile(r'^[-+ ]([0-9a-f]{8,}): ')
+
+
+def _format_chunk(buf, offset):
+    # Hexlify and group the whole chunk at once; each full line then spans
+    # exactly 40 bytes of `hexed`.
+    hexed = _GROUP_RE.sub(b'\\1 ', binascii.hexlify(buf))
+    text = buf.translate(_PRINTABLE)
+    return [
+        b'%08x: %-40s %s\n' % (
+            offset + x,
+            hexed[x * 5 // 2:x * 5 // 2 + 40],
+            text[x:x + HEXDUMP_LINE_SIZE],
+        )
+        for x in range(0, len(buf), HEXDUMP_LINE_SIZE)
+    ]
+
+
+def hexdump(f, start=0, end=None):
+    """
+    Yield the lines of `xxd` output for bytes [start, end) of the binary file
+    object `f`. `start` must be a multiple of HEXDUMP_LINE_SIZE.
+    """
+    f.seek(start)
+    offset = start
+    while end is None or offset < end:
+        size = HEXDUMP_CHUNK_SIZE
+        if end is not None:
+            size = min(size, end - offset)
+        buf = f.read(size)
+        if not buf:
+            return
+        yield from _format_chunk(buf, offset)
+        offset += len(buf)
+
+
+def differing_ranges(f1, f2, context=HEXDUMP_CONTEXT_LINES):
+    """
+    Compare two binary file objects of the same size block by block and
+    return a sorted list of non-overlapping (start, end) byte ranges covering
+    every line that differs, plus `context` lines around each of them.
+    """
+    margin = context * HEXDUMP_LINE_SIZE
+    ranges = []
+
+    def add(start, end):
+        start = max(0, start - margin)
+        end += margin
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+
+    offset = 0
+    while True:
+        buf1 = f1.read(HEXDUMP_CHUNK_SIZE)
+        buf2 = f2.read(HEXDUMP_CHUNK_SIZE)
+        if not buf1 and not buf2:
+            break
+        if buf1 != buf2:
+            # Narrow down to the individual lines that differ.
+            for x in range(0, max(len(buf1), len(buf2)), HEXDUMP_LINE_SIZE):
+                if buf1[x:x + HEXDUMP_LINE_SIZE] != buf2[x:x + HEXDUMP_LINE_SIZE]:
+                    add(offset + x, offset + x + HEXDUMP_LINE_SIZE)
+        offset += max(len(buf1), len(buf2))
+
+    return ranges
+
+
+def hexdump_ranges(f, ranges):
+    for start, end in ranges:
+        yield from hexdump(f, start, end)
+
+
+def renumber_hunks(unified_diff):
+    """
+    When only some ranges were dumped, the hunk headers of the diff refer to
+    line numbers within the partial dumps. Rewrite them to the line numbers
+    the whole dumps would have had, using the offsets within the hunk lines.
+    """
+    lines = diff_split_lines(unified_diff)
+
+    def first_line(start, prefixes):
+        for line in lines[start:]:
+            if line.startswith('@'):
+                break
+            if line[:1] in prefixes:
+                found = _OFFSET_RE.match(line)
+                if found:
+                    return int(found.group(1), 16) // HEXDUMP_LINE_SIZE + 1
+        return None
+
+    for x, line in enumerate(lines):
+        found = DiffParser.RANGE_RE.match(line)
+        if not found:
+            continue
+        start1 = first_line(x + 1, ' -') or found.group('start1')
+        start2 = first_line(x + 1, ' +') or found.group('start2')
+        lines[x] = '@@ -{}{} +{}{} @@\n'.format(
+            start1,
+            ',' + found.group('len1') if found.group('len1') else '',
+            start2,
+            ',' + found.group('len2') if found.group('len2') else '',
+        )
+    return ''.join(lines)
+
+
+def hexdump_feeder(path, ranges=None):
+    def feeder(out_file):
+        with open(path, 'rb') as f:
+            if ranges is None:
+                lines = hexdump(f)
+            else:
+                lines = hexdump_ranges(f, ranges)
+            return feeders.from_raw_reader(lines)(out_file)
+    return feeder
+
+
+def regular_file_sizes(path1, path2):
+    """Sizes of both files, or None unless they are both regular files."""
+    try:
+        st1, st2 = os.stat(path1), os.stat(path2)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st1.st_mode) or not stat.S_ISREG(st2.st_mode):
+        return None
+    return st1.st_size, st2.st_size
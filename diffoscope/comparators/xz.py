@@ -20,8 +20,8 @@
 import re
 import os.path
 import logging
-import subprocess
 
+from diffoscope import scheduler
 from diffoscope.tools import tool_required
 
 from .utils.file import File
@@ -45,7 +45,7 @@ class XzContainer(Archive):
         dest_path = os.path.join(dest_dir, member_name)
         logger.debug('xz extracting to %s', dest_path)
         with open(dest_path, 'wb') as fp:
-            subprocess.check_call(
+            scheduler.check_call(
                 ["xz", "--decompress", "--stdout", self.source.path],
                 shell=False, stdout=fp, stderr=None)
         return dest_path
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import gzip
+import lzma
+import queue
+import codecs
+import logging
+import threading
+import collections
+
+try:
+    import zstandard
+except ImportError:  # noqa
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+
+def gzip_writer(fp):
+    # No file name nor timestamp, so that reports are reproducible.
+    return gzip.GzipFile(
+        filename='',
+        mode='wb',
+        fileobj=fp,
+        compresslevel=6,
+        mtime=0,
+    )
+
+
+def gzip_reader(fp):
+    return gzip.GzipFile(mode='rb', fileobj=fp)
+
+
+def xz_writer(fp):
+    return lzma.LZMAFile(fp, 'wb')
+
+
+def xz_reader(fp):
+    return lzma.LZMAFile(fp, 'rb')
+
+
+def zstd_writer(fp):
+    return zstandard.ZstdCompressor().stream_writer(fp)
+
+
+def zstd_reader(fp):
+    return zstandard.ZstdDecompressor().stream_reader(fp)
+
+
+Compression = collections.namedtuple(
+    'Compression',
+    'suffix magic writer reader module module_name',
+)
+
+COMPRESSIONS = (
+    Compression('.gz', b'\x1f\x8b', gzip_writer, gzip_reader, gzip, 'gzip'),
+    Compression('.xz', b'\xfd7zXZ\x00', xz_writer, xz_reader, lzma, 'lzma'),
+    Compression('.zst', b'\x28\xb5\x2f\xfd', zstd_writer, zstd_reader,
+                zstandard, 'zstandard'),
+)
+
+MAGIC_SIZE = max(len(x.magic) for x in COMPRESSIONS)
+
+
+class CompressionUnavailable(Exception):
+    def __init__(self, compression):
+        self.compression = compression
+
+    def __str__(self):
+        return "Handling {} files requires the '{}' Python module".format(
+            self.compression.suffix,
+            self.compression.module_name,
+        )
+
+
+def compression_of(path):
+    """
+    Return the Compression to write `path` with, by its suffix, or None.
+    Raises CompressionUnavailable if it would need a missing module.
+    """
+    for x in COMPRESSIONS:
+        if path.endswith(x.suffix):
+            if x.module is None:
+                raise CompressionUnavailable(x)
+            return x
+    return None
+
+
+class CompressedWriter(object):
+    """
+    A file whose contents are compressed in a background thread, so that
+    compressing overlaps with writing the report. Text is encoded as UTF-8
+    unless `encoding` is None, in which case bytes are expected.
+    """
+
+    BUFFER_SIZE = 1 << 20
+
+    def __init__(self, path, compression, encoding='utf-8'):
+        self.encoding = encoding
+        self.pending = []
+        self.pending_size = 0
+        self.error = None
+
+        self.raw = open(path, 'wb')
+        self.compressed = compression.writer(self.raw)
+
+        # Bounded, so that a slow compressor holds back the writer rather
+        # than letting the whole report pile up in memory.
+        self.queue = queue.Queue(4)
+        self.thread = threading.Thread(
+            target=self.compress,
+            name='compress {}'.format(path),
+            daemon=True,
+        )
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def compress(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.compressed.write(data)
+            except Exception as e:
+                self.error = e
+
+    def write(self, val):
+        self.pending.append(val)
+        self.pending_size += len(val)
+        if self.pending_size >= self.BUFFER_SIZE:
+            self.flush()
+        return len(val)
+
+    def flush(self):
+        if self.error is not None:
+            raise self.error
+        if not self.pending:
+            return
+        if self.encoding is None:
+            data = b''.join(self.pending)
+        else:
+            data = ''.join(self.pending).encode(self.encoding)
+        self.pending = []
+        self.pending_size = 0
+        self.queue.put(data)
+
+    def isatty(self):
+        return False
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.queue.put(None)
+            self.thread.join()
+            try:
+                self.compressed.close()
+            finally:
+                self.raw.close()
+        if self.error is not None:
+            raise self.error
+
+
+def open_output(path, binary=False):
+    """
+    Open `path` to write text, or bytes if `binary`. If `path` ends with the
+    suffix of a supported compression, e.g. ".json.zst", what is written is
+    compressed accordingly.
+    """
+    compression = compression_of(path)
+    if compression is not None:
+        logger.debug("Compressing %s", path)
+        return CompressedWriter(path, compression, None if binary else 'utf-8')
+    if binary:
+        return open(path, 'wb')
+    return codecs.open(path, 'w', encoding='utf-8')
+
+
+def open_decompressed(fp):
+    """
+    If the binary stream `fp` starts with the magic of a supported
+    compression, return a stream of its decompressed contents, otherwise
+    None. `fp` must support peek().
+    """
+    magic = fp.peek(MAGIC_SIZE)[:MAGIC_SIZE]
+    for x in COMPRESSIONS:
+        if magic.startswith(x.magic):
+            if x.module is None:
+                raise CompressionUnavailable(x)
+            return io.BufferedReader(x.reader(fp))
+    return None
@@ -19,6 +19,7 @@
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
 
+import os
 import logging
 
 
@@ -54,6 +55,10 @@ class Config(object):
     compute_visual_diffs = False
     max_container_depth = 50
     force_details = False
+    jobs = os.cpu_count() or 1
+    # Combined RSS of running external processes above which no new ones
+    # are started, in bytes; None for half the physical memory, 0 for none.
+    max_process_memory = None
 
     _singleton = {}
 
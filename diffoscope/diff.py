@@ -20,19 +20,20 @@
 import re
 import io
 import os
-import errno
-import fcntl
 import hashlib
 import logging
+import functools
 import threading
 import subprocess
 
 from multiprocessing.dummy import Queue
 
-from diffoscope.tempfiles import get_temporary_directory
+from diffoscope.scheduler import Scheduler
 
 from .tools import get_tool_name, tool_required
 from .config import Config
+from .feeders import CommandPump
+from .tempfiles import get_temporary_directory
 
 DIFF_CHUNK = 4096
 
@@ -160,20 +161,28 @@ class DiffParser(object):
 
 
 @tool_required('diff')
-def run_diff(fifo1, fifo2, end_nl_q1, end_nl_q2):
-    cmd = [get_tool_name('diff'), '-aU7', fifo1, fifo2]
+def run_diff(path1, path2, end_nl_q1, end_nl_q2, pass_fds=()):
+    cmd = [
+        get_tool_name('diff'),
+        '-aU7',
+        path1,
+        path2,
+    ]
 
     logger.debug("Running %s", ' '.join(cmd))
 
-    p = subprocess.Popen(
-        cmd,
-        bufsize=1,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-    )
-    parser = DiffParser(p.stdout, end_nl_q1, end_nl_q2)
-    parser.parse()
-    p.wait()
+    with Scheduler().slot(cmd[0]) as slot:
+        p = subprocess.Popen(
+            cmd,
+            bufsize=1,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            pass_fds=pass_fds,
+        )
+        slot.pid = p.pid
+        parser = DiffParser(p.stdout, end_nl_q1, end_nl_q2)
+        parser.parse()
+        p.wait()
 
     logger.debug(
         "%s: returncode %d, parsed %s",
@@ -191,65 +200,173 @@ def run_diff(fifo1, fifo2, end_nl_q1, end_nl_q2):
     return parser.diff
 
 
-class FIFOFeeder(threading.Thread):
-    def __init__(self, feeder, fifo_path, end_nl_q=None, daemon=True, *args):
-        os.mkfifo(fifo_path)
-        super().__init__(daemon=daemon)
+class FeederThread(threading.Thread):
+    """
+    Run a feeder writing to the pipe `fd`. Whether its output ends with a
+    newline is put on `end_nl_q`.
+    """
+
+    def __init__(self, feeder, fd, end_nl_q):
+        super().__init__(daemon=True)
         self.feeder = feeder
-        self.fifo_path = fifo_path
-        self.end_nl_q = Queue() if end_nl_q is None else end_nl_q
+        self.fd = fd
+        self.end_nl_q = end_nl_q
         self._exception = None
-        self._want_join = threading.Event()
-
-    def __enter__(self):
-        self.start()
-        return self
-
-    def __exit__(self, exc_type, exc_value, exc_tb):
-        self.join()
 
     def run(self):
         try:
-            # Try to open the FIFO nonblocking, so we can periodically check
-            # if the main thread wants us to wind down.  If it does, there's no
-            # more need for the FIFO, so stop the thread.
-            while True:
-                try:
-                    fd = os.open(self.fifo_path, os.O_WRONLY | os.O_NONBLOCK)
-                except OSError as error:
-                    if error.errno != errno.ENXIO:
-                        raise
-                    elif self._want_join.is_set():
-                        return
-                else:
-                    break
-
-            # Now clear the fd's nonblocking flag to let writes block normally.
-            fcntl.fcntl(fd, fcntl.F_SETFL, 0)
-
-            with open(fd, 'wb') as fifo:
+            with open(self.fd, 'wb') as out_file:
                 # The queue works around a unified diff limitation: if there's
                 # no newlines in both don't make it a difference
-                end_nl = self.feeder(fifo)
+                end_nl = self.feeder(out_file)
                 self.end_nl_q.put(end_nl)
         except Exception as error:
             self._exception = error
 
     def join(self):
-        self._want_join.set()
         super().join()
         if self._exception is not None:
             raise self._exception
 
 
+def start_feeding(feeder, fd, end_nl_q):
+    # Command output is copied by the I/O loop, everything else needs a
+    # thread as feeders may block.
+    command = getattr(feeder, 'command', None)
+    if command is not None:
+        writer = CommandPump(command, fd, end_nl_q)
+    else:
+        writer = FeederThread(feeder, fd, end_nl_q)
+    writer.start()
+    return writer
+
+
+@functools.lru_cache()
+def have_dev_fd():
+    """
+    Whether a process can open the file descriptors it inherited as
+    /dev/fd/N, which on FreeBSD needs fdescfs to be mounted.
+    """
+    read, write = os.pipe()
+    try:
+        return os.path.exists('/dev/fd/{}'.format(read))
+    finally:
+        os.close(read)
+        os.close(write)
+
+
+class FIFOWriter(object):
+    """
+    Feed diff(1) through the FIFO `path` rather than a pipe, for when it
+    cannot open the pipe as /dev/fd/N. Opening a FIFO for writing blocks
+    until it is opened for reading, so that is left to a thread, which then
+    starts feeding it.
+    """
+
+    def __init__(self, feeder, path, end_nl_q):
+        os.mkfifo(path)
+        self.feeder = feeder
+        self.path = path
+        self.end_nl_q = end_nl_q
+        self.writer = None
+        self._exception = None
+        self._thread = threading.Thread(target=self._open, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _open(self):
+        try:
+            fd = os.open(self.path, os.O_WRONLY)
+            self.writer = start_feeding(self.feeder, fd, self.end_nl_q)
+        except Exception as error:
+            self._exception = error
+
+    def abort(self):
+        # If diff(1) never opened the FIFO, open it ourselves so that the
+        # thread can, and then close it so that feeding fails with EPIPE.
+        fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        self._thread.join()
+        os.close(fd)
+        abort = getattr(self.writer, 'abort', None)
+        if abort is not None:
+            abort()
+
+    def join(self):
+        self._thread.join()
+        if self._exception is not None:
+            raise self._exception
+        self.writer.join()
+
+
+def join_all(writers):
+    """Join all `writers`, then raise the first exception of any of them."""
+    exception = None
+    for writer in writers:
+        try:
+            writer.join()
+        except Exception as error:
+            if exception is None:
+                exception = error
+    if exception is not None:
+        raise exception
+
+
 def diff(feeder1, feeder2):
-    tmpdir = get_temporary_directory().name
+    end_nl_q1 = Queue()
+    end_nl_q2 = Queue()
+    feeds = ((feeder1, end_nl_q1), (feeder2, end_nl_q2))
+
+    paths = []
+    read_fds = []
+    writers = []
+    try:
+        try:
+            if have_dev_fd():
+                for feeder, end_nl_q in feeds:
+                    read, write = os.pipe()
+                    read_fds.append(read)
+                    paths.append('/dev/fd/{}'.format(read))
+                    try:
+                        writer = start_feeding(feeder, write, end_nl_q)
+                    except:  # noqa
+                        os.close(write)
+                        raise
+                    writers.append(writer)
+            else:
+                tmpdir = get_temporary_directory().name
+                for (feeder, end_nl_q), name in zip(feeds, ('fifo1', 'fifo2')):
+                    paths.append(os.path.join(tmpdir, name))
+                    writer = FIFOWriter(feeder, paths[-1], end_nl_q)
+                    writer.start()
+                    writers.append(writer)
+            result = run_diff(
+                paths[0],
+                paths[1],
+                end_nl_q1,
+                end_nl_q2,
+                pass_fds=read_fds,
+            )
+        finally:
+            for fd in read_fds:
+                os.close(fd)
+    except:  # noqa
+        # Don't let a feeder failing to write hide why diff(1) did not run.
+        # Feeder threads stop by themselves, as their next write fails with
+        # EPIPE now that nobody reads the pipes, but commands may not write
+        # anything for a while.
+        for writer in writers:
+            abort = getattr(writer, 'abort', None)
+            if abort is not None:
+                abort()
+        try:
+            join_all(writers)
+        except Exception:
+            pass
+        raise
 
-    fifo1_path = os.path.join(tmpdir, 'fifo1')
-    fifo2_path = os.path.join(tmpdir, 'fifo2')
-    with FIFOFeeder(feeder1, fifo1_path) as fifo1, \
-            FIFOFeeder(feeder2, fifo2_path) as fifo2:
-        return run_diff(fifo1_path, fifo2_path, fifo1.end_nl_q, fifo2.end_nl_q)
+    join_all(writers)
+    return result
 
 
 def diff_split_lines(diff, keepends=True):
@@ -259,30 +376,49 @@ def diff_split_lines(diff, keepends=True):
     return [line + "\n" for line in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
 
 
-def reverse_unified_diff(diff):
-    res = []
-    for line in diff_split_lines(diff):
+def diff_iter_lines(diff):
+    """Like diff_split_lines(diff) but without building the list up front."""
+    start = 0
+    while True:
+        end = diff.find("\n", start) + 1
+        if not end:
+            if start < len(diff):
+                yield diff[start:]
+            return
+        yield diff[start:end]
+        start = end
+
+
+def reverse_unified_diff_lines(lines):
+    for line in lines:
         found = DiffParser.RANGE_RE.match(line)
 
         if found:
-            before = found.group('start2')
-            if found.group('len2') is not None:
-                before += ',' + found.group('len2')
-
-            after = found.group('start1')
+            # Swap the ranges in place, so that the line keeps its length.
+            start1, end1 = found.start('start1'), found.end('start1')
             if found.group('len1') is not None:
-                after += ',' + found.group('len1')
-
-            res.append('@@ -%s +%s @@\n' % (before, after))
+                end1 = found.end('len1')
+            start2, end2 = found.start('start2'), found.end('start2')
+            if found.group('len2') is not None:
+                end2 = found.end('len2')
+
+            yield ''.join((
+                line[:start1],
+                line[start2:end2],
+                line[end1:start2],
+                line[start1:end1],
+                line[end2:],
+            ))
         elif line.startswith('-'):
-            res.append('+')
-            res.append(line[1:])
+            yield '+' + line[1:]
         elif line.startswith('+'):
-            res.append('-')
-            res.append(line[1:])
+            yield '-' + line[1:]
         else:
-            res.append(line)
-    return ''.join(res)
+            yield line
+
+
+def reverse_unified_diff(diff):
+    return ''.join(reverse_unified_diff_lines(diff_iter_lines(diff)))
 
 
 def color_unified_diff(diff):
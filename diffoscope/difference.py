@@ -19,10 +19,13 @@
 
 import heapq
 import logging
+import weakref
+import collections
 
 from . import feeders
 from .exc import RequiredToolNotFound
-from .diff import diff, reverse_unified_diff, diff_split_lines
+from .diff import diff, reverse_unified_diff_lines, diff_iter_lines
+from .executor import run_all
 from .excludes import command_excluded
 
 logger = logging.getLogger(__name__)
@@ -62,7 +65,16 @@ class Difference(object):
         self._has_internal_linenos = has_internal_linenos
         self._details = details or []
         self._visuals = visuals or []
-        self._size_cache = None
+
+        # Sizes are kept up to date as the tree is built and mutated, so that
+        # size() and size_self() are O(1). Mutations are propagated upwards
+        # through _parents, which holds weak references.
+        self._parents = []
+        self._size_self = self._compute_size_self()
+        self._size = self._size_self
+        for d in self._details:
+            d._parents.append(weakref.ref(self))
+            self._size += d.size()
 
     def __repr__(self):
         return "<Difference %s -- %s %s>" % (
@@ -72,92 +84,136 @@ class Difference(object):
         )
 
     def map_lines(self, f_diff, f_comment):
-        unified_diff = self.unified_diff
-        return self.__class__(
-            "".join(map(f_diff, diff_split_lines(unified_diff))) if unified_diff is not None else None,
-            self.source1,
-            self.source2,
-            comment=["".join(map(f_comment, diff_split_lines(comment))) for comment in self._comments],
-            has_internal_linenos=self.has_internal_linenos,
-            details=self._details[:],
-            visuals=self._visuals[:],
-        )
+        return MappedDifference(self, f_diff, f_comment)
 
     def fmap(self, f):
-        return f(self.__class__(
-            self.unified_diff,
-            self.source1,
-            self.source2,
-            comment=self._comments[:],
-            has_internal_linenos=self.has_internal_linenos,
-            details=[d.fmap(f) for d in self._details],
-            visuals=self._visuals[:],
-        ))
-
-    def _reverse_self(self):
-        # assumes we're being called from get_reverse()
-        if self._visuals:
-            raise NotImplementedError(
-                "_reverse_self on VisualDifference is not yet implemented",
-            )
-        return self.__class__(
-            reverse_unified_diff(self.unified_diff) if self.unified_diff is not None else None,
-            self.source2,
-            self.source1,
-            comment=self._comments, # already copied by fmap in get_reverse
-            has_internal_linenos=self.has_internal_linenos,
-            details=self._details, # already reversed by fmap in get_reverse, no need to copy
-        )
+        # Rebuild the tree bottom-up with an explicit stack rather than by
+        # recursion, so deeply-nested trees do not hit the recursion limit.
+        # `f` is still applied to children before their parent, left to right.
+        results = []
+        stack = [(self, False)]
+        while stack:
+            node, expanded = stack.pop()
+            if not expanded:
+                stack.append((node, True))
+                stack.extend((d, False) for d in reversed(node._details))
+                continue
+            split = len(results) - len(node._details)
+            details = results[split:]
+            del results[split:]
+            results.append(f(Difference(
+                node.unified_diff,
+                node.source1,
+                node.source2,
+                comment=node._comments[:],
+                has_internal_linenos=node.has_internal_linenos,
+                details=details,
+                visuals=node._visuals[:],
+            )))
+        return results[0]
 
     def get_reverse(self):
         logger.debug("Reverse orig %s %s", self.source1, self.source2)
-        return self.fmap(Difference._reverse_self)
+        return ReverseDifference(self)
 
     def equals(self, other):
-        return self == other or (
-            self.unified_diff == other.unified_diff and
-            self.source1 == other.source1 and
-            self.source2 == other.source2 and
-            self._comments == other._comments and
-            self.has_internal_linenos == other.has_internal_linenos and
-            all(x.equals(y) for x, y in zip(self._details, other._details)) and
-            all(x.equals(y) for x, y in zip(self._visuals, other._visuals)))
+        pending = [(self, other)]
+        while pending:
+            x, y = pending.pop()
+            if x == y:
+                continue
+            if not (
+                x.unified_diff == y.unified_diff and
+                x.source1 == y.source1 and
+                x.source2 == y.source2 and
+                x._comments == y._comments and
+                x.has_internal_linenos == y.has_internal_linenos and
+                all(a.equals(b) for a, b in zip(x._visuals, y._visuals))
+            ):
+                return False
+            pending.extend(zip(x._details, y._details))
+        return True
 
     def size(self):
-        if self._size_cache is None:
-            self._size_cache = sum(d.size_self() for d in self.traverse_depth())
-        return self._size_cache
+        if self._size is None:
+            self._size = sum(d.size_self() for d in self.traverse_depth())
+        return self._size
 
     def size_self(self):
         """Size, excluding children."""
-        return ((len(self.unified_diff) if self.unified_diff else 0) +
+        if self._size_self is None:
+            self._size_self = self._compute_size_self()
+        return self._size_self
+
+    def _compute_size_self(self):
+        return (self._unified_diff_size() +
                 (len(self.source1) if self.source1 else 0) +
                 (len(self.source2) if self.source2 else 0) +
                 sum(map(len, self.comments)) +
                 sum(v.size() for v in self._visuals))
 
+    def _unified_diff_size(self):
+        return len(self.unified_diff) if self.unified_diff else 0
+
+    def _grow(self, delta):
+        if self._size_self is not None:
+            self._size_self += delta
+        self._grow_subtree(delta)
+
+    def _grow_subtree(self, delta):
+        # A node may be shared between several trees (e.g. by map_lines), so
+        # first find all its ancestors, dropping dead references on the way.
+        parents = {}
+        pending = [self]
+        while pending:
+            node = pending.pop()
+            if node in parents:
+                continue
+            refs = [(ref, ref()) for ref in node._parents]
+            node._parents = [ref for ref, p in refs if p is not None]
+            parents[node] = [p for _, p in refs if p is not None]
+            pending.extend(parents[node])
+
+        # Then update each of them once, children first, by delta times the
+        # number of paths from us, as that is how often size() counts us.
+        children = collections.Counter(
+            p for xs in parents.values() for p in xs
+        )
+        paths = collections.Counter({self: 1})
+        ready = [self]
+        while ready:
+            node = ready.pop()
+            if node._size is not None:
+                node._size += delta * paths[node]
+            for p in parents[node]:
+                paths[p] += paths[node]
+                children[p] -= 1
+                if not children[p]:
+                    ready.append(p)
+
     def has_visible_children(self):
         """
         Whether there are visible children.
 
         Useful for e.g. choosing whether to display [+]/[-] controls.
         """
-        return (self._unified_diff is not None or
+        return (self._has_unified_diff() or
                 self._comments or self._details or self._visuals)
 
     def traverse_depth(self, depth=-1):
-        yield self
-        if depth != 0:
-            for d in self._details:
-                yield from d.traverse_depth(depth-1)
+        stack = [(self, depth)]
+        while stack:
+            top, remaining = stack.pop()
+            yield top
+            if remaining != 0:
+                stack.extend((d, remaining - 1) for d in reversed(top._details))
 
     def traverse_breadth(self, queue=None):
-        queue = queue if queue is not None else [self]
-        if queue:
-            top = queue.pop(0)
+        queue = collections.deque(queue if queue is not None else [self])
+        while queue:
+            top = queue.popleft()
             yield top
             queue.extend(top._details)
-            yield from self.traverse_breadth(queue)
 
     def traverse_heapq(self, scorer, yield_score=False, queue=None):
         """Traverse the difference tree using a priority queue, where each node
@@ -244,7 +300,6 @@ class Difference(object):
                 feeder = feeders.from_command(command)
                 if command_excluded(command.shell_cmdline()):
                     return None, None, True
-                command.start()
             return feeder, command, False
 
         feeder1, command1, excluded1 = command_and_feeder(path1)
@@ -257,14 +312,30 @@ class Difference(object):
             source_cmd = command1 or command2
             kwargs['source'] = source_cmd.shell_cmdline()
 
-        difference = Difference.from_feeder(
-            feeder1,
-            feeder2,
-            path1,
-            path2,
-            *args,
-            **kwargs
-        )
+        # Neither command is started until we know that both of them are to be
+        # run, so that an excluded one does not leave the other one behind.
+        started = []
+        try:
+            for command in (command1, command2):
+                if command is not None:
+                    command.start()
+                    started.append(command)
+            difference = Difference.from_feeder(
+                feeder1,
+                feeder2,
+                path1,
+                path2,
+                *args,
+                **kwargs
+            )
+        finally:
+            # The feeders normally wait for the commands, but not if diff(1)
+            # or the other feeder failed. Commands must always be waited for
+            # to give up their Scheduler slots.
+            for command in started:
+                if command.poll() is None:
+                    command.terminate()
+                command.wait()
         if not difference:
             return None, False
 
@@ -281,6 +352,18 @@ class Difference(object):
 
         return difference, False
 
+    @staticmethod
+    def from_commands(calls):
+        """
+        Like calling from_command() for each (klass, path1, path2[, kwargs])
+        tuple of `calls`, but running the commands and their diffs
+        concurrently, up to Config().jobs at a time.
+        """
+        return run_all(
+            (Difference.from_command, x[:3], x[3] if len(x) > 3 else {})
+            for x in calls
+        )
+
     @property
     def comment(self):
         return '\n'.join(self._comments)
@@ -290,9 +373,9 @@ class Difference(object):
         return self._comments
 
     def add_comment(self, comment):
-        for line in comment.splitlines():
-            self._comments.append(line)
-        self._size_cache = None
+        lines = comment.splitlines()
+        self._comments.extend(lines)
+        self._grow(sum(map(len, lines)))
 
     @property
     def source1(self):
@@ -306,6 +389,15 @@ class Difference(object):
     def unified_diff(self):
         return self._unified_diff
 
+    def _has_unified_diff(self):
+        return self._unified_diff is not None
+
+    def unified_diff_lines(self):
+        """Iterate over the lines of the unified diff, keeping line endings."""
+        if self.unified_diff is None:
+            return iter(())
+        return diff_iter_lines(self.unified_diff)
+
     @property
     def has_internal_linenos(self):
         return self._has_internal_linenos
@@ -319,16 +411,120 @@ class Difference(object):
         return self._visuals
 
     def add_details(self, differences):
-        if len([d for d in differences if type(d) is not Difference]) > 0:
+        if not all(isinstance(d, Difference) for d in differences):
             raise TypeError("'differences' must contains Difference objects'")
         self._details.extend(differences)
-        self._size_cache = None
+        for d in differences:
+            d._parents.append(weakref.ref(self))
+        self._grow_subtree(sum(d.size() for d in differences))
 
     def add_visuals(self, visuals):
         if any([type(v) is not VisualDifference for v in visuals]):
             raise TypeError("'visuals' must contain VisualDifference objects'")
         self._visuals.extend(visuals)
-        self._size_cache = None
+        self._grow(sum(v.size() for v in visuals))
+
+
+class DifferenceView(Difference):
+    """
+    A read-only view on another Difference.
+
+    The unified diff of the underlying Difference is not copied; instead,
+    subclasses transform it line by line as it is being read, and it is only
+    joined for callers of the unified_diff property, without being kept.
+    Comments and details are held in lists of their own, so the view can
+    still be extended without affecting the underlying Difference.
+    """
+
+    def __init__(self, orig, source1, source2, comments, details):
+        self._orig = orig
+        self._source1 = source1
+        self._source2 = source2
+        self._comments = comments
+        self._has_internal_linenos = orig.has_internal_linenos
+        self._details_list = details
+        self._visuals = orig.visuals[:]
+        # Computing sizes may mean reading the unified diff, so only do it on
+        # demand.
+        self._parents = []
+        self._size_self = None
+        self._size = None
+        for d in details or ():
+            d._parents.append(weakref.ref(self))
+
+    @property
+    def _unified_diff(self):
+        if not self._has_unified_diff():
+            return None
+        return ''.join(self.unified_diff_lines())
+
+    def _unified_diff_size(self):
+        return sum(map(len, self.unified_diff_lines()))
+
+    @property
+    def _details(self):
+        return self._details_list
+
+    def _has_unified_diff(self):
+        return self._orig._has_unified_diff()
+
+
+class ReverseDifference(DifferenceView):
+    """View of a Difference with its two sides swapped."""
+
+    def __init__(self, orig):
+        if orig.visuals:
+            raise NotImplementedError(
+                "Reversing a VisualDifference is not yet implemented",
+            )
+        super().__init__(
+            orig,
+            orig.source2,
+            orig.source1,
+            orig.comments[:],
+            None,
+        )
+
+    @property
+    def _details(self):
+        # Children are only wrapped once something asks for them.
+        if self._details_list is None:
+            self._details_list = [
+                ReverseDifference(d) for d in self._orig.details
+            ]
+            for d in self._details_list:
+                d._parents.append(weakref.ref(self))
+        return self._details_list
+
+    def unified_diff_lines(self):
+        return reverse_unified_diff_lines(self._orig.unified_diff_lines())
+
+    def _unified_diff_size(self):
+        # Reversing a diff does not change the length of its lines.
+        return self._orig._unified_diff_size()
+
+
+class MappedDifference(DifferenceView):
+    """
+    View of a Difference with a function applied to every line of its unified
+    diff and of its comments. Details are not mapped.
+    """
+
+    def __init__(self, orig, f_diff, f_comment):
+        self._f_diff = f_diff
+        super().__init__(
+            orig,
+            orig.source1,
+            orig.source2,
+            [
+                ''.join(map(f_comment, diff_iter_lines(comment)))
+                for comment in orig.comments
+            ],
+            orig.details[:],
+        )
+
+    def unified_diff_lines(self):
+        return map(self._f_diff, self._orig.unified_diff_lines())
 
 
 class VisualDifference(object):
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import threading
+import concurrent.futures
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+_executor_jobs = None
+_local = threading.local()
+
+
+def _get_executor():
+    global _executor, _executor_jobs
+
+    with _lock:
+        if _executor is None or _executor_jobs != Config().jobs:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor_jobs = Config().jobs
+            logger.debug("Running up to %d jobs at once", _executor_jobs)
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=_executor_jobs,
+            )
+        return _executor
+
+
+def _run(fn, args, kwargs):
+    _local.in_worker = True
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _local.in_worker = False
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Schedule fn(*args, **kwargs) to run alongside other jobs, at most
+    Config().jobs at a time, and return a concurrent.futures.Future.
+
+    Jobs are expected to spend their time waiting for subprocesses (external
+    tools and diff(1)), so they are run in threads. Jobs submitted from
+    within a job, or when only one job may run at a time, are run straight
+    away in the calling thread so that they cannot deadlock waiting for a
+    free worker.
+    """
+    if Config().jobs <= 1 or getattr(_local, 'in_worker', False):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _get_executor().submit(_run, fn, args, kwargs)
+
+
+def run_all(calls):
+    """
+    Run each (fn, args, kwargs) of `calls` with submit() and return their
+    results in order. The first exception, if any, is re-raised once all of
+    them have completed.
+    """
+    futures = [submit(fn, *args, **kwargs) for fn, args, kwargs in calls]
+    concurrent.futures.wait(futures)
+    return [x.result() for x in futures]
@@ -240,11 +240,6 @@ EXTERNAL_TOOLS = {
         'arch': 'squashfs-tools',
         'FreeBSD': 'squashfs-tools',
     },
-    'xxd': {
-        'debian': 'xxd | vim-common',
-        'arch': 'vim',
-        'FreeBSD': 'vim | vim-lite',
-    },
     'xz': {
         'debian': 'xz-utils',
         'arch': 'xz',
@@ -17,53 +17,108 @@
 # You should have received a copy of the GNU General Public License
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
+import os
 import signal
 import hashlib
 import logging
+import threading
 import subprocess
 
 from .config import Config
+from .ioloop import IOLoop, READ_SIZE, set_nonblocking
 from .profiling import profile
 
 logger = logging.getLogger(__name__)
 
 DIFF_CHUNK = 4096
 
+# Lines are batched up and written in chunks of at most this size.
+FEEDER_BATCH_SIZE = 65536
 
-def from_raw_reader(in_file, filter=lambda buf: buf):
-    def feeder(out_file):
-        max_lines = Config().max_diff_input_lines
-        end_nl = False
-        line_count = 0
+
+def write_chunks(out_file, data, chunk_size=FEEDER_BATCH_SIZE):
+    # Very long lines can sometimes interact negatively with python buffering
+    # (see https://bugs.debian.org/870049), so write in bounded chunks and
+    # flush each of them rather than leaving anything in the buffer.
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        out_file.write(view[offset:offset + chunk_size])
+        out_file.flush()
+
+
+class LineLimiter(object):
+    """
+    Filter lines on their way to diff(1), batching them up and cutting them
+    off after max_diff_input_lines. Lines are pushed in with add(), which
+    returns the data to write (if any); finish() returns the remaining data
+    and whether it ends with a newline.
+    """
+
+    def __init__(self, filter=lambda buf: buf):
+        self.filter = filter
+        self.max_lines = Config().max_diff_input_lines
+        self.end_nl = False
+        self.line_count = 0
 
         # If we have a maximum size, hash the content as we go along so we can
         # display a nicer message.
-        h = None
-        if max_lines < float('inf'):
-            h = hashlib.sha1()
+        self.h = None
+        if self.max_lines < float('inf'):
+            self.h = hashlib.sha1()
 
-        for buf in in_file:
-            line_count += 1
-            out = filter(buf)
-
-            if h is not None:
-                h.update(out)
-
-            if line_count < max_lines:
-                out_file.write(out)
-                # very long lines can sometimes interact negatively with
-                # python buffering; force a flush here to avoid this,
-                # see https://bugs.debian.org/870049
-                out_file.flush()
-            if buf:
-                end_nl = buf[-1] == '\n'
-
-        if h is not None and line_count >= max_lines:
-            out_file.write("[ Too much input for diff (SHA1: {}) ]\n".format(
-                h.hexdigest(),
-            ).encode('utf-8'))
-            end_nl = True
+        # Rather than one write(2) (and one SHA1 update) per line, accumulate
+        # lines and process them in batches of FEEDER_BATCH_SIZE.
+        self.pending = []
+        self.pending_len = 0
+
+    def flush_pending(self, write):
+        data = b''.join(self.pending)
+        del self.pending[:]
+        self.pending_len = 0
+        if self.h is not None:
+            self.h.update(data)
+        return data if write else b''
+
+    def add(self, buf):
+        result = b''
+        self.line_count += 1
+        if self.line_count == self.max_lines:
+            # This is the first line we won't write; flush what we have.
+            result = self.flush_pending(True)
+
+        out = self.filter(buf)
+        self.pending.append(out)
+        self.pending_len += len(out)
+        if self.pending_len >= FEEDER_BATCH_SIZE:
+            result += self.flush_pending(self.line_count < self.max_lines)
 
+        if buf:
+            self.end_nl = buf[-1] == '\n'
+
+        return result
+
+    def finish(self):
+        result = self.flush_pending(self.line_count < self.max_lines)
+
+        if self.h is not None and self.line_count >= self.max_lines:
+            result += "[ Too much input for diff (SHA1: {}) ]\n".format(
+                self.h.hexdigest(),
+            ).encode('utf-8')
+            self.end_nl = True
+
+        return result, self.end_nl
+
+
+def from_raw_reader(in_file, filter=lambda buf: buf):
+    def feeder(out_file):
+        limiter = LineLimiter(filter)
+        for buf in in_file:
+            data = limiter.add(buf)
+            if data:
+                write_chunks(out_file, data)
+        data, end_nl = limiter.finish()
+        if data:
+            write_chunks(out_file, data)
         return end_nl
     return feeder
 
@@ -74,6 +129,22 @@ def from_text_reader(in_file, filter=lambda text_buf: text_buf):
     return from_raw_reader(in_file, encoding_filter)
 
 
+def finish_command(command):
+    """
+    Wait for `command` once we have read all of its output, raising
+    CalledProcessError if it failed.
+    """
+    if command.poll() is None:
+        command.terminate()
+    returncode = command.wait()
+    if returncode not in (0, -signal.SIGTERM):
+        raise subprocess.CalledProcessError(
+            returncode,
+            command.cmdline(),
+            output=command.stderr.getvalue(),
+        )
+
+
 def from_command(command):
     def feeder(out_file):
         with profile('command', command.cmdline()[0]):
@@ -82,19 +153,138 @@ def from_command(command):
                 command.filter,
             )
             end_nl = feeder(out_file)
-            if command.poll() is None:
-                command.terminate()
-            returncode = command.wait()
-        if returncode not in (0, -signal.SIGTERM):
-            raise subprocess.CalledProcessError(
-                returncode,
-                command.cmdline(),
-                output=command.stderr.getvalue(),
-            )
+            finish_command(command)
         return end_nl
+    # Lets diff() copy the output with a CommandPump instead of a thread.
+    feeder.command = command
     return feeder
 
 
+class CommandPump(object):
+    """
+    Feed the output of a started Command to the pipe `fd` like the
+    from_command() feeder, but from the I/O loop thread instead of a thread
+    of its own. Whether the output ends with a newline is put on `end_nl_q`.
+    """
+
+    # Stop reading from the command while this much filtered output is
+    # waiting to be written.
+    HIGH_WATER = 4 * FEEDER_BATCH_SIZE
+
+    def __init__(self, command, fd, end_nl_q):
+        self.command = command
+        self.fd = fd
+        self.end_nl_q = end_nl_q
+        self._limiter = LineLimiter(command.filter)
+        self._partial = []
+        self._buffer = bytearray()
+        self._end_nl = False
+        self._eof = False
+        self._closed = False
+        self._exception = None
+        self._done = threading.Event()
+        self._profile = profile('command', command.cmdline()[0])
+
+    def start(self):
+        self._profile.__enter__()
+        IOLoop().call_soon(self._start)
+
+    def abort(self):
+        """Stop feeding, eg. because diff(1) could not be run."""
+        IOLoop().call_soon(self._close)
+
+    def join(self):
+        self._done.wait()
+        try:
+            if self._exception is not None:
+                # The command still has to be waited for, to give up its
+                # Scheduler slot.
+                if self.command.poll() is None:
+                    self.command.terminate()
+                self.command.wait()
+                raise self._exception
+            finish_command(self.command)
+        finally:
+            self._profile.__exit__(None, None, None)
+
+    # The methods below run on the I/O loop thread.
+
+    def _start(self):
+        if self._closed:
+            return
+        self._in = self.command.stdout.fileno()
+        set_nonblocking(self._in)
+        set_nonblocking(self.fd)
+        self._update()
+
+    def _update(self):
+        loop = IOLoop()
+        if self._buffer:
+            loop.add_writer(self.fd, self._write)
+        elif self._eof:
+            self.end_nl_q.put(self._end_nl)
+            self._close()
+            return
+        else:
+            loop.remove_writer(self.fd)
+        if self._eof or len(self._buffer) >= self.HIGH_WATER:
+            loop.remove_reader(self._in)
+        else:
+            loop.add_reader(self._in, self._read)
+
+    def _read(self, fd):
+        try:
+            data = os.read(fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as error:
+            self._fail(error)
+            return
+
+        if data:
+            *lines, rest = data.split(b'\n')
+            if lines:
+                lines[0] = b''.join(self._partial) + lines[0]
+                self._partial = []
+                for line in lines:
+                    self._buffer += self._limiter.add(line + b'\n')
+            if rest:
+                self._partial.append(rest)
+        else:
+            if self._partial:
+                self._buffer += self._limiter.add(b''.join(self._partial))
+            data, self._end_nl = self._limiter.finish()
+            self._buffer += data
+            self._eof = True
+        self._update()
+
+    def _write(self, fd):
+        try:
+            written = os.write(fd, self._buffer[:FEEDER_BATCH_SIZE])
+        except BlockingIOError:
+            return
+        except OSError as error:
+            self._fail(error)
+            return
+        del self._buffer[:written]
+        self._update()
+
+    def _fail(self, error):
+        self._exception = error
+        self._close()
+
+    def _close(self):
+        if self._closed:
+            return
+        self._closed = True
+        loop = IOLoop()
+        if hasattr(self, '_in'):
+            loop.remove_reader(self._in)
+            loop.remove_writer(self.fd)
+        os.close(self.fd)
+        self._done.set()
+
+
 def from_text(content):
     def feeder(f):
         for offset in range(0, len(content), DIFF_CHUNK):
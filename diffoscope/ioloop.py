@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import fcntl
+import logging
+import selectors
+import threading
+import collections
+
+logger = logging.getLogger(__name__)
+
+# How much we try to read from a pipe at once.
+READ_SIZE = 65536
+
+
+def set_nonblocking(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+
+class IOLoop(object):
+    """
+    A single thread waiting on the pipes of all running processes at once
+    with a selector, rather than dedicating a thread to each of them.
+
+    Callbacks registered with add_reader() and add_writer() are called with
+    the file descriptor when it is ready, on the loop thread, and so must not
+    block. add_reader(), add_writer() and their remove_*() counterparts may
+    only be used from the loop thread: other threads go through call_soon().
+    """
+
+    _singleton = {}
+
+    def __init__(self):
+        self.__dict__ = self._singleton
+
+        if not self._singleton:
+            self._lock = threading.Lock()
+            self._calls = collections.deque()
+            self._thread = None
+
+    def _start(self):
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        set_nonblocking(self._wakeup_r)
+        set_nonblocking(self._wakeup_w)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._thread = threading.Thread(
+            target=self._run,
+            name='diffoscope-ioloop',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def call_soon(self, fn, *args):
+        """Run fn(*args) on the loop thread."""
+        with self._lock:
+            if self._thread is None:
+                self._start()
+            self._calls.append((fn, args))
+        try:
+            os.write(self._wakeup_w, b'\0')
+        except BlockingIOError:
+            pass  # A wakeup is already pending
+
+    def add_reader(self, fd, callback):
+        self._set(fd, selectors.EVENT_READ, callback)
+
+    def add_writer(self, fd, callback):
+        self._set(fd, selectors.EVENT_WRITE, callback)
+
+    def remove_reader(self, fd):
+        self._set(fd, selectors.EVENT_READ, None)
+
+    def remove_writer(self, fd):
+        self._set(fd, selectors.EVENT_WRITE, None)
+
+    def _set(self, fd, event, callback):
+        try:
+            key = self._selector.get_key(fd)
+        except KeyError:
+            key = None
+            callbacks = {}
+        else:
+            if key.data.get(event) is callback:
+                return
+            callbacks = dict(key.data)
+
+        if callback is None:
+            callbacks.pop(event, None)
+        else:
+            callbacks[event] = callback
+
+        events = 0
+        for x in callbacks:
+            events |= x
+
+        if key is None:
+            if events:
+                self._selector.register(fd, events, callbacks)
+        elif events:
+            self._selector.modify(fd, events, callbacks)
+        else:
+            self._selector.unregister(fd)
+
+    def _run_calls(self):
+        while True:
+            with self._lock:
+                if not self._calls:
+                    return
+                fn, args = self._calls.popleft()
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception("Error in I/O loop call %r", fn)
+
+    def _run(self):
+        while True:
+            for key, events in self._selector.select():
+                if key.fd == self._wakeup_r:
+                    try:
+                        while os.read(self._wakeup_r, READ_SIZE):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                for event in (selectors.EVENT_READ, selectors.EVENT_WRITE):
+                    if not events & event:
+                        continue
+                    # An earlier callback may have unregistered the fd.
+                    try:
+                        callback = self._selector.get_key(key.fd).data.get(event)
+                    except KeyError:
+                        break
+                    if callback is None:
+                        continue
+                    try:
+                        callback(key.fd)
+                    except Exception:
+                        logger.exception("Error in I/O loop callback %r", callback)
+
+            self._run_calls()
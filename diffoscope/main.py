@@ -106,6 +106,18 @@ def create_parser():
                         help='Write HTML report to given file (use - for stdout)')
     group1.add_argument('--html-dir', metavar='OUTPUT_DIR', dest='html_output_directory',
                         help='Write multi-file HTML report to given directory')
+    group1.add_argument('--html-lazy-dir', metavar='OUTPUT_DIR',
+                        dest='html_lazy_output_directory',
+                        help='Write HTML report to given directory as a page '
+                        'that loads each part of the report from compressed '
+                        'JSON files when it is expanded. Needs to be served '
+                        'over HTTP to be viewed.')
+    group1.add_argument('--stream', action='store_true', default=False,
+                        help='When comparing directories, write each part '
+                        'of the report as soon as it is complete instead of '
+                        'once the comparison has finished, and do not keep '
+                        'it in memory. Only applies to text, JSON, Markdown '
+                        'and reStructuredText output.')
     group1.add_argument('--css', metavar='URL', dest='css_url',
                         help='Link to an extra CSS for the HTML report')
     group1.add_argument('--jquery', metavar='URL', dest='jquery_url',
@@ -117,6 +129,11 @@ def create_parser():
                         ', '.join(JQUERY_SYSTEM_LOCATIONS))
     group1.add_argument('--json', metavar='OUTPUT_FILE', dest='json_output',
                         help='Write JSON text output to given file (use - for stdout)')
+    group1.add_argument('--binary-report', metavar='OUTPUT_FILE',
+                        dest='binary_report_output',
+                        help='Write an indexed binary report to given file, '
+                        'which can be loaded back and rendered a node at a '
+                        'time (use - for stdout)')
     group1.add_argument('--markdown', metavar='OUTPUT_FILE', dest='markdown_output',
                         help='Write Markdown text output to given file (use - for stdout)')
     group1.add_argument('--restructured-text', metavar='OUTPUT_FILE',
@@ -163,8 +180,10 @@ def create_parser():
                         'on the top-level (--html-dir) or sole (--html) page, before '
                         'spilling it into child pages (--html-dir) or skipping the '
                         'rest of the diff block. Child pages are limited instead by '
-                        '--max-page-size-child. (default: %(default)s, remains in '
-                        'effect even with --no-default-limits)', default=
+                        '--max-page-size-child. In --html-lazy-dir output, this '
+                        'is the number of lines loaded at a time. (default: '
+                        '%(default)s, remains in effect even with '
+                        '--no-default-limits)', default=
                         Config().max_page_diff_block_lines).completer=RangeCompleter(
                         Config().max_page_diff_block_lines)
     # TODO: old flag kept for backwards-compat, drop 6 months after v84
@@ -212,6 +231,11 @@ def create_parser():
                         '(Cannot be disabled for security reasons, default: '
                         '%(default)s)',
                         default=Config().max_container_depth)
+    group3.add_argument('--jobs', metavar='JOBS', type=int,
+                        help='Maximum number of external commands and '
+                        'diffs to run at the same time, and of processes '
+                        'rendering the diffs of big HTML reports (default: '
+                        'the number of CPUs, %(default)s)', default=Config().jobs)
     group3.add_argument('--max-diff-block-lines-saved', metavar='LINES', type=int,
                         help='Maximum number of lines saved per diff block. '
                         'Most users should not need this, unless you run out '
@@ -250,9 +274,11 @@ def create_parser():
     def post_parse(parsed_args):
         if parsed_args.path2 is None:
             # warn about unusual flags in this mode
+            # (--jobs is also used when rendering HTML output.)
             ineffective_flags = [f
                                  for x in group3._group_actions
                                  if getattr(parsed_args, x.dest) != x.default
+                                 and x.dest != 'jobs'
                                  for f in x.option_strings]
             if ineffective_flags:
                 logger.warning("Loading diff instead of calculating it, but diff-calculation flags were given; they will be ignored:")
@@ -360,6 +386,7 @@ def run_diffoscope(parsed_args):
     maybe_set_limit(Config(), parsed_args, "max_diff_input_lines")
     Config().max_container_depth = parsed_args.max_container_depth
     Config().force_details = parsed_args.force_details
+    Config().jobs = max(1, parsed_args.jobs)
     Config().fuzzy_threshold = parsed_args.fuzzy_threshold
     Config().new_file = parsed_args.new_file
     Config().excludes = parsed_args.excludes
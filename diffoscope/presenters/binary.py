@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import sys
+import json
+import zlib
+import struct
+import hashlib
+import collections
+
+from ..compression import open_output
+
+from .utils import Presenter
+
+# A binary report is laid out as:
+#
+#   HEADER
+#   compressed blobs, two per node: its metadata and its unified diff
+#   the node table, NODE.size bytes per node in breadth-first order
+#   the path index, an open-addressing hash table of INDEX_SLOT entries
+#   TRAILER
+#
+# As nodes are numbered breadth-first, the children of a node are consecutive
+# entries of the node table, so any node and its blobs can be located without
+# reading the rest of the report.
+
+BINARY_FORMAT_MAGIC = b'DFSCOPE\x00'
+BINARY_FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<8sI')
+
+# meta offset, meta length, diff offset, diff length, size_self, size,
+# parent, first child, number of children, flags
+NODE = struct.Struct('<QIQIQQIIIB')
+
+# path key, node number + 1 (0 for an empty slot)
+INDEX_SLOT = struct.Struct('<QI')
+
+# node table offset, node count, index offset, index slots, magic
+TRAILER = struct.Struct('<QQQQ8s')
+
+NO_PARENT = 0xffffffff
+
+FLAG_HAS_DIFF = 1
+FLAG_HAS_INTERNAL_LINENOS = 2
+
+ROOT_PATH_DIGEST = hashlib.sha1().digest()
+
+
+def path_digest(parent_digest, name):
+    """
+    Digest of the path to a node, chained from that of its parent. Paths are
+    the source1 names of the nodes below the root.
+    """
+    return hashlib.sha1(
+        parent_digest + name.encode('utf-8', 'surrogatepass'),
+    ).digest()
+
+
+def path_key(digest):
+    return int.from_bytes(digest[:8], 'little')
+
+
+def index_slots(node_count):
+    slots = 1
+    while slots < 2 * node_count:
+        slots *= 2
+    return slots
+
+
+class BinaryReportPresenter(Presenter):
+    """
+    Write a report that can be read back one node at a time, see
+    readers/binary.py.
+    """
+
+    traversal = None
+
+    def __init__(self, output):
+        self.output = output
+        self.offset = 0
+
+        super().__init__()
+
+    @classmethod
+    def run(cls, data, difference, parsed_args):
+        if data['target'] == '-':
+            cls(sys.stdout.buffer).start(difference)
+            sys.stdout.buffer.flush()
+            return
+
+        with open_output(data['target'], binary=True) as f:
+            cls(f).start(difference)
+
+    def write(self, data):
+        self.output.write(data)
+        self.offset += len(data)
+
+    def write_blob(self, val):
+        data = zlib.compress(val.encode('utf-8', 'surrogatepass'))
+        offset = self.offset
+        self.write(data)
+        return offset, len(data)
+
+    def start(self, difference):
+        self.write(HEADER.pack(BINARY_FORMAT_MAGIC, BINARY_FORMAT_VERSION))
+
+        nodes = []
+        keys = []
+        queue = collections.deque([(difference, NO_PARENT, ROOT_PATH_DIGEST)])
+        while queue:
+            node, parent, digest = queue.popleft()
+            number = len(nodes)
+
+            meta_offset, meta_length = self.write_blob(json.dumps([
+                node.source1,
+                node.source2,
+                node.comments,
+                [[x.data_type, x.content, x.source] for x in node.visuals],
+            ]))
+
+            flags = 0
+            diff_offset, diff_length = 0, 0
+            if node.unified_diff is not None:
+                flags |= FLAG_HAS_DIFF
+                diff_offset, diff_length = self.write_blob(node.unified_diff)
+            if node.has_internal_linenos:
+                flags |= FLAG_HAS_INTERNAL_LINENOS
+
+            details = node.details
+            nodes.append(NODE.pack(
+                meta_offset,
+                meta_length,
+                diff_offset,
+                diff_length,
+                node.size_self(),
+                node.size(),
+                parent,
+                number + 1 + len(queue),
+                len(details),
+                flags,
+            ))
+            keys.append(path_key(digest))
+            queue.extend(
+                (x, number, path_digest(digest, x.source1)) for x in details
+            )
+
+        nodes_offset = self.offset
+        for x in nodes:
+            self.write(x)
+
+        slots = [0] * index_slots(len(keys))
+        mask = len(slots) - 1
+        for number, key in enumerate(keys):
+            slot = key & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = number + 1
+
+        index_offset = self.offset
+        for x in slots:
+            self.write(INDEX_SLOT.pack(keys[x - 1] if x else 0, x))
+
+        self.write(TRAILER.pack(
+            nodes_offset,
+            len(nodes),
+            index_offset,
+            len(slots),
+            BINARY_FORMAT_MAGIC,
+        ))
@@ -17,13 +17,21 @@
 # You should have received a copy of the GNU General Public License
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
+import sys
 import logging
+import functools
+import collections
 
 from ..profiling import profile
+from ..compression import CompressionUnavailable, compression_of, \
+    open_output
+from ..streaming import StreamManager
 
 from .text import TextPresenter
+from .utils import MultiPresenter
 from .json import JSONPresenter
-from .html import HTMLPresenter, HTMLDirectoryPresenter
+from .binary import BinaryReportPresenter
+from .html import HTMLPresenter, HTMLDirectoryPresenter, HTMLLazyPresenter
 from .markdown import MarkdownTextPresenter
 from .restructuredtext import RestructuredTextPresenter
 
@@ -56,6 +64,10 @@ class PresenterManager(object):
                 'klass': JSONPresenter,
                 'target': parsed_args.json_output,
             },
+            'binary_report': {
+                'klass': BinaryReportPresenter,
+                'target': parsed_args.binary_report_output,
+            },
             'markdown': {
                 'klass': MarkdownTextPresenter,
                 'target': parsed_args.markdown_output,
@@ -68,6 +80,10 @@ class PresenterManager(object):
                 'klass': HTMLDirectoryPresenter,
                 'target': parsed_args.html_output_directory,
             },
+            'html_lazy': {
+                'klass': HTMLLazyPresenter,
+                'target': parsed_args.html_lazy_output_directory,
+            },
         }
 
         self.config = {
@@ -84,10 +100,45 @@ class PresenterManager(object):
             ", ".join(self.config.keys()),
         )
 
+        # Check now rather than once the comparison is done that compressed
+        # outputs can be written.
+        for data in self.config.values():
+            try:
+                compression_of(data['target'])
+            except CompressionUnavailable as e:
+                logger.critical("Cannot write %s: %s", data['target'], e)
+                sys.exit(2)
+
+        if parsed_args.stream:
+            if any(x['klass'].traversal != 'depth' for x in self.config.values()):
+                logger.warning("--stream only applies to text, JSON, Markdown "
+                               "and reStructuredText output; ignoring it.")
+            elif sum(x['target'] == '-' for x in self.config.values()) > 1:
+                logger.warning("--stream needs at most one output to be "
+                               "written to stdout; ignoring it.")
+            else:
+                StreamManager().setup(functools.partial(
+                    self.open_stream,
+                    parsed_args,
+                ))
+
+    def open_stream(self, parsed_args, stack):
+        return MultiPresenter(
+            stack.enter_context(x['klass'].open(x, parsed_args))
+            for x in self.config.values()
+        )
+
     def output(self, difference, parsed_args, has_differences):
+        if StreamManager().finish(difference):
+            logger.debug("Report was written while comparing")
+            return
+
         if difference is None:
             return
 
+        # Presenters sharing a traversal of the tree are run together, except
+        # that only one of them may write to stdout.
+        groups = collections.OrderedDict()
         for name, data in self.config.items():
             logger.debug("Generating %r output at %r", name, data['target'])
 
@@ -97,11 +148,27 @@ class PresenterManager(object):
             if not has_differences and name == 'text':
                 target = data['target']
                 if target != '-':
-                    open(target, 'w').close()
+                    open_output(target).close()
                 continue
 
-            with profile('output', name):
-                data['klass'].run(data, difference, parsed_args)
+            key = data['klass'].traversal or name
+            if data['target'] == '-' and any(
+                x['target'] == '-' for _, x in groups.get(key, ())
+            ):
+                key = name
+            groups.setdefault(key, []).append((name, data))
+
+        for items in groups.values():
+            klass = items[0][1]['klass']
+            with profile('output', '+'.join(name for name, _ in items)):
+                if len(items) == 1:
+                    klass.run(items[0][1], difference, parsed_args)
+                else:
+                    klass.run_all(
+                        [(x['klass'], x) for _, x in items],
+                        difference,
+                        parsed_args,
+                    )
 
     def compute_visual_diffs(self):
         """
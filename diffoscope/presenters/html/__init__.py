@@ -19,3 +19,4 @@
 
 from .html import HTMLPresenter, HTMLDirectoryPresenter, \
     JQUERY_SYSTEM_LOCATIONS
+from .lazy import HTMLLazyPresenter
@@ -35,10 +35,13 @@ import base64
 import codecs
 import collections
 import contextlib
+import functools
 import hashlib
 import html
 import io
+import itertools
 import logging
+import multiprocessing
 import os
 import re
 import sys
@@ -62,6 +65,64 @@ TABSIZE = 8
 # Characters we're willing to word wrap on
 WORDBREAK = " \t;.,/):-"
 
+ZWSP = '\u200b'
+
+# Splits lines for convert_tokens() into runs of characters that are only
+# escaped, and single characters that need more work.
+CONVERT_TOKENS = re.compile(
+    r'([^\x00-\x1f%s]+)|(.)' % re.escape(WORDBREAK),
+    re.DOTALL,
+)
+
+# convert_lines() works on lines joined with LINE_SEP, with placeholders for
+# breaks and for tabs (P_TAB followed by P_NBSP for each extra column) until
+# the end. Lines with these or other control characters are left to
+# convert_tokens().
+LINE_SEP = '\x0f'
+P_BREAK = '\x10'
+P_TAB = '\x11'
+P_NBSP = '\x12'
+CONVERT_EXOTIC = re.compile(r'[\x00\x03-\x08\x0b-\x0e\x10-\x1f]')
+
+# Characters that do not move the column, and those that reset it
+UNCOUNTED = DIFFON + DIFFOFF + '\n'
+UNCOUNTED_DELETE = str.maketrans('', '', UNCOUNTED)
+CONVERT_BOUNDARIES = WORDBREAK + LINE_SEP + P_BREAK
+
+# Runs of characters long enough to need breaks, and tabs whose width depends
+# on what precedes them
+CONVERT_LONG_RUNS = re.compile(r'[^%s]{%d,}' % (
+    re.escape(WORDBREAK + LINE_SEP),
+    LINESIZE + 1,
+))
+CONVERT_TABS = re.compile(r'\t(?<=[^%s]\t)' % re.escape(CONVERT_BOUNDARIES))
+
+# Outputs are only widened to UCS-2 (see PEP 393) by the last replacement.
+DIFFPONCT = '<span class="diffponct">%s</span>'
+CONVERT_ESCAPES = tuple(
+    [(c, c + P_BREAK) for c in WORDBREAK if c not in ' \t'] +
+    [(c, html.escape(c)) for c in '&<>"\'']
+)
+CONVERT_EXPANSIONS = (
+    (' ', DIFFPONCT % '\xb7' + P_BREAK),
+    ('\t', DIFFPONCT % '\xbb' + '\xa0' * (TABSIZE - 1) + P_BREAK),
+    ('\n', '<br/>' + DIFFPONCT % '\\'),
+)
+CONVERT_TAB_EXPANSIONS = (
+    (P_TAB, DIFFPONCT % '\xbb'),
+    (P_NBSP, '\xa0'),
+)
+
+# Rows of a diff that side_by_side_rows() converts at once
+CONVERT_BATCH = 64
+
+# Only start worker processes to render diffs for (and limited to) reports at
+# least this big
+PARALLEL_MIN_SIZE = 2 ** 20
+
+# Rendered rows of a diff are at least this long.
+MIN_ROW_SIZE = 64
+
 JQUERY_SYSTEM_LOCATIONS = (
     '/usr/share/javascript/jquery/jquery.js',
 )
@@ -114,42 +175,365 @@ def output_anchor(path):
     return escape_anchor(output_diff_path(path))
 
 
-def convert(s, ponct=0, tag=''):
+@functools.lru_cache()
+def convert_table(ponct, tag):
+    """
+    Return the str.translate() table of convert_tokens() for the characters
+    that need no column bookkeeping. It only HTML-escapes the others.
+    """
+    table = {ord(c): html.escape(c) for c in '&<>"\''}
+    table.update((ord(c), html.escape(c) + ZWSP) for c in WORDBREAK)
+    table[ord(DIFFON)] = '<%s>' % tag
+    table[ord(DIFFOFF)] = '</%s>' % tag
+    if ponct == 1:
+        del table[ord('\t')]
+        table[ord(' ')] = DIFFPONCT % '\xb7' + ZWSP
+        table[ord('\n')] = '<br/>' + DIFFPONCT % '\\'
+    else:
+        table[ord('\t')] = '<em>\\x9</em>' + ZWSP
+    return table
+
+
+def convert_tab(i):
+    n = TABSIZE - (i % TABSIZE)
+    return DIFFPONCT % '\xbb' + '\xa0' * (n - 1) + ZWSP
+
+
+def convert_tokens(s, ponct, tag):
+    """
+    Convert `s` a run of characters at a time, keeping track of the column
+    `i` since the last break.
+    """
+    table = convert_table(ponct, tag)
     i = 0
-    t = io.StringIO()
-    for c in s:
-        # used by diffs
-        if c == DIFFON:
-            t.write('<%s>' % tag)
-        elif c == DIFFOFF:
-            t.write('</%s>' % tag)
-
-        # special highlighted chars
-        elif c == "\t" and ponct == 1:
-            n = TABSIZE - (i % TABSIZE)
-            if n == 0:
-                n = TABSIZE
-            t.write('<span class="diffponct">\xbb</span>'+'\xa0'*(n-1))
-        elif c == " " and ponct == 1:
-            t.write('<span class="diffponct">\xb7</span>')
-        elif c == "\n" and ponct == 1:
-            t.write('<br/><span class="diffponct">\</span>')
-        elif ord(c) < 32:
-            conv = u"\\x%x" % ord(c)
-            t.write('<em>%s</em>' % conv)
-            i += len(conv)
+    t = []
+    for run, c in CONVERT_TOKENS.findall(s):
+        if run:
+            k = 0
+            while len(run) - k > LINESIZE - i:
+                end = k + LINESIZE + 1 - i
+                t.append(run[k:end].translate(table))
+                t.append(ZWSP)
+                k, i = end, 0
+            t.append(run[k:].translate(table))
+            i += len(run) - k
+        elif c == '\t' and ponct == 1:
+            t.append(convert_tab(i))
+            i = 0
+        elif ord(c) in table:
+            t.append(table[ord(c)])
+            if c in WORDBREAK:
+                i = 0
         else:
-            t.write(html.escape(c))
+            conv = '\\x%x' % ord(c)
+            t.append('<em>%s</em>' % conv)
+            i += len(conv)
+            if i > LINESIZE:
+                t.append(ZWSP)
+                i = 0
+    return ''.join(t)
+
+
+def convert_long_run(match):
+    run = match.group()
+    if len(run.translate(UNCOUNTED_DELETE)) <= LINESIZE:
+        return run
+    t = []
+    i = 0
+    for c in run:
+        t.append(c)
+        if c not in UNCOUNTED:
             i += 1
+            if i > LINESIZE:
+                t.append(P_BREAK)
+                i = 0
+    return ''.join(t)
 
-        if WORDBREAK.count(c) == 1:
-            t.write('\u200b')
-            i = 0
-        if i > LINESIZE:
-            i = 0
-            t.write('\u200b')
 
-    return t.getvalue()
+def convert_tab_column(match):
+    s = match.string
+    k = match.start()
+    i = 0
+    while k > 0 and s[k - 1] not in CONVERT_BOUNDARIES:
+        k -= 1
+        if s[k] not in UNCOUNTED:
+            i += 1
+    return P_TAB + P_NBSP * (TABSIZE - (i % TABSIZE) - 1) + P_BREAK
+
+
+def convert_lines(lines, ponct=0, tag=''):
+    """
+    Return [convert(s, ponct, tag) for s in lines], but converting all the
+    lines at once with a few passes of str.replace() where possible.
+    """
+    if ponct != 1:
+        return [convert_tokens(s, ponct, tag) for s in lines]
+
+    text = LINE_SEP.join(lines)
+    if CONVERT_EXOTIC.search(text) or text.count(LINE_SEP) >= len(lines):
+        return [
+            convert_tokens(s, ponct, tag)
+            if CONVERT_EXOTIC.search(s) or LINE_SEP in s
+            else convert_lines((s,), ponct, tag)[0]
+            for s in lines
+        ]
+
+    text = CONVERT_LONG_RUNS.sub(convert_long_run, text)
+    text, tabs = CONVERT_TABS.subn(convert_tab_column, text)
+    for old, new in CONVERT_ESCAPES:
+        text = text.replace(old, new)
+    text = text.replace(DIFFON, '<%s>' % tag).replace(DIFFOFF, '</%s>' % tag)
+    for old, new in CONVERT_EXPANSIONS:
+        text = text.replace(old, new)
+    if tabs:
+        for old, new in CONVERT_TAB_EXPANSIONS:
+            text = text.replace(old, new)
+    return text.replace(P_BREAK, ZWSP).split(LINE_SEP)
+
+
+def convert(s, ponct=0, tag=''):
+    return convert_lines((s,), ponct, tag)[0]
+
+
+def output_hunk_header(hunk_off1, hunk_size1, hunk_off2, hunk_size2):
+    return (
+        u'<tr class="diffhunk"><td colspan="2">Offset %d, %d lines modified</td>' % (hunk_off1, hunk_size1) +
+        u'<td colspan="2">Offset %d, %d lines modified</td></tr>\n' % (hunk_off2, hunk_size2)
+    )
+
+
+def output_line(has_internal_linenos, type_name, html1, line1, html2, line2):
+    """Return a row showing lines already passed through convert()."""
+    t = [u'<tr class="diff%s">' % type_name]
+    if html1:
+        if has_internal_linenos:
+            t.append(u'<td colspan="2" class="diffpresent">')
+        else:
+            t.append(u'<td class="diffline">%d </td>' % line1)
+            t.append(u'<td class="diffpresent">')
+        t.append(html1)
+        t.append(u'</td>')
+    else:
+        t.append(u'<td colspan="2">\xa0</td>')
+
+    if html2:
+        if has_internal_linenos:
+            t.append(u'<td colspan="2" class="diffpresent">')
+        else:
+            t.append(u'<td class="diffline">%d </td>' % line2)
+            t.append(u'<td class="diffpresent">')
+        t.append(html2)
+        t.append(u'</td>')
+    else:
+        t.append(u'<td colspan="2">\xa0</td>')
+    t.append(u"</tr>\n")
+    return u"".join(t)
+
+
+def side_by_side_rows(unified_diff, has_internal_linenos, start=0):
+    """
+    Yield the rows of the side-by-side <table> for unified_diff, one for each
+    item of SideBySideDiff(unified_diff).items(), along with the number of
+    bytes of the diff processed so far. The first `start` rows are skipped
+    without being rendered, and the lines of the others are converted
+    CONVERT_BATCH rows at a time.
+    """
+    ydiff = SideBySideDiff(unified_diff)
+    items = itertools.islice(ydiff.items(), start, None)
+    while True:
+        batch = [
+            (t, args, ydiff.bytes_processed)
+            for t, args in itertools.islice(items, CONVERT_BATCH)
+        ]
+        if not batch:
+            return
+        lines = [args for t, args, _ in batch if t == "L"]
+        html1 = iter(convert_lines([x[1] or '' for x in lines], ponct=1, tag='del'))
+        html2 = iter(convert_lines([x[3] or '' for x in lines], ponct=1, tag='ins'))
+        for t, args, bytes_processed in batch:
+            if t == "L":
+                type_name, _, line1, _, line2 = args
+                row = output_line(
+                    has_internal_linenos,
+                    type_name,
+                    next(html1),
+                    line1,
+                    next(html2),
+                    line2,
+                )
+            elif t == "H":
+                row = output_hunk_header(*args)
+            elif t == "C":
+                row = u'<td colspan="2">%s</td>\n' % args
+            else:
+                raise AssertionError()
+            yield row, bytes_processed
+
+
+def render_rows(unified_diff, has_internal_linenos, start, stop):
+    """Return rows start to stop (or to the end if None) of unified_diff."""
+    return list(itertools.islice(
+        side_by_side_rows(unified_diff, has_internal_linenos, start),
+        None if stop is None else stop - start,
+    ))
+
+
+def diff_prefix(lines, rows):
+    """
+    Return the beginning of the unified diff made of `lines` from which
+    side_by_side_rows() yields the same first `rows` rows as from the whole
+    diff (all of it if `rows` is None), and whether that is the whole diff.
+
+    The diff is cut after a line that is not part of a block of changes, as
+    that line completes the rows of all the lines before it, once these are
+    known to make at least `rows` rows.
+    """
+    prefix = []
+    halves = 0
+    for line in lines:
+        prefix.append(line)
+        if rows is None:
+            continue
+        kind = line[:1]
+        if kind not in ('+', '-', '\\'):
+            if halves >= 2 * rows:
+                return ''.join(prefix), False
+            halves += 2
+        elif kind != '\\':
+            # Removed and added lines are paired up into rows.
+            halves += 1
+    return ''.join(prefix), True
+
+
+class RenderedRows(object):
+    """
+    Renders the side_by_side_rows() of the nodes of root_difference in a pool
+    of worker processes, in the order of traverse_heapq(smallest_first),
+    keeping up to `window` nodes in progress ahead of the presenters. Nodes
+    passed to prune() are expected to be skipped by the presenters along
+    with their descendants, so the latter are not rendered.
+
+    Up to `max_rows` rows of each diff are rendered, without rendering ahead
+    more rows than row_budget() (None if unlimited) says may still be
+    printed. Any further rows are computed by the presenter itself.
+    """
+
+    def __init__(self, pool, root_difference, max_rows, window, row_budget):
+        self.pool = pool
+        self.nodes = root_difference.traverse_heapq(smallest_first, yield_score=True)
+        self.max_rows = max_rows
+        self.window = window
+        self.row_budget = row_budget
+        self.rows_ahead = 0
+        self.next_node = None
+        self.pruned = set()
+        self.pending = collections.deque()
+        self.fill()
+
+    def prune(self, difference):
+        self.pruned.add(difference)
+
+    def fill(self):
+        while len(self.pending) < self.window:
+            if self.next_node is None:
+                self.next_node = next(self.nodes, (None, None))
+            node, score = self.next_node
+            if node is None:
+                return
+            parents = score[3]
+            if len(parents) > 1 and parents[-2] in self.pruned:
+                self.pruned.add(node)
+                self.next_node = None
+                continue
+            limit = self.max_rows
+            ahead = 0
+            budget = self.row_budget()
+            if budget is not None:
+                budget -= self.rows_ahead
+                if budget <= 0:
+                    return
+                ahead = budget if limit is None else min(limit, budget)
+                limit = ahead
+            self.next_node = None
+            # Only send the part of the diff that the rows come from.
+            unified_diff, complete = diff_prefix(node.unified_diff_lines(), limit)
+            if not unified_diff:
+                continue
+            self.rows_ahead += ahead
+            self.pending.append((node, limit, ahead, complete, self.pool.apply_async(render_rows, (
+                unified_diff,
+                node.has_internal_linenos,
+                0,
+                limit,
+            ))))
+
+    def get(self, difference, unified_diff):
+        """
+        Return an iterator over the rows of `difference`, or None if they were
+        not rendered ahead.
+        """
+        while self.pending:
+            node, limit, ahead, complete, result = self.pending.popleft()
+            self.rows_ahead -= ahead
+            self.fill()
+            if node is not difference:
+                # The presenters skipped this node.
+                continue
+            rows = result.get()
+            if limit is None or (complete and len(rows) < limit):
+                return iter(rows)
+            if len(rows) < limit:
+                # The prefix fell short, which only a malformed diff causes.
+                rows = []
+            return itertools.chain(rows, side_by_side_rows(
+                unified_diff,
+                difference.has_internal_linenos,
+                limit,
+            ))
+        return None
+
+
+class SideBySideRows(object):
+    """
+    Hands out the side_by_side_rows() of the node being output to each of
+    `consumers` presenters, so that they are only computed once. Rows are
+    kept until all the presenters have read them, or until clear() is
+    called once the node has been output. If `rendered` is a RenderedRows,
+    rows are taken from there when possible.
+    """
+
+    def __init__(self, consumers, rendered=None):
+        self.consumers = consumers
+        self.rendered = rendered
+        self.pending = {}
+
+    def get(self, difference):
+        """Return the unified diff of `difference` and an iterator of rows."""
+        try:
+            unified_diff, rows = self.pending[difference]
+        except KeyError:
+            unified_diff = difference.unified_diff
+            if not unified_diff:
+                return unified_diff, None
+            rows = None
+            if self.rendered is not None:
+                rows = self.rendered.get(difference, unified_diff)
+            if rows is None:
+                rows = side_by_side_rows(unified_diff, difference.has_internal_linenos)
+            rows = list(itertools.tee(rows, self.consumers))
+            self.pending[difference] = unified_diff, rows
+
+        result = rows.pop()
+        if not rows:
+            del self.pending[difference]
+        return unified_diff, result
+
+    def prune(self, difference):
+        if self.rendered is not None:
+            self.rendered.prune(difference)
+
+    def clear(self):
+        self.pending.clear()
 
 
 def output_visual(visual, path, indentstr, indentnum):
@@ -219,9 +603,10 @@ def output_node(ctx, difference, path, indentstr, indentnum):
 
     udiff = u""
     ud_cont = None
-    if difference.unified_diff:
+    unified_diff, rows = ctx.side_by_side.get(difference)
+    if unified_diff:
         ud_cont = HTMLSideBySidePresenter().output_unified_diff(
-            ctx, difference.unified_diff, difference.has_internal_linenos)
+            ctx, unified_diff, rows)
         udiff = next(ud_cont)
         if isinstance(udiff, PartialString):
             ud_cont = ud_cont.send
@@ -278,6 +663,30 @@ def output_footer(jquery_url=None):
     return footer
 
 
+@contextlib.contextmanager
+def process_pool(processes):
+    # Forking while other threads (e.g. of the IOLoop, the executor or an
+    # output compressor) hold locks could deadlock the workers, so start
+    # them from a fresh interpreter instead.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+    else:
+        context = multiprocessing.get_context('spawn')
+    pool = context.Pool(processes)
+    try:
+        yield pool
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        # Let the few jobs still in flight finish: terminating a pool with
+        # pending jobs can hang on Python 3.6.
+        pool.close()
+    finally:
+        pool.join()
+
+
 @contextlib.contextmanager
 def file_printer(directory, filename):
     with codecs.open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
@@ -298,7 +707,8 @@ def spl_file_printer(directory, filename, accum):
 
 
 class HTMLPrintContext(collections.namedtuple("HTMLPrintContext",
-                                              "target single_page jquery_url css_url our_css_url icon_url")):
+                                              "target single_page jquery_url css_url our_css_url icon_url "
+                                              "side_by_side")):
     @property
     def directory(self):
         return None if self.single_page else self.target
@@ -323,37 +733,6 @@ class HTMLSideBySidePresenter(object):
         self.bytes_written = 0
         self.error_row = None
 
-    def output_hunk_header(self, hunk_off1, hunk_size1, hunk_off2, hunk_size2):
-        self.spl_print_func(u'<tr class="diffhunk"><td colspan="2">Offset %d, %d lines modified</td>' % (hunk_off1, hunk_size1))
-        self.spl_print_func(u'<td colspan="2">Offset %d, %d lines modified</td></tr>\n' % (hunk_off2, hunk_size2))
-
-    def output_line(self, has_internal_linenos, type_name, s1, line1, s2, line2):
-        self.spl_print_func(u'<tr class="diff%s">' % type_name)
-        try:
-            if s1:
-                if has_internal_linenos:
-                    self.spl_print_func(u'<td colspan="2" class="diffpresent">')
-                else:
-                    self.spl_print_func(u'<td class="diffline">%d </td>' % line1)
-                    self.spl_print_func(u'<td class="diffpresent">')
-                self.spl_print_func(convert(s1, ponct=1, tag='del'))
-                self.spl_print_func(u'</td>')
-            else:
-                self.spl_print_func(u'<td colspan="2">\xa0</td>')
-
-            if s2:
-                if has_internal_linenos:
-                    self.spl_print_func(u'<td colspan="2" class="diffpresent">')
-                else:
-                    self.spl_print_func(u'<td class="diffline">%d </td>' % line2)
-                    self.spl_print_func(u'<td class="diffpresent">')
-                self.spl_print_func(convert(s2, ponct=1, tag='ins'))
-                self.spl_print_func(u'</td>')
-            else:
-                self.spl_print_func(u'<td colspan="2">\xa0</td>')
-        finally:
-            self.spl_print_func(u"</tr>\n")
-
     def spl_print_enter(self, print_context, rotation_params):
         # Takes ownership of print_context
         self.spl_print_ctrl = print_context.__exit__, rotation_params
@@ -425,25 +804,19 @@ class HTMLSideBySidePresenter(object):
         }
         self.spl_print_func(self.error_row)
 
-    def output_unified_diff_table(self, unified_diff, has_internal_linenos):
+    def output_unified_diff_table(self, unified_diff, rows):
         """Output a unified diff <table> possibly over multiple pages.
 
         It is the caller's responsibility to set up self.spl_* correctly.
+        `rows` iterates over the side_by_side_rows() of unified_diff.
 
         Yields None for each extra child page, and then True or False depending
         on whether the whole output was truncated.
         """
+        bytes_processed = 0
         try:
-            ydiff = SideBySideDiff(unified_diff)
-            for t, args in ydiff.items():
-                if t == "L":
-                    self.output_line(has_internal_linenos, *args)
-                elif t == "H":
-                    self.output_hunk_header(*args)
-                elif t == "C":
-                    self.spl_print_func(u'<td colspan="2">%s</td>\n' % args)
-                else:
-                    raise AssertionError()
+            for row, bytes_processed in rows:
+                self.spl_print_func(row)
                 self.spl_rows += 1
                 if not self.check_limits():
                     continue
@@ -457,17 +830,17 @@ class HTMLSideBySidePresenter(object):
         except GeneratorExit:
             return
         except DiffBlockLimitReached:
-            self.output_limit_reached("diff block lines", len(unified_diff), ydiff.bytes_processed)
+            self.output_limit_reached("diff block lines", len(unified_diff), bytes_processed)
             wrote_all = False
         except PrintLimitReached:
-            self.output_limit_reached("report size", len(unified_diff), ydiff.bytes_processed)
+            self.output_limit_reached("report size", len(unified_diff), bytes_processed)
             wrote_all = False
         finally:
             # no footer on the last page, just a close tag
             self.spl_print_func(u"</table>")
         yield wrote_all
 
-    def output_unified_diff(self, ctx, unified_diff, has_internal_linenos):
+    def output_unified_diff(self, ctx, unified_diff, rows):
         self.new_unified_diff()
         rotation_params = None
         if ctx.directory:
@@ -480,7 +853,7 @@ class HTMLSideBySidePresenter(object):
             self.spl_print_func = udiff.write
             self.spl_print_ctrl = None, rotation_params
 
-            it = self.output_unified_diff_table(unified_diff, has_internal_linenos)
+            it = self.output_unified_diff_table(unified_diff, rows)
             wrote_all = next(it)
             if wrote_all is None:
                 assert self.spl_current_page == 1
@@ -521,8 +894,45 @@ class HTMLSideBySidePresenter(object):
         yield self.bytes_written, parent_last_row
 
 
+def smallest_first(node, parent_score):
+    depth = parent_score[0] + 1 if parent_score else 0
+    parents = parent_score[3] if parent_score else []
+    # Difference is not comparable so use memory address in event of a tie
+    return depth, node.size_self(), id(node), parents + [node]
+
+
+def output_nodes(node_printers, root_difference, side_by_side):
+    """
+    Traverse root_difference once, passing each node to all of the
+    node_printers (see HTMLPresenter.node_printer) that are not done yet.
+    Descendants of a node are skipped if none of them want the node.
+    """
+    pending = list(node_printers)
+    nodes = root_difference.traverse_heapq(smallest_first, yield_score=True)
+    prune_prev_node_descendants = None
+    while pending:
+        try:
+            node, score = nodes.send(prune_prev_node_descendants)
+        except StopIteration:
+            break
+        prune_prev_node_descendants = True
+        for node_printer in list(pending):
+            try:
+                if not node_printer(node, score):
+                    prune_prev_node_descendants = False
+            except StopIteration:
+                pending.remove(node_printer)
+        if prune_prev_node_descendants:
+            side_by_side.prune(node)
+        side_by_side.clear()
+
+    for node_printer in node_printers:
+        node_printer.finish()
+
+
 class HTMLPresenter(Presenter):
     supports_visual_diffs = True
+    traversal = 'heapq'
 
     def __init__(self):
         self.reset()
@@ -538,7 +948,9 @@ class HTMLPresenter(Presenter):
     def maybe_print(self, node, printers, outputs, continuations):
         output = outputs[node]
         node_cont = continuations[node]
-        if output.holes and set(output.holes) - set(node_cont):
+        if output.num_holes > len(node_cont):
+            # There are holes for nodes yet to be output, as well as one for
+            # each unified diff continuation.
             return
 
         # could be slightly more accurate, whatever
@@ -573,19 +985,32 @@ class HTMLPresenter(Presenter):
             return templates.DIFFNODE_LIMIT
 
     def output_difference(self, ctx, root_difference):
+        output_nodes(
+            [self.node_printer(ctx, root_difference)],
+            root_difference,
+            ctx.side_by_side,
+        )
+
+    def node_printer(self, ctx, root_difference):
+        """
+        Return a function to be called with each node of root_difference and
+        its score, in the order of traverse_heapq(smallest_first). It returns
+        True if the descendants of the node are not wanted, and raises
+        StopIteration once there is nothing left to output. Its finish()
+        attribute is to be called at the end.
+        """
         outputs = {}  # nodes to their partial output
         ancestors = {}  # child nodes to ancestor nodes
         placeholder_len = len(self.output_node_placeholder("XXXXXXXXXXXXXXXX", not ctx.single_page))
         continuations = {}  # functions to print unified diff continuations (html-dir only)
         printers = {}  # nodes to their printers
 
-        def smallest_first(node, parent_score):
-            depth = parent_score[0] + 1 if parent_score else 0
-            parents = parent_score[3] if parent_score else []
-            # Difference is not comparable so use memory address in event of a tie
-            return depth, node.size_self(), id(node), parents + [node]
-
         def process_node(node, score):
+            if node is not root_difference and node not in ancestors:
+                # We did not output the parent of this node, but another
+                # presenter sharing the traversal did.
+                return True
+
             path = score[3]
             diff_path = output_diff_path(path)
             pagename = md5(diff_path)
@@ -653,19 +1078,14 @@ class HTMLPresenter(Presenter):
 
             self.maybe_print(stored, printers, outputs, continuations)
 
-        nodes = root_difference.traverse_heapq(smallest_first, yield_score=True)
-        prune_prev_node_descendants = None
-        while True:
-            try:
-                node, score = nodes.send(prune_prev_node_descendants)
-                prune_prev_node_descendants = process_node(node, score)
-            except StopIteration:
-                break
+        def finish():
+            if outputs:
+                import pprint
+                pprint.pprint(outputs, indent=4)
+            assert not outputs
 
-        if outputs:
-            import pprint
-            pprint.pprint(outputs, indent=4)
-        assert not outputs
+        process_node.finish = finish
+        return process_node
 
     def ensure_jquery(self, jquery_url, basedir, default_override):
         if jquery_url is None:
@@ -711,6 +1131,10 @@ class HTMLPresenter(Presenter):
         (symlinked, so that you can still share the result over HTTP).
         You can also pass --jquery URL to diffoscope to use a central jQuery copy.
         """
+        ctx = self.html_directory_context(directory, css_url, jquery_url)
+        self.output_difference(ctx, difference)
+
+    def html_directory_context(self, directory, css_url=None, jquery_url=None, side_by_side=None):
         if not os.path.exists(directory):
             os.makedirs(directory)
 
@@ -722,33 +1146,89 @@ class HTMLPresenter(Presenter):
             fp.write(templates.STYLES)
         with open(os.path.join(directory, "icon.png"), "wb") as fp:
             fp.write(base64.b64decode(FAVICON_BASE64))
-        ctx = HTMLPrintContext(directory, False, jquery_url, css_url, "common.css", "icon.png")
-        self.output_difference(ctx, difference)
+        return HTMLPrintContext(directory, False, jquery_url, css_url, "common.css", "icon.png",
+                                side_by_side or SideBySideRows(1))
 
     def output_html(self, target, difference, css_url=None, jquery_url=None):
         """
         Default presenter, all in one HTML file
         """
-        jquery_url = self.ensure_jquery(jquery_url, os.getcwd(), None)
-        ctx = HTMLPrintContext(target, True, jquery_url, css_url, None, None)
+        ctx = self.html_context(target, css_url, jquery_url)
         self.output_difference(ctx, difference)
 
+    def html_context(self, target, css_url=None, jquery_url=None, side_by_side=None):
+        jquery_url = self.ensure_jquery(jquery_url, os.getcwd(), None)
+        return HTMLPrintContext(target, True, jquery_url, css_url, None, None,
+                                side_by_side or SideBySideRows(1))
+
     @classmethod
-    def run(cls, data, difference, parsed_args):
-        cls().output_html(
-            parsed_args.html_output,
+    def run_all(cls, items, difference, parsed_args):
+        """
+        Run the HTML presenters for `items`, a list of (klass, data) tuples,
+        over a single traversal of `difference`, computing the side-by-side
+        diffs only once for all of them.
+        """
+        with contextlib.ExitStack() as stack:
+            side_by_side = SideBySideRows(len(items))
+            presenters = []
+            node_printers = []
+            for klass, data in items:
+                presenter = klass()
+                ctx = presenter.context(data, parsed_args, side_by_side)
+                presenters.append((presenter, ctx))
+                node_printers.append(presenter.node_printer(ctx, difference))
+            side_by_side.rendered = cls.rendered_rows(stack, difference, presenters)
+            output_nodes(node_printers, difference, side_by_side)
+
+    @staticmethod
+    def rendered_rows(stack, difference, presenters):
+        """
+        Return a RenderedRows to render the diffs of big reports in parallel
+        when we may run several jobs, or None. Whatever we render, the pages
+        are still laid out in order in this process, so the output does not
+        depend on the number of jobs.
+        """
+        jobs = Config().jobs
+        size = min(difference.size(), Config().max_report_size)
+        if jobs <= 1 or size < PARALLEL_MIN_SIZE:
+            return None
+
+        logger.debug("Rendering HTML diffs with %d processes", jobs)
+        pool = stack.enter_context(process_pool(jobs))
+
+        # Single pages never show more than the first rows of a diff.
+        max_rows = Config().max_page_diff_block_lines
+        if not all(ctx.single_page for _, ctx in presenters):
+            max_rows = max(Config().max_diff_block_lines, max_rows)
+
+        def row_budget():
+            remaining = max(x.report_remaining for x, _ in presenters)
+            if remaining == float("inf"):
+                return None
+            return max(0, int(remaining) // MIN_ROW_SIZE)
+
+        return RenderedRows(
+            pool,
             difference,
+            None if max_rows == float("inf") else int(max_rows),
+            4 * jobs,
+            row_budget,
+        )
+
+    def context(self, data, parsed_args, side_by_side):
+        return self.html_context(
+            data['target'],
             css_url=parsed_args.css_url,
             jquery_url=parsed_args.jquery_url,
+            side_by_side=side_by_side,
         )
 
 
 class HTMLDirectoryPresenter(HTMLPresenter):
-    @classmethod
-    def run(cls, data, difference, parsed_args):
-        cls().output_html_directory(
-            parsed_args.html_output_directory,
-            difference,
+    def context(self, data, parsed_args, side_by_side):
+        return self.html_directory_context(
+            data['target'],
             css_url=parsed_args.css_url,
             jquery_url=parsed_args.jquery_url,
+            side_by_side=side_by_side,
         )
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import base64
+import codecs
+import collections
+import gzip
+import json
+import logging
+import os
+
+from diffoscope.diff import MAX_WF_SIZE
+from diffoscope.config import Config
+
+from ..icon import FAVICON_BASE64
+from ..utils import Presenter, sizeof_fmt
+
+from . import templates
+from .html import LINESIZE, TABSIZE, WORDBREAK, output_footer, output_header
+
+logger = logging.getLogger(__name__)
+
+# A lazy HTML report is laid out as:
+#
+#   index.html          the page that fetches and renders the chunks below
+#   common.css
+#   icon.png
+#   chunks/N.json.gz    node N (numbered breadth-first from 0 for the root)
+#                       and the first page of the lines of its diff
+#   chunks/N-P.json.gz  page P of the lines of the diff of node N
+#   chunks/index.json.gz
+#                       [parent, source1, source2] for each node, to find
+#                       the nodes to load to show a given path
+#
+# The browser turns the unified diffs into side-by-side tables itself, as
+# SideBySideDiff does, so writing the report does not have to.
+
+CHUNKS_DIRECTORY = "chunks"
+
+
+def write_chunk(directory, name, data):
+    path = os.path.join(directory, CHUNKS_DIRECTORY, "%s.json.gz" % name)
+    with open(path, 'wb') as f:
+        # No file name nor timestamp, so that reports are reproducible.
+        with gzip.GzipFile(filename='', mode='wb', fileobj=f, mtime=0) as g:
+            g.write(json.dumps(data, separators=(',', ':')).encode('ascii'))
+
+
+def diff_pages(unified_diff, page_size, max_lines):
+    """
+    Split unified_diff into pages of at most page_size lines, up to max_lines
+    lines. Returns the pages, and None or the number of bytes left out and
+    the total if the diff was cut.
+    """
+    lines = unified_diff.split('\n')
+    cut = None
+    if len(lines) > max_lines:
+        left = len('\n'.join(lines[max_lines:])) + 1
+        cut = [left, len(unified_diff)]
+        lines = lines[:max_lines]
+    if page_size >= len(lines):
+        return ['\n'.join(lines)], cut
+    return [
+        '\n'.join(lines[x:x + page_size])
+        for x in range(0, len(lines), page_size)
+    ], cut
+
+
+class HTMLLazyPresenter(Presenter):
+    """
+    Write an HTML page that only loads the nodes of the report as they are
+    expanded, from compressed JSON chunks written next to it. Unlike with
+    --html-dir, no HTML is rendered for the diffs in advance, and the report
+    is not cut at max_report_size or max_page_size.
+    """
+
+    supports_visual_diffs = True
+    traversal = None
+
+    def __init__(self, directory, css_url=None):
+        self.directory = directory
+        self.css_url = css_url
+        self.page_size = Config().max_page_diff_block_lines
+        self.max_lines = Config().max_diff_block_lines
+
+        super().__init__()
+
+    @classmethod
+    def run(cls, data, difference, parsed_args):
+        cls(data['target'], css_url=parsed_args.css_url).start(difference)
+
+    def start(self, difference):
+        chunks = os.path.join(self.directory, CHUNKS_DIRECTORY)
+        if not os.path.exists(chunks):
+            os.makedirs(chunks)
+
+        with open(os.path.join(self.directory, "common.css"), "w") as fp:
+            fp.write(templates.STYLES)
+        with open(os.path.join(self.directory, "icon.png"), "wb") as fp:
+            fp.write(base64.b64decode(FAVICON_BASE64))
+
+        index = []
+        queue = collections.deque([(difference, None)])
+        while queue:
+            node, parent = queue.popleft()
+            number = len(index)
+            first_child = number + 1 + len(queue)
+            index.append([parent, node.source1, node.source2])
+            self.write_node(number, node, first_child)
+            queue.extend((x, number) for x in node.details)
+        write_chunk(self.directory, "index", index)
+        logger.debug("Wrote %d chunks of lazy HTML output", len(index))
+
+        with codecs.open(os.path.join(self.directory, "index.html"), 'w', encoding='utf-8') as f:
+            f.write(output_header(self.css_url, "common.css", "icon.png"))
+            f.write(templates.LAZY_BODY)
+            f.write(templates.LAZY_SCRIPTS % {
+                'linesize': LINESIZE,
+                'tabsize': TABSIZE,
+                'wordbreak': json.dumps(WORDBREAK),
+                'max_wf_size': MAX_WF_SIZE,
+            })
+            f.write(output_footer())
+
+    def write_node(self, number, node, first_child):
+        pages, cut = [], None
+        if node.unified_diff:
+            pages, cut = diff_pages(
+                node.unified_diff,
+                self.page_size,
+                self.max_lines,
+            )
+        for i, page in enumerate(pages[1:], 1):
+            write_chunk(self.directory, "%d-%d" % (number, i), page)
+
+        write_chunk(self.directory, number, {
+            'source1': node.source1,
+            'source2': node.source2,
+            'size': sizeof_fmt(node.size()),
+            'comments': node.comments,
+            'visuals': [
+                [x.data_type, x.content, x.source] for x in node.visuals
+            ],
+            'has_internal_linenos': node.has_internal_linenos,
+            'diff': pages[0] if pages else None,
+            'pages': len(pages),
+            'cut': cut,
+            'details': [
+                [
+                    first_child + i,
+                    x.source1,
+                    x.source2,
+                    sizeof_fmt(x.size()),
+                    bool(x.has_visible_children()),
+                ]
+                for i, x in enumerate(node.details)
+            ],
+        })
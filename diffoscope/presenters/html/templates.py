@@ -234,3 +234,565 @@ UD_TABLE_FOOTER = u"""<tr class="ondemand"><td colspan="4">
 UD_TABLE_LIMIT_FOOTER = u"""<tr class="error"><td colspan="4">
 Max %(limit_type)s reached; %(bytes_left)s/%(bytes_total)s bytes (%(percent).2f%%) of diff not shown.
 </td></tr>"""
+
+LAZY_BODY = u"""<form class="lazy-jump" id="lazy-jump">
+<input type="text" size="60" placeholder="path / to / a / file" />
+<button type="submit">Go to path</button> <span class="lazy-status"></span>
+</form>
+<div id="lazy-root">... loading ...</div>
+<noscript><div class="error">This report is loaded by JavaScript, which is disabled.</div></noscript>
+"""
+
+# Fetches and renders the chunks of --html-lazy-dir output, see lazy.py.
+# convert() is the character-by-character version of convert() in html.py,
+# and SideBySide and linediff() are ports of their namesakes in diff.py.
+LAZY_SCRIPTS = r"""<script type="text/javascript">
+"use strict";
+(function() {
+  var LINESIZE = %(linesize)d, TABSIZE = %(tabsize)d, WORDBREAK = %(wordbreak)s;
+  var MAX_WF_SIZE = %(max_wf_size)d;
+  var nodes = {};  // node numbers to their <div class="difference">
+  var index = null;
+
+  function fetchChunk(name) {
+    return fetch("chunks/" + name + ".json.gz").then(function(response) {
+      if (!response.ok) {
+        throw new Error("chunks/" + name + ".json.gz: " + response.statusText);
+      }
+      return response.arrayBuffer();
+    }).then(function(buffer) {
+      var bytes = new Uint8Array(buffer, 0, Math.min(2, buffer.byteLength));
+      if (bytes[0] !== 0x1f || bytes[1] !== 0x8b) {
+        // Already decompressed by the browser (Content-Encoding: gzip)
+        return new Response(buffer).json();
+      }
+      var stream = new Blob([buffer]).stream();
+      return new Response(stream.pipeThrough(new DecompressionStream("gzip"))).json();
+    });
+  }
+
+  function escape(s) {
+    return s.replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;")
+      .replace(/"/g, "&quot;").replace(/'/g, "&#x27;");
+  }
+
+  function convert(s, tag) {
+    var i = 0, t = [];
+    for (var c of s) {
+      if (c === "\x01") {
+        t.push("<" + tag + ">");
+      } else if (c === "\x02") {
+        t.push("</" + tag + ">");
+      } else if (c === "\t") {
+        t.push('<span class="diffponct">\xbb</span>' + "\xa0".repeat(TABSIZE - (i %% TABSIZE) - 1));
+      } else if (c === " ") {
+        t.push('<span class="diffponct">\xb7</span>');
+      } else if (c === "\n") {
+        t.push('<br/><span class="diffponct">\\</span>');
+      } else if (c.charCodeAt(0) < 32) {
+        var conv = "\\x" + c.charCodeAt(0).toString(16);
+        t.push("<em>" + conv + "</em>");
+        i += conv.length;
+      } else {
+        t.push(escape(c));
+        i += 1;
+      }
+      if (WORDBREAK.indexOf(c) !== -1) {
+        t.push("\u200b");
+        i = 0;
+      }
+      if (i > LINESIZE) {
+        i = 0;
+        t.push("\u200b");
+      }
+    }
+    return t.join("");
+  }
+
+  function sha1(s) {
+    var bytes = new TextEncoder().encode(s);
+    var words = new Uint32Array(((bytes.length + 8) >> 6) * 16 + 16);
+    bytes.forEach(function(b, i) { words[i >> 2] |= b << (24 - (i %% 4) * 8); });
+    words[bytes.length >> 2] |= 0x80 << (24 - (bytes.length %% 4) * 8);
+    words[((bytes.length + 8) >> 6) * 16 + 15] = bytes.length * 8;
+    var h = [0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476, 0xc3d2e1f0];
+    var w = new Uint32Array(80);
+    for (var k = 0; k < words.length; k += 16) {
+      var a = h[0], b = h[1], c = h[2], d = h[3], e = h[4];
+      for (var i = 0; i < 80; i++) {
+        if (i < 16) {
+          w[i] = words[k + i];
+        } else {
+          var x = w[i - 3] ^ w[i - 8] ^ w[i - 14] ^ w[i - 16];
+          w[i] = (x << 1) | (x >>> 31);
+        }
+        var f = i < 20 ? ((b & c) | (~b & d)) + 0x5a827999 :
+          i < 40 ? (b ^ c ^ d) + 0x6ed9eba1 :
+          i < 60 ? ((b & c) | (b & d) | (c & d)) + 0x8f1bbcdc :
+          (b ^ c ^ d) + 0xca62c1d6;
+        var t = (((a << 5) | (a >>> 27)) + f + e + w[i]) | 0;
+        e = d; d = c; c = (b << 30) | (b >>> 2); b = a; a = t;
+      }
+      h = [h[0] + a, h[1] + b, h[2] + c, h[3] + d, h[4] + e];
+    }
+    return h.map(function(x) { return ("0000000" + (x >>> 0).toString(16)).slice(-8); }).join("");
+  }
+
+  // The functions below are ports of linediff() and SideBySideDiff in
+  // diff.py, which must stay in sync with them. Strings are handled as
+  // arrays of code points, as Python does.
+
+  function diffinputTruncate(s) {
+    if (s.length > MAX_WF_SIZE) {
+      var rest = s.slice(MAX_WF_SIZE);
+      s = s.slice(0, MAX_WF_SIZE).concat(Array.from("[ ... truncated by diffoscope; len: " +
+        rest.length + ", SHA1: " + sha1(rest.join("")) + " ... ]"));
+    }
+    return s;
+  }
+
+  function sane(s) {
+    return s.replace(/[\x00-\x08\x0b-\x1f]/g, ".");
+  }
+
+  // Returns [[changed1, text1], [changed2, text2]] pairs as yielded by
+  // linediff_simplify(linediff_wagnerfischer(s, t)).
+  function wagnerFischer(s, t) {
+    var m = s.length, n = t.length, w = n + 1;
+    // Cost to each cell, and from which neighbour it is reached, preferring
+    // the same one as Python's min() over (cost, coordinates) tuples does.
+    var DIAGONAL = 0, UP = 1, LEFT = 2;
+    var d = new Int32Array((m + 1) * w), from = new Uint8Array((m + 1) * w);
+    for (var i = 1; i <= m; i++) {
+      d[i * w] = i;
+      from[i * w] = UP;
+    }
+    for (var j = 1; j <= n; j++) {
+      d[j] = j;
+      from[j] = LEFT;
+    }
+    for (i = 1; i <= m; i++) {
+      for (j = 1; j <= n; j++) {
+        var best = d[(i - 1) * w + j - 1] + (s[i - 1] === t[j - 1] ? 0 : 1), dir = DIAGONAL;
+        if (d[(i - 1) * w + j] + 1 < best) {
+          best = d[(i - 1) * w + j] + 1;
+          dir = UP;
+        }
+        if (d[i * w + j - 1] + 1 < best) {
+          best = d[i * w + j - 1] + 1;
+          dir = LEFT;
+        }
+        d[i * w + j] = best;
+        from[i * w + j] = dir;
+      }
+    }
+    var steps = [];
+    for (i = m, j = n; i || j;) {
+      var cell = i * w + j;
+      if (from[cell] === LEFT) {
+        steps.push([[false, ""], [true, t[--j]]]);
+      } else if (from[cell] === UP) {
+        steps.push([[true, s[--i]], [false, ""]]);
+      } else {
+        var changed = d[cell] !== d[(i - 1) * w + j - 1];
+        steps.push([[changed, s[--i]], [changed, t[--j]]]);
+      }
+    }
+    var result = [];
+    for (var k = steps.length - 1; k >= 0; k--) {
+      var l = steps[k][0], r = steps[k][1], last = result[result.length - 1];
+      if (last && last[0][0] === l[0] && last[1][0] === r[0]) {
+        last[0][1] += l[1];
+        last[1][1] += r[1];
+      } else {
+        result.push(steps[k]);
+      }
+    }
+    return result;
+  }
+
+  function linediff(s, t) {
+    s = Array.from(s);
+    t = Array.from(t);
+    var p = 0;
+    while (p < s.length && p < t.length && s[p] === t[p]) {
+      p++;
+    }
+    var q = 0;
+    while (q < s.length - p && q < t.length - p &&
+        s[s.length - 1 - q] === t[t.length - 1 - q]) {
+      q++;
+    }
+    var prefix = s.slice(0, p).join(""), suffix = s.slice(s.length - q).join("");
+    s = diffinputTruncate(s.slice(p, s.length - q));
+    t = diffinputTruncate(t.slice(p, t.length - q));
+    var s1 = "", t1 = "";
+    wagnerFischer(s, t).forEach(function(pair) {
+      s1 += pair[0][0] ? "\x01" + sane(pair[0][1]) + "\x02" : sane(pair[0][1]);
+      t1 += pair[1][0] ? "\x01" + sane(pair[1][1]) + "\x02" : sane(pair[1][1]);
+    });
+    return [prefix + s1 + suffix, prefix + t1 + suffix];
+  }
+
+  // Turns the lines of a unified diff into rows, as SideBySideDiff.items().
+  // The lines can be fed a page at a time; finish() flushes the last rows.
+  function SideBySide() {
+    this.buf = [];
+    this.add = this.del = 0;
+    this.line1 = this.line2 = 0;
+    this.size1 = this.size2 = 0;
+  }
+
+  SideBySide.prototype.emptyBuffer = function(rows) {
+    var buf = this.buf;
+    if (this.del === 0 || this.add === 0) {
+      for (var i = 0; i < buf.length; i++) {
+        this.yieldLine(rows, buf[i][0], buf[i][1]);
+      }
+    } else {
+      var l0 = [], l1 = [];
+      buf.forEach(function(l) {
+        if (l[0] !== null) {
+          l0.push(l[0]);
+        }
+        if (l[1] !== null) {
+          l1.push(l[1]);
+        }
+      });
+      for (i = 0; i < Math.max(l0.length, l1.length); i++) {
+        this.yieldLine(rows, i < l0.length ? l0[i] : "", i < l1.length ? l1[i] : "");
+      }
+    }
+  };
+
+  SideBySide.prototype.yieldLine = function(rows, s1, s2) {
+    var orig1 = s1, orig2 = s2, type;
+    if (s1 === null && s2 === null) {
+      type = "unmodified";
+    } else if (s1 === "" && s2 === "") {
+      type = "unmodified";
+    } else if (s1 === null || s1 === "") {
+      type = "added";
+    } else if (s2 === null || s2 === "") {
+      type = "deleted";
+    } else if (orig1 === orig2 && !s1.endsWith("lines removed ]") && !s2.endsWith("lines removed ]")) {
+      type = "unmodified";
+    } else {
+      type = "changed";
+      var d = linediff(s1, s2);
+      s1 = d[0];
+      s2 = d[1];
+    }
+    rows.push(["L", type, s1, this.line1, s2, this.line2]);
+    var m = orig1 && /^\[ (\d+) lines removed \]$/.exec(orig1);
+    this.line1 += m ? Number(m[1]) : orig1 ? 1 : 0;
+    m = orig2 && /^\[ (\d+) lines removed \]$/.exec(orig2);
+    this.line2 += m ? Number(m[1]) : orig2 ? 1 : 0;
+    this.add = this.del = 0;
+    this.buf = [];
+  };
+
+  SideBySide.prototype.feed = function(lines) {
+    var rows = [], m;
+    for (var i = 0; i < lines.length; i++) {
+      var l = lines[i];
+      if (/^--- /.test(l) || /^\+\+\+ /.test(l)) {
+        this.emptyBuffer(rows);
+        continue;
+      }
+      m = /^@@ -(\d+),?(\d*) \+(\d+),?(\d*)/.exec(l);
+      if (m) {
+        this.emptyBuffer(rows);
+        var hunk = m.slice(1).map(function(x) { return x === "" ? 1 : Number(x); });
+        this.size1 = hunk[1];
+        this.size2 = hunk[3];
+        this.line1 = hunk[0];
+        this.line2 = hunk[2];
+        rows.push(["H"].concat(hunk));
+        continue;
+      }
+      if (/^\[/.test(l)) {
+        this.emptyBuffer(rows);
+        rows.push(["C", l]);
+      }
+      if (/^\\ No newline/.test(l)) {
+        var last = this.buf[this.buf.length - 1];
+        if (this.size2 === 0) {
+          last[1] += "\n" + l.slice(2);
+        } else {
+          last[0] += "\n" + l.slice(2);
+        }
+        continue;
+      }
+      if (this.size1 <= 0 && this.size2 <= 0) {
+        this.emptyBuffer(rows);
+        continue;
+      }
+      m = /^\+\[ (\d+) lines removed \]$/.exec(l);
+      if (m || /^\+/.test(l)) {
+        this.add += m ? Number(m[1]) : 1;
+        this.size2 -= m ? Number(m[1]) : 1;
+        this.buf.push([null, l.slice(1)]);
+        continue;
+      }
+      m = /^-\[ (\d+) lines removed \]$/.exec(l);
+      if (m || /^-/.test(l)) {
+        this.del += m ? Number(m[1]) : 1;
+        this.size1 -= m ? Number(m[1]) : 1;
+        this.buf.push([l.slice(1), null]);
+        continue;
+      }
+      if (/^ /.test(l) && this.size1 && this.size2) {
+        this.emptyBuffer(rows);
+        this.size1 -= 1;
+        this.size2 -= 1;
+        this.buf.push([l.slice(1), l.slice(1)]);
+        continue;
+      }
+      this.emptyBuffer(rows);
+    }
+    return rows;
+  };
+
+  SideBySide.prototype.finish = function() {
+    var rows = [];
+    this.emptyBuffer(rows);
+    return rows;
+  };
+
+  function cell(html, lineno, internal) {
+    if (!html) {
+      return '<td colspan="2">\xa0</td>';
+    }
+    if (internal) {
+      return '<td colspan="2" class="diffpresent">' + html + '</td>';
+    }
+    return '<td class="diffline">' + lineno + ' </td><td class="diffpresent">' + html + '</td>';
+  }
+
+  function renderRows(rows, internal) {
+    return rows.map(function(row) {
+      switch (row[0]) {
+      case "L":
+        return '<tr class="diff' + row[1] + '">' +
+          cell(convert(row[2] || "", "del"), row[3], internal) +
+          cell(convert(row[4] || "", "ins"), row[5], internal) + '</tr>\n';
+      case "H":
+        return '<tr class="diffhunk"><td colspan="2">Offset ' + row[1] + ', ' + row[2] +
+          ' lines modified</td><td colspan="2">Offset ' + row[3] + ', ' + row[4] +
+          ' lines modified</td></tr>\n';
+      case "C":
+        return '<tr><td colspan="4">' + escape(row[1]) + '</td></tr>\n';
+      case "X":
+        return '<tr class="error"><td colspan="4">Max diff block lines reached; ' +
+          row[1] + '/' + row[2] + ' bytes (' + (100 * row[1] / row[2]).toFixed(2) +
+          '%%) of diff not shown.</td></tr>\n';
+      }
+    }).join("");
+  }
+
+  function renderHeader(number, source1, source2, size, control) {
+    var sources = '<div><span class="source">' + escape(source1) + '</span>';
+    if (source1 !== source2) {
+      sources += ' vs.</div>\n<div><span class="source">' + escape(source2) + '</span>';
+    }
+    return '<div class="diffheader">\n' +
+      '<div class="diffcontrol' + (source1 !== source2 ? ' diffcontrol-double' : '') +
+      '">' + control + '</div>\n' +
+      '<div><span class="diffsize">' + escape(size) + '</span></div>\n' + sources +
+      '\n<a class="anchor" href="#node-' + number + '">\xb6</a>\n</div>\n</div>\n';
+  }
+
+  function createNode(number, source1, source2, size, control) {
+    var div = document.createElement("div");
+    div.className = "difference";
+    div.id = "node-" + number;
+    div.innerHTML = renderHeader(number, source1, source2, size, control) +
+      '<div class="lazy-body"></div>';
+    div.firstChild.addEventListener("click", function(evt) {
+      if (evt.target.tagName !== "A") {
+        toggle(number);
+      }
+    });
+    nodes[number] = div;
+    return div;
+  }
+
+  function renderBody(number, data) {
+    var body = nodes[number].lastChild;
+    var html = "";
+    if (data.comments.length) {
+      html += '<div class="comment">\n' + data.comments.map(function(x) {
+        return escape(x) + '<br/>\n';
+      }).join("") + '</div>\n';
+    }
+    data.visuals.forEach(function(x) {
+      html += '<div class="difference">\n<div class="diffheader">\n' +
+        '<div><span class="source">' + escape(x[2]) + '</span></div>\n</div>\n' +
+        '<div class="difference"><img src="data:' + escape(x[0]) + ',' + escape(x[1]) +
+        '" alt="compared images" /></div>\n</div>\n';
+    });
+    if (data.diff !== null) {
+      html += '<table class="diff">\n<colgroup><col class="colines"/><col class="coldiff"/>\n' +
+        '<col class="colines"/><col class="coldiff"/></colgroup>\n</table>\n';
+    }
+    body.innerHTML = html;
+    if (data.diff !== null) {
+      addRows(body.querySelector("table.diff"), number, data, new SideBySide(), 0, data.diff);
+    }
+    data.details.forEach(function(x) {
+      body.appendChild(createNode(x[0], x[1], x[2], x[3], x[4] ? "⊞" : "⊡"));
+    });
+  }
+
+  function addRows(table, number, data, parser, page, diff) {
+    var rows = parser.feed(diff.split("\n"));
+    if (page + 1 === data.pages) {
+      rows = rows.concat(parser.finish());
+      if (data.cut) {
+        rows.push(["X"].concat(data.cut));
+      }
+    }
+    table.insertAdjacentHTML("beforeend", renderRows(rows, data.has_internal_linenos));
+    if (page + 1 < data.pages) {
+      addMoreRows(table, number, data, parser, page + 1);
+    }
+  }
+
+  function addMoreRows(table, number, data, parser, page) {
+    var row = table.insertRow(-1);
+    row.className = "ondemand";
+    var left = data.pages - page;
+    row.innerHTML = '<td colspan="4">... <a href="#">load diff (' + left + ' piece' +
+      (left === 1 ? '' : 's') + ' left)</a> ...</td>';
+    row.addEventListener("click", function(evt) {
+      evt.preventDefault();
+      row.firstChild.textContent = "... loading ...";
+      fetchChunk(number + "-" + page).then(function(diff) {
+        row.remove();
+        addRows(table, number, data, parser, page, diff);
+      }, function(error) {
+        row.firstChild.textContent = error.message;
+      });
+    }, {once: true});
+  }
+
+  // Returns a promise resolved once node `number` is shown expanded.
+  function expand(number) {
+    var div = nodes[number];
+    var body = div.lastChild;
+    div.querySelector(".diffcontrol").textContent = "⊟";
+    body.hidden = false;
+    if (!div.loading) {
+      body.textContent = "... loading ...";
+      div.loading = fetchChunk(number).then(function(data) {
+        renderBody(number, data);
+      }, function(error) {
+        body.innerHTML = '<div class="error">' + escape(error.message) + '</div>';
+        div.loading = null;
+      });
+    }
+    return div.loading;
+  }
+
+  function toggle(number) {
+    var div = nodes[number];
+    if (div.loading && !div.lastChild.hidden) {
+      div.lastChild.hidden = true;
+      div.querySelector(".diffcontrol").textContent = "⊞";
+    } else {
+      expand(number);
+    }
+  }
+
+  // Expand the ancestors of node `number` and scroll to it.
+  function show(number) {
+    return (index || (index = fetchChunk("index"))).then(function(entries) {
+      var path = [];
+      for (var n = number; n !== null && entries[n]; n = entries[n][0]) {
+        path.unshift(n);
+      }
+      return path.reduce(function(promise, n) {
+        return promise.then(function() { return expand(n); });
+      }, Promise.resolve()).then(function() {
+        if (nodes[number]) {
+          nodes[number].scrollIntoView();
+        }
+      });
+    });
+  }
+
+  function findPath(entries, path) {
+    var paths = [""];
+    var found = null;
+    for (var n = 1; n < entries.length; n++) {
+      var parent = paths[entries[n][0]];
+      paths[n] = parent ? parent + " / " + entries[n][1] : entries[n][1];
+      if (paths[n] === path) {
+        return n;
+      }
+      if (found === null && paths[n].indexOf(path) !== -1) {
+        found = n;
+      }
+    }
+    return found;
+  }
+
+  var form = document.getElementById("lazy-jump");
+  form.addEventListener("submit", function(evt) {
+    evt.preventDefault();
+    var status = form.querySelector(".lazy-status");
+    var path = form.querySelector("input").value.trim();
+    status.textContent = "... loading ...";
+    (index || (index = fetchChunk("index"))).then(function(entries) {
+      var number = findPath(entries, path);
+      status.textContent = number === null ? "not found" : "";
+      if (number !== null) {
+        location.hash = "node-" + number;
+      }
+    });
+  });
+
+  function showHash() {
+    var m = /^#node-(\d+)$/.exec(location.hash);
+    if (m) {
+      show(Number(m[1]));
+    }
+  }
+  window.addEventListener("hashchange", showHash);
+
+  fetchChunk(0).then(function(data) {
+    var root = document.getElementById("lazy-root");
+    root.textContent = "";
+    root.appendChild(createNode(0, data.source1, data.source2, data.size, "⊟"));
+    nodes[0].loading = Promise.resolve();
+    renderBody(0, data);
+    showHash();
+  }, function(error) {
+    document.getElementById("lazy-root").innerHTML = '<div class="error">' +
+      escape(error.message) + ' (the report needs to be served over HTTP)</div>';
+  });
+})();
+</script>
+<style type="text/css">
+.diffoscope .diffcontrol {
+  display: block;
+}
+.diffoscope .diffheader {
+  cursor: pointer;
+}
+.diffoscope .diffheader:hover .diffcontrol {
+  color: #080;
+  font-weight: bold;
+}
+.diffoscope table.diff tr.ondemand td {
+  background: #f99;
+  text-align: center;
+  padding: 0.5em 0;
+  cursor: pointer;
+}
+.diffoscope .lazy-jump {
+  margin: 0.5em 0;
+}
+</style>
+"""
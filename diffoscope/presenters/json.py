@@ -18,7 +18,6 @@
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
 import json
-from collections import OrderedDict
 
 from .utils import Presenter
 
@@ -27,39 +26,76 @@ JSON_FORMAT_MAGIC = "diffoscope-json-version"
 
 
 class JSONPresenter(Presenter):
+    """
+    Write each node as soon as it is visited, rather than building the whole
+    report first. The output is the same as json.dumps(report, indent=2).
+    """
+
     def __init__(self, print_func):
+        # For each node being written, whether we have written any of its
+        # details yet. The "details" key is only written with the first one,
+        # so that nodes can be written before their details are known.
         self.stack = []
+        self.partial_line = ''
         self.print_func = print_func
 
         super().__init__()
 
-    def start(self, difference):
-        root = []
-        self.stack = [root]
-        super().start(difference)
+    def write(self, val):
+        # print_func() adds a newline, so only pass it complete lines.
+        lines, newline, self.partial_line = \
+            (self.partial_line + val).rpartition('\n')
+        if newline:
+            self.print_func(lines)
+
+    def finish(self):
+        while self.stack:
+            self.close()
+        self.print_func(self.partial_line)
 
-        root[0][JSON_FORMAT_MAGIC] = JSON_FORMAT_VERSION
-        root[0].move_to_end(JSON_FORMAT_MAGIC, last=False)
-        self.print_func(json.dumps(root[0], indent=2))
+    def close(self):
+        has_details = self.stack.pop()
+        indent = ' ' * 4 * len(self.stack)
+        if has_details:
+            self.write('\n{}  ]\n{}}}'.format(indent, indent))
+        else:
+            self.write('\n{}}}'.format(indent))
 
     def visit_difference(self, difference):
-        while self.depth + 1 < len(self.stack):
-            self.stack.pop()
+        while self.depth < len(self.stack):
+            self.close()
 
-        elements = [
-            ('source1', difference.source1),
-            ('source2', difference.source2)
+        if self.stack:
+            if self.stack[-1]:
+                self.write(',\n')
+            else:
+                self.write(',\n{}  {}: [\n'.format(
+                    ' ' * 4 * (self.depth - 1),
+                    json.dumps('details'),
+                ))
+            self.stack[-1] = True
+
+        indent = ' ' * 4 * self.depth
+        elements = []
+        if self.depth == 0:
+            elements += [(JSON_FORMAT_MAGIC, json.dumps(JSON_FORMAT_VERSION))]
+        elements += [
+            ('source1', json.dumps(difference.source1)),
+            ('source2', json.dumps(difference.source2)),
         ]
         if difference.comments:
-            elements += [('comments', [x for x in difference.comments])]
+            elements += [('comments', '[\n{}\n{}  ]'.format(
+                ',\n'.join(
+                    '{}    {}'.format(indent, json.dumps(x))
+                    for x in difference.comments
+                ),
+                indent,
+            ))]
         if difference.has_internal_linenos:
-            elements += [('has_internal_linenos', True)]
-        elements += [('unified_diff', difference.unified_diff)]
-
-        child_differences = []
-        if difference.details:
-            elements += [('details', child_differences)]
+            elements += [('has_internal_linenos', 'true')]
+        elements += [('unified_diff', json.dumps(difference.unified_diff))]
 
-        self.stack[-1].append(OrderedDict(elements))
-        if difference.details:
-            self.stack.append(child_differences)
+        self.write('{}{{\n{}'.format(indent, ',\n'.join(
+            '{}  {}: {}'.format(indent, json.dumps(k), v) for k, v in elements
+        )))
+        self.stack.append(False)
@@ -38,8 +38,11 @@ class MarkdownTextPresenter(Presenter):
             self.print_func(x)
             self.print_func()
 
-        if difference.unified_diff:
-            self.print_func(self.indent(difference.unified_diff, '    '))
+        printed = False
+        for x in self.indent_lines(difference.unified_diff_lines(), '    '):
+            self.print_func(x)
+            printed = True
+        if printed:
             self.print_func()
 
     def title(self, val):
@@ -40,10 +40,14 @@ class RestructuredTextPresenter(Presenter):
             self.print_func()
             self.print_func(x)
 
-        if difference.unified_diff:
-            self.print_func('::')
-            self.print_func()
-            self.print_func(self.indent(difference.unified_diff, '    '))
+        first = True
+        for x in self.indent_lines(difference.unified_diff_lines(), '    '):
+            if first:
+                self.print_func('::')
+                self.print_func()
+                first = False
+            self.print_func(x)
+        if not first:
             self.print_func()
 
     def title(self, val):
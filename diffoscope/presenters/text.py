@@ -20,6 +20,7 @@
 import re
 import sys
 import logging
+import contextlib
 
 from diffoscope.diff import color_unified_diff
 from diffoscope.config import Config
@@ -44,7 +45,8 @@ class TextPresenter(Presenter):
         super().__init__()
 
     @classmethod
-    def run(cls, data, difference, parsed_args):
+    @contextlib.contextmanager
+    def open(cls, data, parsed_args):
         with make_printer(data['target']) as fn:
             color = {
                 'auto': fn.output.isatty(),
@@ -52,10 +54,8 @@ class TextPresenter(Presenter):
                 'always': True,
             }[parsed_args.text_color]
 
-            presenter = cls(fn, color)
-
             try:
-                presenter.start(difference)
+                yield cls(fn, color)
             except UnicodeEncodeError:
                 logger.critical(
                     "Console is unable to print Unicode characters. Set e.g. "
@@ -67,7 +67,10 @@ class TextPresenter(Presenter):
         try:
             super().start(difference)
         except PrintLimitReached:
-            self.print_func("Max output size reached.", force=True)
+            self.print_limit_reached()
+
+    def print_limit_reached(self):
+        self.print_func("Max output size reached.", force=True)
 
     def visit_difference(self, difference):
         if self.depth == 0:
@@ -82,10 +85,13 @@ class TextPresenter(Presenter):
         for x in difference.comments:
             self.output(u"│┄ {}".format(x))
 
-        diff = difference.unified_diff
+        lines = difference.unified_diff_lines()
+        if self.color:
+            lines = map(color_unified_diff, lines)
 
-        if diff:
-            self.output(color_unified_diff(diff) if self.color else diff, True)
+        # Print the diff a batch of lines at a time rather than joining it.
+        for x in self.indent_lines(lines, self.PREFIX * self.depth):
+            self.print_func(x)
 
     def output(self, val, raw=False):
         self.print_func(
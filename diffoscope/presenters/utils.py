@@ -18,12 +18,17 @@
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
 import sys
-import codecs
+import bisect
+import itertools
 import collections
 import contextlib
 import string
 import _string
 
+from ..compression import open_output
+
+INDENT_BATCH_LINES = 1024
+
 
 def round_sigfig(num, s):
     # https://stackoverflow.com/questions/3410976/how-to-round-a-number-to-significant-figures-in-python
@@ -47,16 +52,51 @@ def sizeof_fmt(num, suffix='B', sigfig=3):
 class Presenter(object):
     supports_visual_diffs = False
 
+    # Presenters with the same traversal are run together by run_all(), so
+    # that the tree is only walked once for all of them. None means the
+    # presenter is always run on its own.
+    traversal = 'depth'
+
     def __init__(self):
         self.depth = 0
 
     @classmethod
     def run(cls, data, difference, parsed_args):
+        cls.run_all([(cls, data)], difference, parsed_args)
+
+    @classmethod
+    def run_all(cls, items, difference, parsed_args):
+        """
+        Run the presenters for `items`, a list of (klass, data) tuples, over a
+        single depth-first traversal of `difference`.
+        """
+        with contextlib.ExitStack() as stack:
+            presenters = [
+                stack.enter_context(klass.open(data, parsed_args))
+                for klass, data in items
+            ]
+            if len(presenters) == 1:
+                presenters[0].start(difference)
+            else:
+                MultiPresenter(presenters).start(difference)
+
+    @classmethod
+    @contextlib.contextmanager
+    def open(cls, data, parsed_args):
+        """Yield a presenter writing to data['target']."""
         with make_printer(data['target']) as fn:
-            cls(fn).start(difference)
+            yield cls(fn)
 
     def start(self, difference):
         self.visit(difference)
+        self.finish()
+
+    def finish(self):
+        """Called once all the nodes have been visited."""
+
+    def print_limit_reached(self):
+        """Called instead of visiting further nodes on PrintLimitReached."""
+        raise NotImplementedError()
 
     def visit(self, difference):
         self.visit_difference(difference)
@@ -80,6 +120,58 @@ class Presenter(object):
         # str.splitlines, etc.
         return prefix + val.rstrip().replace('\n', '\n{}'.format(prefix))
 
+    @classmethod
+    def indent_lines(cls, lines, prefix, batch=INDENT_BATCH_LINES):
+        """
+        Like indent(''.join(lines), prefix), but yield the result `batch`
+        lines at a time (without the newline ending each of them), so that a
+        long unified diff can be printed without joining it first.
+        """
+        lines = iter(lines)
+        pending = ''
+        while True:
+            chunk = ''.join(itertools.islice(lines, batch))
+            if not chunk:
+                break
+            # Trailing whitespace is stripped from the very end only, so keep
+            # blank chunks until we know whether anything follows them.
+            if pending and not chunk.isspace():
+                yield prefix + pending[:-1].replace('\n', '\n{}'.format(prefix))
+                pending = ''
+            pending += chunk
+        if pending:
+            yield cls.indent(pending, prefix)
+
+
+class MultiPresenter(Presenter):
+    """
+    Visit each node with several presenters in turn. A presenter reaching its
+    print limit is not passed any further nodes.
+    """
+
+    def __init__(self, presenters):
+        self.presenters = list(presenters)
+
+        super().__init__()
+
+    def visit(self, difference):
+        # Skip the rest of the tree once all the presenters are done.
+        if self.presenters:
+            super().visit(difference)
+
+    def visit_difference(self, difference):
+        for presenter in list(self.presenters):
+            presenter.depth = self.depth
+            try:
+                presenter.visit_difference(difference)
+            except PrintLimitReached:
+                presenter.print_limit_reached()
+                self.presenters.remove(presenter)
+
+    def finish(self):
+        for presenter in self.presenters:
+            presenter.finish()
+
 
 class PrintLimitReached(Exception):
     pass
@@ -94,7 +186,7 @@ def make_printer(path):
     output = sys.stdout
 
     if path != '-':
-        output = codecs.open(path, 'w', encoding='utf-8')
+        output = open_output(path)
 
     def fn(*args, **kwargs):
         kwargs['file'] = output
@@ -129,39 +221,161 @@ class PartialFormatter(string.Formatter):
     def escape(x):
         return x.replace("}", "}}").replace("{", "{{")
 
-    def get_value(self, key, args, kwargs):
-        return args[key] if isinstance(key, int) else args[int(key)]
-
     def arg_of_field_name(self, field_name, args):
         x = int(_string.formatter_field_name_split(field_name)[0])
         return x if x >= 0 else len(args) + x
 
-    def parse(self, *args, **kwargs):
-        # Preserve {{ and }} escapes when formatting
-        return map(lambda x: (self.escape(x[0]),) + x[1:], super().parse(*args, **kwargs))
+    def format_value(self, field, value):
+        obj = value
+        for is_attr, i in _string.formatter_field_name_split('0' + field.rest)[1]:
+            obj = getattr(obj, i) if is_attr else obj[i]
+        return self.format_field(self.convert_field(obj, field.conversion), field.spec)
 
-    parse_no_escape = string.Formatter.parse
 
+class FormatField(collections.namedtuple('FormatField', 'hole rest conversion spec')):
+    """A replacement field of a PartialString, eg. {0[1]} is the hole object
+    that was given at index 0, with a rest of "[1]"."""
 
-class FormatPlaceholder(object):
+    __slots__ = ()
 
-    def __init__(self, ident):
-        self.ident = str(ident)
+    @classmethod
+    def parse(cls, field_name, conversion, spec, holes, formatter):
+        index = formatter.arg_of_field_name(field_name, holes)
+        head = field_name.split('.', 1)[0].split('[', 1)[0]
+        return cls(holes[index], field_name[len(head):], conversion, spec)
+
+    @property
+    def plain(self):
+        return not (self.rest or self.conversion or self.spec)
+
+    def placeholder(self, index):
+        return "{%d%s%s%s}" % (
+            index,
+            self.rest,
+            "!" + self.conversion if self.conversion else "",
+            ":" + self.spec if self.spec else "",
+        )
+
+
+class HoleTable(object):
+    """The holes of a PartialString in order, each with the number of times
+    each of its fields is used.
+
+    Tables are never modified, but replace() returns a new one in O(size of
+    the change), using Baker's "shallow binding" technique: a table and
+    those derived from it share a single dict, which belongs to whichever of
+    them was used last. The others keep the changes that turn that dict into
+    their own contents.
+    """
 
-    def __repr__(self):
-        return "%s(%r)" % (self.__class__.__name__, self.ident)
+    __slots__ = ('_data', '_undo', '_next')
+
+    # The dict maps each hole to (counts, previous hole, next hole), with
+    # ENDS as the (last, first) ends of the list.
+    ENDS = object()
+
+    def __init__(self, items=()):
+        self._data = {self.ENDS: (None, self.ENDS, self.ENDS)}
+        self._undo = self._next = None
+        undo = {}
+        for hole, counts in items:
+            self._add(self._data, undo, hole, counts, 1, self.ENDS)
+
+    def _reroot(self):
+        path = []
+        x = self
+        while x._data is None:
+            path.append(x)
+            x = x._next
+        data = x._data
+        for y in reversed(path):
+            undo = {}
+            for key, entry in y._undo.items():
+                self._set(data, undo, key, entry)
+            x._data, x._undo, x._next = None, undo, y
+            y._data, y._undo, y._next = data, None, None
+            x = y
+        return data
 
-    def __format__(self, spec):
-        result = self.ident
-        if spec:
-            result += ":" + spec
-        return "{" + result + "}"
+    @staticmethod
+    def _set(data, undo, key, entry):
+        if key not in undo:
+            undo[key] = data.get(key)
+        if entry is None:
+            del data[key]
+        else:
+            data[key] = entry
 
-    def __getitem__(self, key):
-        return FormatPlaceholder(self.ident + "[" + str(key) + "]")
+    @classmethod
+    def _add(cls, data, undo, hole, counts, n, anchor):
+        entry = data.get(hole)
+        if entry is not None:
+            merged = dict(entry[0])
+            for field, count in counts.items():
+                merged[field] = merged.get(field, 0) + n * count
+            cls._set(data, undo, hole, (merged,) + entry[1:])
+            return
+        if n != 1:
+            counts = {field: n * count for field, count in counts.items()}
+        prev = data[anchor][1]
+        cls._set(data, undo, hole, (counts, prev, anchor))
+        x = data[prev]
+        cls._set(data, undo, prev, (x[0], x[1], hole))
+        x = data[anchor]
+        cls._set(data, undo, anchor, (x[0], hole, x[2]))
 
-    def __getattr__(self, attr):
-        return FormatPlaceholder(self.ident + "." + str(attr))
+    @classmethod
+    def _remove(cls, data, undo, hole):
+        _, prev, next_ = data[hole]
+        x = data[prev]
+        cls._set(data, undo, prev, (x[0], x[1], next_))
+        x = data[next_]
+        cls._set(data, undo, next_, (x[0], prev, x[2]))
+        cls._set(data, undo, hole, None)
+
+    def __contains__(self, hole):
+        return hole is not self.ENDS and hole in self._reroot()
+
+    def __iter__(self):
+        return iter([k for k, _ in self.items()])
+
+    def items(self):
+        data = self._reroot()
+        result = []
+        hole = data[self.ENDS][2]
+        while hole is not self.ENDS:
+            entry = data[hole]
+            result.append((hole, entry[0]))
+            hole = entry[2]
+        return result
+
+    def counts(self, hole):
+        return self._reroot()[hole][0]
+
+    def replace(self, replacements):
+        """Return a new table where each hole of replacements, a list of
+        (hole, [(new hole, counts, n), ...]) in the order of the holes, is
+        replaced by the new holes, their counts multiplied by n. New holes
+        that are already in the table stay where they are."""
+        data = self._reroot()
+        undo = {}
+        replaced = set(hole for hole, _ in replacements)
+        anchors = []
+        for hole, _ in replacements:
+            anchor = data[hole][2]
+            while anchor in replaced:
+                anchor = data[anchor][2]
+            anchors.append(anchor)
+        for hole in replaced:
+            self._remove(data, undo, hole)
+        for anchor, (_, items) in zip(anchors, replacements):
+            for hole, counts, n in items:
+                self._add(data, undo, hole, counts, n, anchor)
+
+        result = self.__class__.__new__(self.__class__)
+        result._data, result._undo, result._next = data, None, None
+        self._data, self._undo, self._next = None, undo, result
+        return result
 
 
 class PartialString(object):
@@ -222,6 +436,11 @@ class PartialString(object):
     >>> tmpl.pformatl("(first hole)", "(second hole)", "(object hole)")
     PartialString('(first hole) (second hole) (object hole)',)
 
+    Filling holes does not build any new strings. A PartialString is kept as
+    its parsed format string plus the chain of values substituted into it,
+    and the text is only put together by format(), so that composing a large
+    string piece by piece takes time linear in its size.
+
     CORNER CASES:
 
     1. If you need to include a literal '{' or '}' in the resulting formatted
@@ -273,62 +492,170 @@ class PartialString(object):
     escape = staticmethod(PartialFormatter.escape)
 
     def __init__(self, fmtstr="", *holes):
-        # Ensure the format string is valid, and figure out some basic stats
+        # Ensure the format string is valid, and split it into literal text
+        # and fields that refer to the hole objects directly.
         fmt = self.formatter
-        # use parse_no_escape so lengths are preserved
-        pieces = [(len(l), f) for l, f, _, _ in fmt.parse_no_escape(fmtstr)]
-        used_args = set(fmt.arg_of_field_name(f, holes) for _, f in pieces if f is not None)
-        self.num_holes = sum(1 for _, f in pieces if f is not None)
-        self.base_len = sum(l for l, _ in pieces)
-
-        # Remove unused and duplicates in the holes objects
-        seen = collections.OrderedDict()
-        mapping = tuple(FormatPlaceholder(seen.setdefault(k, len(seen))) if i in used_args else None
-                        for i, k in enumerate(holes))
-        self._fmtstr = fmt.vformat(fmtstr, mapping, None)
-        self.holes = tuple(seen.keys())
+        parts = []
+        for literal, field_name, spec, conversion in fmt.parse(fmtstr):
+            if literal:
+                parts.append(literal)
+            if field_name is not None:
+                parts.append(FormatField.parse(field_name, conversion, spec, holes, fmt))
+
+        # Count the uses of each hole, dropping unused and duplicate ones
+        counts = {}
+        for x in parts:
+            if isinstance(x, FormatField):
+                c = counts.setdefault(x.hole, {})
+                c[x] = c.get(x, 0) + 1
+        self._set(
+            tuple(parts),
+            None,
+            HoleTable((k, counts.pop(k)) for k in holes if k in counts),
+            sum(len(x) for x in parts if isinstance(x, str)),
+            sum(1 for x in parts if isinstance(x, FormatField)),
+        )
+
+    def _set(self, parts, chain, table, base_len, num_holes):
+        # parts is the parsed format string. chain is None, or a pair of the
+        # chain of an earlier PartialString and the values that pformat()
+        # substituted for its fields, making up a linked list of every
+        # substitution made since the format string was parsed.
+        self._parts = parts
+        self._chain = chain
+        self._table = table
+        self.base_len = base_len
+        self.num_holes = num_holes
+
+    @property
+    def holes(self):
+        return tuple(self._table)
 
     def __eq__(self, other):
         return (self is other or isinstance(other, PartialString) and
-                other._fmtstr == self._fmtstr and
-                other.holes == self.holes)
+                other.holes == self.holes and
+                other._fmtstr == self._fmtstr)
 
     def __repr__(self):
         return "%s%r" % (self.__class__.__name__, (self._fmtstr,) + self.holes)
 
-    def _format(self, *mapping):
-        # format a string but preserve {{ and }} escapes
-        return self.formatter.vformat(self._fmtstr, mapping, None)
-
-    def _offset_fmtstr(self, offset):
-        return self._format(*(FormatPlaceholder(i + offset) for i in range(len(self.holes))))
-
-    def _pformat(self, mapping, escapestr):
-        new_holes = []
-        real_mapping = []
-        for i, k in enumerate(self.holes):
-            if k in mapping:
-                v = mapping[k]
-                if isinstance(v, PartialString):
-                    out = v._offset_fmtstr(len(new_holes))
-                    new_holes.extend(v.holes)
-                elif isinstance(v, str) and escapestr:
-                    out = PartialString.escape(v)
+    @property
+    def _fmtstr(self):
+        positions = {k: i for i, k in enumerate(self.holes)}
+        return "".join(self._pieces(
+            self.escape,
+            lambda field: field.placeholder(positions[field.hole]),
+        ))
+
+    def _pieces(self, literal, placeholder):
+        """Yield the pieces of the string, passing its literal text through
+        literal() and replacing the fields of any unfilled holes with
+        placeholder(field)."""
+        indexes = {}
+
+        def index(chain):
+            # For every field substituted in chain, the times at which it
+            # happened (1 being the first substitution) and the values.
+            result = indexes.get(id(chain))
+            if result is None:
+                substitutions = []
+                x = chain
+                while x is not None:
+                    x, values = x
+                    substitutions.append(values)
+                result = indexes[id(chain)] = {}
+                for time, substituted in enumerate(reversed(substitutions), 1):
+                    for field, value in substituted.items():
+                        times, values = result.setdefault(field, ([], []))
+                        times.append(time)
+                        values.append(value)
+            return result
+
+        def lookup(field, frames):
+            # A field that appeared at a given time of a chain is filled by
+            # the next substitution of that field in the chain, if any, or
+            # else by the chain of the PartialString it was substituted into.
+            while frames is not None:
+                (fields, time), frames_ = frames
+                if field in fields:
+                    times, values = fields[field]
+                    i = bisect.bisect_right(times, time)
+                    if i < len(times):
+                        return values[i], ((fields, times[i]), frames_)
+                frames = frames_
+            return None, None
+
+        # Walk the substituted PartialStrings without recursing, as chains
+        # of continuations (see cont) can nest arbitrarily deep.
+        stack = [(iter(self._parts), ((index(self._chain), 0), None))]
+        while stack:
+            parts, frames = stack[-1]
+            for x in parts:
+                if isinstance(x, str):
+                    yield literal(x)
+                    continue
+                value, value_frames = lookup(x, frames)
+                if value is None:
+                    yield placeholder(x)
+                elif isinstance(value, str):
+                    yield literal(value)
                 else:
-                    out = v
+                    stack.append((
+                        iter(value._parts),
+                        ((index(value._chain), 0), value_frames),
+                    ))
+                    break
             else:
-                out = FormatPlaceholder(len(new_holes))
-                new_holes.append(k)
-            real_mapping.append(out)
-        return real_mapping, new_holes
+                stack.pop()
+
+    def _fill(self, field, value):
+        if not isinstance(value, PartialString):
+            return self.formatter.format_value(field, value)
+        if field.plain:
+            return value
+        # See CAVEATS
+        return self.__class__(
+            self.formatter.format_value(field, value._fmtstr),
+            *value.holes
+        )
 
     def size(self, hole_size=1):
         return self.base_len + hole_size * self.num_holes
 
     def pformat(self, mapping={}):
         """Partially apply a mapping, returning a new PartialString."""
-        real_mapping, new_holes = self._pformat(mapping, True)
-        return self.__class__(self._format(*real_mapping), *new_holes)
+        table = self._table
+        filled = [k for k in mapping if k in table]
+        if not filled:
+            return self
+        if len(filled) > 1:
+            filled = [k for k in table if k in mapping]
+
+        values = {}
+        replacements = []
+        base_len, num_holes = self.base_len, self.num_holes
+        for hole in filled:
+            items = []
+            for field, n in table.counts(hole).items():
+                value = values[field] = self._fill(field, mapping[hole])
+                num_holes -= n
+                if isinstance(value, PartialString):
+                    base_len += n * value.base_len
+                    num_holes += n * value.num_holes
+                    items.extend((k, v, n) for k, v in value._table.items())
+                else:
+                    base_len += n * len(value)
+            replacements.append((hole, items))
+
+        result = self.__class__.__new__(self.__class__)
+        result._set(
+            self._parts,
+            (self._chain, values),
+            table.replace(replacements),
+            base_len,
+            num_holes,
+        )
+        return result
 
     def pformatl(self, *args):
         """Partially apply a list, implicitly mapped from self.holes."""
@@ -336,10 +663,10 @@ class PartialString(object):
 
     def format(self, mapping={}):
         """Fully apply a mapping, returning a string."""
-        real_mapping, new_holes = self._pformat(mapping, False)
-        if new_holes:
-            raise ValueError("not all holes filled: %r" % new_holes)
-        return self._fmtstr.format(*real_mapping)
+        result = self.pformat(mapping)
+        if result.num_holes:
+            raise ValueError("not all holes filled: %r" % list(result.holes))
+        return "".join(result._pieces(lambda x: x, None))
 
     def formatl(self, *args):
         """Fully apply a list, implicitly mapped from self.holes."""
@@ -17,15 +17,37 @@
 # You should have received a copy of the GNU General Public License
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
+import io
 import codecs
 
+from ..compression import open_decompressed
+
 from .json import JSONReaderV1
+from .binary import BinaryReportReaderV1
+from ..presenters.binary import BINARY_FORMAT_MAGIC
 
 
 def load_diff_from_path(path):
     with open(path, 'rb') as fp:
+        decompressed = open_decompressed(fp)
+        if decompressed is not None:
+            with decompressed:
+                return load_diff_from_decompressed(decompressed, path)
+
+        magic = fp.read(len(BINARY_FORMAT_MAGIC))
+        fp.seek(0)
+        if magic == BINARY_FORMAT_MAGIC:
+            return BinaryReportReaderV1().load(fp, path)
         return load_diff(codecs.getreader('utf-8')(fp), path)
 
 
+def load_diff_from_decompressed(fp, path):
+    magic = fp.peek(len(BINARY_FORMAT_MAGIC))[:len(BINARY_FORMAT_MAGIC)]
+    if magic == BINARY_FORMAT_MAGIC:
+        # There is no file of the decompressed report to map into memory.
+        return BinaryReportReaderV1().load(io.BytesIO(fp.read()), path)
+    return load_diff(codecs.getreader('utf-8')(fp), path)
+
+
 def load_diff(fp, path):
     return JSONReaderV1().load(fp, path)
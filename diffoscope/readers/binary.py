@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import mmap
+import zlib
+import codecs
+import weakref
+import collections
+
+from ..diff import diff_iter_lines
+from ..difference import Difference, VisualDifference
+from ..presenters.binary import BINARY_FORMAT_MAGIC, BINARY_FORMAT_VERSION, \
+    HEADER, NODE, INDEX_SLOT, TRAILER, FLAG_HAS_DIFF, \
+    FLAG_HAS_INTERNAL_LINENOS, ROOT_PATH_DIGEST, path_digest, path_key
+
+from .utils import UnrecognizedFormatError
+
+BLOB_CHUNK_SIZE = 1 << 16
+
+Node = collections.namedtuple('Node', (
+    'meta_offset',
+    'meta_length',
+    'diff_offset',
+    'diff_length',
+    'size_self',
+    'size',
+    'parent',
+    'first_child',
+    'child_count',
+    'flags',
+))
+
+
+class BinaryReport(object):
+    """
+    Random access to the nodes of a report written by BinaryReportPresenter.
+    Nodes are identified by their number; the root is node 0.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+        if len(data) < HEADER.size + TRAILER.size:
+            raise UnrecognizedFormatError("Truncated binary report")
+        magic, version = HEADER.unpack_from(data)
+        if magic != BINARY_FORMAT_MAGIC:
+            raise UnrecognizedFormatError("Magic not found in binary report")
+        if version != BINARY_FORMAT_VERSION:
+            raise UnrecognizedFormatError(
+                "Unsupported binary report version: {}".format(version),
+            )
+
+        self.nodes_offset, self.node_count, self.index_offset, \
+            self.index_slots, magic = TRAILER.unpack_from(
+                data, len(data) - TRAILER.size,
+            )
+        if magic != BINARY_FORMAT_MAGIC or self.index_offset != \
+                self.nodes_offset + self.node_count * NODE.size:
+            raise UnrecognizedFormatError("Truncated binary report")
+
+    def __len__(self):
+        return self.node_count
+
+    def node(self, number):
+        if not 0 <= number < self.node_count:
+            raise IndexError(number)
+        return Node(*NODE.unpack_from(
+            self.data, self.nodes_offset + number * NODE.size,
+        ))
+
+    def read_blob(self, offset, length):
+        return zlib.decompress(
+            self.data[offset:offset + length],
+        ).decode('utf-8', 'surrogatepass')
+
+    def iter_blob(self, offset, length):
+        """Like read_blob() but decompressing BLOB_CHUNK_SIZE bytes at a time."""
+        decompressor = zlib.decompressobj()
+        decoder = codecs.getincrementaldecoder('utf-8')('surrogatepass')
+        data = self.data[offset:offset + length]
+        while data:
+            text = decoder.decode(decompressor.decompress(data, BLOB_CHUNK_SIZE))
+            data = decompressor.unconsumed_tail
+            if text:
+                yield text
+        yield decoder.decode(decompressor.flush(), True)
+
+    def meta(self, number):
+        """Return (source1, source2, comments, visuals) of a node."""
+        node = self.node(number)
+        return json.loads(self.read_blob(node.meta_offset, node.meta_length))
+
+    def unified_diff(self, number):
+        node = self.node(number)
+        if not node.flags & FLAG_HAS_DIFF:
+            return None
+        return self.read_blob(node.diff_offset, node.diff_length)
+
+    def unified_diff_lines(self, number):
+        """Iterate over the lines of unified_diff(number), keeping line endings."""
+        node = self.node(number)
+        if not node.flags & FLAG_HAS_DIFF:
+            return
+        pending = ''
+        for text in self.iter_blob(node.diff_offset, node.diff_length):
+            pending += text
+            end = pending.rfind('\n') + 1
+            if end:
+                yield from diff_iter_lines(pending[:end])
+                pending = pending[end:]
+        if pending:
+            yield pending
+
+    def children(self, number):
+        node = self.node(number)
+        return range(node.first_child, node.first_child + node.child_count)
+
+    def path(self, number):
+        """The source1 names of the nodes from below the root to a node."""
+        names = []
+        while number != 0:
+            names.append(self.meta(number)[0])
+            number = self.node(number).parent
+        return names[::-1]
+
+    def lookup(self, path):
+        """
+        Return the number of the node at `path`, a list of source1 names
+        starting below the root, or None if there is no such node.
+        """
+        digest = ROOT_PATH_DIGEST
+        for name in path:
+            digest = path_digest(digest, name)
+        key = path_key(digest)
+
+        mask = self.index_slots - 1
+        slot = key & mask
+        while True:
+            slot_key, number = INDEX_SLOT.unpack_from(
+                self.data, self.index_offset + slot * INDEX_SLOT.size,
+            )
+            if number == 0:
+                return None
+            if slot_key == key and self.path(number - 1) == list(path):
+                return number - 1
+            slot = (slot + 1) & mask
+
+    def difference(self, number=0):
+        return BinaryReportDifference(self, number)
+
+
+class BinaryReportDifference(Difference):
+    """
+    A Difference read from a BinaryReport. Its unified diff is decompressed
+    each time it is accessed, or streamed by unified_diff_lines(), and its
+    details are only read on demand.
+    """
+
+    def __init__(self, report, number):
+        node = report.node(number)
+        source1, source2, comments, visuals = report.meta(number)
+
+        self._report = report
+        self._number = number
+        self._source1 = source1
+        self._source2 = source2
+        self._comments = comments
+        self._has_internal_linenos = \
+            bool(node.flags & FLAG_HAS_INTERNAL_LINENOS)
+        self._has_diff = bool(node.flags & FLAG_HAS_DIFF)
+        self._details_list = None
+        self._visuals = [VisualDifference(*x) for x in visuals]
+        self._parents = []
+        self._size_self = node.size_self
+        self._size = node.size
+        # What the presenter counted in size_self besides the unified diff
+        # was stored along with it.
+        self._diff_size = node.size_self - (
+            len(source1) + len(source2) + sum(map(len, comments)) +
+            sum(v.size() for v in self._visuals)
+        )
+
+    @property
+    def number(self):
+        return self._number
+
+    @property
+    def _unified_diff(self):
+        return self._report.unified_diff(self._number)
+
+    def _has_unified_diff(self):
+        return self._has_diff
+
+    def _unified_diff_size(self):
+        return self._diff_size
+
+    def unified_diff_lines(self):
+        return self._report.unified_diff_lines(self._number)
+
+    @property
+    def _details(self):
+        if self._details_list is None:
+            self._details_list = [
+                BinaryReportDifference(self._report, x)
+                for x in self._report.children(self._number)
+            ]
+            for d in self._details_list:
+                d._parents.append(weakref.ref(self))
+        return self._details_list
+
+
+class BinaryReportReaderV1(object):
+    def load(self, fp, fn):
+        # fp should be a bytes-stream. Files are mapped into memory rather
+        # than read, so that only the nodes being used are paged in.
+        try:
+            data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            data = fp.read()
+
+        return BinaryReport(data).difference()
@@ -17,36 +17,250 @@
 # You should have received a copy of the GNU General Public License
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
+import re
 import json
 
+from json.decoder import scanstring
+
 from ..difference import Difference
 from ..presenters.json import JSON_FORMAT_MAGIC
 
 from .utils import UnrecognizedFormatError
 
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+NUMBER = re.compile(r'(-?(?:0|[1-9]\d*))(\.\d+)?([eE][-+]?\d+)?')
+NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+LITERALS = {
+    'true': True,
+    'false': False,
+    'null': None,
+}
+
+# Tokens are either one of '{}[],:' or VALUE.
+VALUE = 'value'
+
+
+class NeedMoreData(Exception):
+    pass
+
+
+class JSONTokenizer(object):
+    """
+    Split a JSON text stream into tokens, reading it in chunks so that only
+    the value being read has to be held in memory.
+    """
+
+    def __init__(self, fp, chunk_size=1048576):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def refill(self):
+        if self.eof:
+            return False
+        # Read at least as much as we already have, so that reading a huge
+        # value takes a linear number of copies and scans.
+        data = self.fp.read(max(self.chunk_size, len(self.buf) - self.pos))
+        if not data:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def error(self, msg):
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+    def next(self):
+        """Return (token, value) for the next token, or (None, None) at EOF."""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                break
+            if not self.refill():
+                return None, None
+
+        c = self.buf[self.pos]
+        if c in '{}[],:':
+            self.pos += 1
+            return c, None
+
+        while True:
+            try:
+                return VALUE, self.read_scalar(c)
+            except NeedMoreData:
+                self.refill()
+
+    def read_scalar(self, c):
+        buf = self.buf
+
+        if c == '"':
+            # Make sure the whole string is in the buffer before decoding it:
+            # it ends with the first quote not escaped by a backslash.
+            end = self.pos
+            while True:
+                end = buf.find('"', end + 1)
+                if end < 0:
+                    if self.eof:
+                        raise self.error("Unterminated string")
+                    raise NeedMoreData()
+                backslashes = 0
+                while buf[end - backslashes - 1] == '\\':
+                    backslashes += 1
+                if backslashes % 2 == 0:
+                    break
+            value, self.pos = scanstring(buf, self.pos + 1)
+            return value
+
+        # A number may go on in the next chunk.
+        m = NUMBER.match(buf, self.pos)
+        if m is not None:
+            if not self.eof and (m.end() == len(buf) or buf[m.end()] in NUMBER_CHARS):
+                raise NeedMoreData()
+            integer, frac, exp = m.groups()
+            self.pos = m.end()
+            if frac or exp:
+                return float(integer + (frac or '') + (exp or ''))
+            return int(integer)
+
+        for literal, value in LITERALS.items():
+            if buf.startswith(literal, self.pos):
+                self.pos += len(literal)
+                return value
+        if not self.eof and len(buf) - self.pos < 5:
+            raise NeedMoreData()
+
+        raise self.error("Expecting value")
+
+    def expect(self, expected):
+        token, _ = self.next()
+        if token != expected:
+            raise self.error("Expecting '{}'".format(expected))
+
+    def read_value(self, token=None, value=None):
+        """Read a whole (small) value, starting with the given token."""
+        if token is None:
+            token, value = self.next()
+        if token == VALUE:
+            return value
+
+        if token == '[':
+            result = []
+            token, value = self.next()
+            while token != ']':
+                result.append(self.read_value(token, value))
+                token, _ = self.next()
+                if token == ',':
+                    token, value = self.next()
+                elif token != ']':
+                    raise self.error("Expecting ',' or ']'")
+            return result
+
+        if token == '{':
+            result = {}
+            token, key = self.next()
+            while token != '}':
+                if token != VALUE or not isinstance(key, str):
+                    raise self.error("Expecting property name")
+                self.expect(':')
+                result[key] = self.read_value()
+                token, _ = self.next()
+                if token == ',':
+                    token, key = self.next()
+                elif token != '}':
+                    raise self.error("Expecting ',' or '}'")
+            return result
+
+        raise self.error("Expecting value")
+
 
 class JSONReaderV1(object):
+    """
+    Build the Difference tree while reading the JSON, instead of loading the
+    whole document first, so that reading a report takes little more memory
+    than the resulting tree.
+    """
+
     def load(self, fp, fn):
         # fp should be a str-stream not a bytes-stream. If you need to pass in
         # a bytes-stream, wrap it in codecs.getreader('utf-8')(fp)
-        raw = json.load(fp)
-        if JSON_FORMAT_MAGIC not in raw or raw[JSON_FORMAT_MAGIC] != 1:
+        tokens = JSONTokenizer(fp)
+
+        # The magic is always written first, so reject other JSON documents
+        # on the first key instead of after reading all of them.
+        token, _ = tokens.next()
+        if token == '{':
+            token, key = tokens.next()
+        if token != VALUE or key != JSON_FORMAT_MAGIC:
+            raise UnrecognizedFormatError(
+                "Magic not found in JSON: {}".format(JSON_FORMAT_MAGIC)
+            )
+        tokens.expect(':')
+        if tokens.read_value() != 1:
             raise UnrecognizedFormatError(
                 "Magic not found in JSON: {}".format(JSON_FORMAT_MAGIC)
             )
-        return self.load_rec(raw)
 
-    def load_rec(self, raw):
-        source1 = raw['source1']
-        source2 = raw['source2']
-        unified_diff = raw['unified_diff']
+        # Nodes being read. Each is the dict of its fields read so far, with
+        # its children under 'details'.
+        stack = [{'details': []}]
+        while True:
+            raw = stack[-1]
+            token, key = tokens.next()
+
+            if token == ',':
+                continue
+
+            if token == VALUE and isinstance(key, str):
+                tokens.expect(':')
+                if key != 'details':
+                    raw[key] = tokens.read_value()
+                    continue
+                tokens.expect('[')
+                token, _ = tokens.next()
+                if token == '{':
+                    stack.append({'details': []})
+                elif token != ']':
+                    raise tokens.error("Expecting '{' or ']'")
+                continue
+
+            if token != '}':
+                raise tokens.error("Expecting property name or '}'")
+
+            stack.pop()
+            if not stack:
+                break
+            stack[-1]['details'].append(self.load_node(raw))
+
+            # We just read an element of our parent's details.
+            token, _ = tokens.next()
+            if token == ',':
+                tokens.expect('{')
+                stack.append({'details': []})
+            elif token != ']':
+                raise tokens.error("Expecting ',' or ']'")
+
+        if tokens.next()[0] is not None:
+            raise tokens.error("Extra data")
+        return self.load_node(raw)
+
+    def load_node(self, raw):
+        try:
+            source1 = raw['source1']
+            source2 = raw['source2']
+            unified_diff = raw['unified_diff']
+        except KeyError as e:
+            raise UnrecognizedFormatError("Missing {} in JSON".format(e))
         comments = raw.get('comments', [])
-        details = [self.load_rec(child) for child in raw.get('details', [])]
 
         return Difference(
             unified_diff,
             source1,
             source2,
             comment=comments,
-            details=details,
+            details=raw['details'],
         )
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import glob
+import time
+import logging
+import threading
+import contextlib
+import subprocess
+
+from .config import Config
+from .profiling import profile
+
+logger = logging.getLogger(__name__)
+
+# How many of the Config().jobs process slots each tool takes up. Tools that
+# are not listed take one.
+TOOL_WEIGHTS = {
+    'apktool': 4,
+    'enjarify': 2,
+    'javap': 2,
+    'procyon': 2,
+    'unsquashfs': 2,
+}
+
+# How often we check the memory usage of running processes while waiting for
+# it to go under the budget.
+POLL_INTERVAL = 0.1
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def tool_weight(tool):
+    return TOOL_WEIGHTS.get(os.path.basename(tool), 1)
+
+
+def memory_budget():
+    """
+    Return the maximum combined RSS of running processes, in bytes, or 0 for
+    no limit. Defaults to half of the physical memory.
+    """
+    budget = Config().max_process_memory
+    if budget is None:
+        try:
+            return os.sysconf('SC_PHYS_PAGES') * _PAGE_SIZE // 2
+        except (OSError, ValueError):
+            return 0
+    return budget
+
+
+def process_rss(pid):
+    """
+    Resident memory of process `pid` and its descendants (eg. a JVM started
+    by a wrapper script), in bytes.
+    """
+    rss = 0
+    pids = [pid]
+    while pids:
+        pid = pids.pop()
+        try:
+            with open('/proc/{}/statm'.format(pid)) as f:
+                rss += int(f.read().split()[1]) * _PAGE_SIZE
+            for path in glob.glob('/proc/{}/task/*/children'.format(pid)):
+                with open(path) as f:
+                    pids.extend(int(x) for x in f.read().split())
+        except (OSError, ValueError, IndexError):
+            continue
+    return rss
+
+
+class Slot(object):
+    def __init__(self, tool, weight):
+        self.tool = tool
+        self.weight = weight
+        self.owner = threading.get_ident()
+        self.pid = None
+
+
+class Scheduler(object):
+    """
+    Limit the external processes running at once: their combined weight
+    (see TOOL_WEIGHTS) may not exceed Config().jobs, and no new process is
+    started while those running use more than memory_budget().
+
+    Two exceptions ensure we always make progress: a process may start if
+    nothing else is running, and a thread that already has processes
+    running may start more, as these often depend on each other (eg. the two
+    commands being compared and the diff(1) reading their output).
+    """
+
+    _singleton = {}
+
+    def __init__(self):
+        self.__dict__ = self._singleton
+
+        if not self._singleton:
+            self._cond = threading.Condition()
+            self._running = set()
+
+    def reset(self):
+        """Forget about all slots, eg. those left behind by a test."""
+        with self._cond:
+            self._running.clear()
+            self._cond.notify_all()
+
+    def _used(self):
+        return sum(x.weight for x in self._running)
+
+    def _rss(self):
+        return sum(process_rss(x.pid) for x in self._running if x.pid)
+
+    def _can_start(self, weight):
+        if not self._running:
+            return True
+        owner = threading.get_ident()
+        if any(x.owner == owner for x in self._running):
+            return True
+        if self._used() + weight > Config().jobs:
+            return False
+        budget = memory_budget()
+        return not budget or self._rss() < budget
+
+    def acquire(self, tool):
+        """
+        Wait until `tool` may be started and return the Slot it runs in,
+        which must be passed to release() once the process has exited.
+        """
+        slot = Slot(tool, tool_weight(tool))
+        with profile('scheduler', os.path.basename(tool)):
+            with self._cond:
+                while not self._can_start(slot.weight):
+                    self._cond.wait(POLL_INTERVAL)
+                self._running.add(slot)
+        return slot
+
+    def release(self, slot):
+        with self._cond:
+            if slot in self._running:
+                self._running.remove(slot)
+                self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self, tool):
+        slot = self.acquire(tool)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+
+def _run(args, **kwargs):
+    with Scheduler().slot(args[0]) as slot:
+        with subprocess.Popen(args, **kwargs) as process:
+            slot.pid = process.pid
+            try:
+                output, _ = process.communicate()
+            except:  # noqa
+                process.kill()
+                raise
+            return process.poll(), output
+
+
+def call(args, **kwargs):
+    """Like subprocess.call(), once the Scheduler allows it."""
+    return _run(args, **kwargs)[0]
+
+
+def check_call(args, **kwargs):
+    """Like subprocess.check_call(), once the Scheduler allows it."""
+    returncode, _ = _run(args, **kwargs)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, args)
+    return 0
+
+
+def check_output(args, **kwargs):
+    """Like subprocess.check_output(), once the Scheduler allows it."""
+    returncode, output = _run(args, stdout=subprocess.PIPE, **kwargs)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, args, output=output)
+    return output
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import sys
+import logging
+import contextlib
+
+from .difference import Difference
+
+logger = logging.getLogger(__name__)
+
+
+class StreamManager(object):
+    """
+    Write the report while comparing, one finished subtree at a time.
+
+    Only the comparison of directories streams: the node of a directory is
+    not changed once its details are known, whereas e.g. an archive falls
+    back to a binary comparison if it cannot be read to the end. Each Stream
+    on the stack is the comparison of a directory within the one below it.
+    """
+
+    _singleton = {}
+
+    def __init__(self):
+        self.__dict__ = self._singleton
+
+        if not self._singleton:
+            self.reset()
+
+    def reset(self):
+        if getattr(self, 'exit_stack', None) is not None:
+            self.exit_stack.close()
+        self.stack = []
+        self.open_presenter = None
+        self.presenter = None
+        self.exit_stack = None
+
+    def setup(self, open_presenter):
+        """
+        Stream the report to the presenter returned by open_presenter(stack),
+        which is called with a contextlib.ExitStack once there is something
+        to write.
+        """
+        logger.debug("Streaming the report while comparing")
+        self.open_presenter = open_presenter
+
+    def push(self, stream):
+        self.prune()
+        if self.open_presenter is None:
+            return
+        stream.depth = len(self.stack)
+        self.stack.append(stream)
+
+    def pop(self, stream):
+        if stream not in self.stack:
+            return
+        self.prune()
+        assert self.stack[-1] is stream
+        # Left on the stack until its parent is passed its node, as the
+        # parent may add further details to it first.
+        stream.finished = True
+
+    def prune(self):
+        """
+        Remove the finished streams from the top of the stack, returning the
+        lowest one.
+        """
+        child = None
+        while self.stack and self.stack[-1].finished:
+            child = self.stack.pop()
+        return child
+
+    def add(self, stream, difference):
+        if stream not in self.stack:
+            return difference
+
+        child = self.prune()
+        assert self.stack[-1] is stream
+        if child is not None and child.difference is difference and child.opened:
+            self.write_rest(child)
+        else:
+            self.open()
+            self.presenter.depth = stream.depth + 1
+            self.presenter.visit(difference)
+        self.flush()
+        stream.written += 1
+
+        # Keep a stub, so the parents of `difference` still have details.
+        return Difference(None, difference.source1, difference.source2)
+
+    def open(self):
+        """Write the headers of the streams that have not been written yet."""
+        for x in self.stack:
+            if x.opened:
+                continue
+            if self.presenter is None:
+                self.exit_stack = contextlib.ExitStack()
+                self.presenter = self.open_presenter(self.exit_stack)
+            self.presenter.depth = x.depth
+            self.presenter.visit_difference(x.difference)
+            x.opened = True
+
+    def write_rest(self, stream):
+        """Write the details added to a written node after it was compared."""
+        for x in stream.difference.details[stream.written:]:
+            self.presenter.depth = stream.depth + 1
+            self.presenter.visit(x)
+
+    def flush(self):
+        sys.stdout.flush()
+
+    def finish(self, difference):
+        """
+        Write what is left of `difference`, the root of the report, and return
+        whether it was streamed. If it was not, nothing has been written.
+        """
+        root = self.prune()
+        streamed = root is not None and root.opened
+        if streamed:
+            assert root.difference is difference
+            self.write_rest(root)
+            self.presenter.finish()
+        self.reset()
+        return streamed
+
+
+class Stream(object):
+    """
+    Collect the details of `difference`, passing each of them to add() once
+    it is final. While streaming, a detail is written there and then (after
+    the headers of its ancestors), and add() returns a stub of it to keep
+    instead.
+    """
+
+    def __init__(self, difference):
+        self.difference = difference
+        self.depth = None
+        self.opened = False
+        self.finished = False
+        # The number of details of `difference` written so far
+        self.written = 0
+
+    def __enter__(self):
+        StreamManager().push(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        StreamManager().pop(self)
+
+    def add(self, difference):
+        return StreamManager().add(self, difference)
@@ -54,6 +54,7 @@ setup(
     ],
     extras_require={
         'distro_detection': ['distro'],
+        'zstd': ['zstandard'],
     },
     classifiers=[
         'Development Status :: 3 - Alpha',
@@ -18,22 +18,19 @@
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
 import os.path
-import pytest
 import subprocess
 
 from os import mkdir, symlink
 from tempfile import TemporaryDirectory
 
 from diffoscope.tools import tool_required
-from diffoscope.exc import RequiredToolNotFound
 from diffoscope.difference import Difference
 from diffoscope.comparators.binary import FilesystemFile
 from diffoscope.comparators.utils.file import File
 from diffoscope.comparators.missing_file import MissingFile
-from diffoscope.comparators.utils.compare import Xxd
 
 from ..utils.data import data, init_fixture, get_data, normalize_zeros
-from ..utils.tools import skip_unless_tools_exist, skip_unless_module_exists
+from ..utils.tools import skip_unless_module_exists
 
 
 TEST_FILE1_PATH = data('binary1')
@@ -75,41 +72,22 @@ def test_guess_encoding_iso8859():
     assert File.guess_encoding(TEST_ISO8859_PATH) == 'iso-8859-1'
 
 
-def test_no_differences_with_xxd(binary1):
+def test_no_differences(binary1):
     difference = binary1.compare_bytes(binary1)
     assert difference is None
 
 
-@skip_unless_tools_exist('xxd')
-def test_compare_with_xxd(binary1, binary2):
+def test_compare(binary1, binary2):
     difference = binary1.compare_bytes(binary2)
     expected_diff = get_data('binary_expected_diff')
     assert normalize_zeros(difference.unified_diff) == expected_diff
 
 
-def test_compare_non_existing_with_xxd(binary1):
+def test_compare_non_existing(binary1):
     difference = binary1.compare_bytes(MissingFile('/nonexisting', binary1))
     assert difference.source2 == '/nonexisting'
 
 
-@pytest.fixture
-def xxd_not_found(monkeypatch):
-    def mock_cmdline(self):
-        raise RequiredToolNotFound('xxd')
-    monkeypatch.setattr(Xxd, 'cmdline', mock_cmdline)
-
-
-def test_no_differences_without_xxd(xxd_not_found, binary1):
-    difference = binary1.compare_bytes(binary1)
-    assert difference is None
-
-
-def test_compare_without_xxd(xxd_not_found, binary1, binary2):
-    difference = binary1.compare(binary2)
-    expected_diff = get_data('binary_hexdump_expected_diff')
-    assert difference.unified_diff == expected_diff
-
-
 def test_with_compare_details():
     d = Difference('diff', TEST_FILE1_PATH, TEST_FILE2_PATH, source='source')
 
@@ -120,7 +98,6 @@ def test_with_compare_details():
     assert difference.details[0] == d
 
 
-@skip_unless_tools_exist('xxd')
 def test_with_compare_details_and_fallback():
     class MockFile(FilesystemFile):
         def compare_details(self, other, source=None):
@@ -139,7 +116,6 @@ def test_with_compare_details_and_no_actual_differences():
     assert difference is None
 
 
-@skip_unless_tools_exist('xxd')
 def test_with_compare_details_and_failed_process():
     output = 'Free Jeremy Hammond'
 
@@ -154,7 +130,6 @@ def test_with_compare_details_and_failed_process():
     assert normalize_zeros(difference.unified_diff) == expected_diff
 
 
-@skip_unless_tools_exist('xxd')
 def test_with_compare_details_and_parsing_error():
     from diffoscope.exc import OutputParsingError
 
@@ -168,7 +143,6 @@ def test_with_compare_details_and_parsing_error():
     assert normalize_zeros(difference.unified_diff) == expected_diff
 
 
-@skip_unless_tools_exist('xxd')
 def test_with_compare_details_and_extraction_error():
     from diffoscope.exc import ContainerExtractionError
 
@@ -182,7 +156,6 @@ def test_with_compare_details_and_extraction_error():
     assert normalize_zeros(difference.unified_diff) == expected_diff
 
 
-@skip_unless_tools_exist('xxd')
 @skip_unless_module_exists('distro')
 def test_with_compare_details_and_tool_not_found(monkeypatch):
     from diffoscope.external_tools import EXTERNAL_TOOLS
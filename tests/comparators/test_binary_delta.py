@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import random
+
+from diffoscope.comparators.utils.binary_delta import binary_delta, \
+    delta_texts, DeltaOp, DELTA_BLOCK_SIZE
+
+
+def random_bytes(rand, size):
+    return bytes(rand.getrandbits(8) for _ in range(size))
+
+
+def apply_delta(data1, data2, ops):
+    result = bytearray()
+    offset = 0
+    for op in ops:
+        result += data1[offset:op.start1] + data2[op.start2:op.end2]
+        offset = op.end1
+    return bytes(result + data1[offset:])
+
+
+def test_identical():
+    data = random_bytes(random.Random(0), 1000)
+    assert binary_delta(data, data) == []
+
+
+def test_insert_delete_modify():
+    data1 = random_bytes(random.Random(0), 10000)
+    data2 = data1[:100] + b'inserted' + data1[100:5000] + \
+        b'X' * 10 + data1[5010:9000] + data1[9500:]
+    assert binary_delta(data1, data2) == [
+        DeltaOp('insert', 100, 100, 100, 108),
+        DeltaOp('modify', 5000, 5010, 5008, 5018),
+        DeltaOp('delete', 9000, 9500, 9008, 9008),
+    ]
+
+
+def test_flipped_bytes():
+    data1 = random_bytes(random.Random(0), 100000)
+    data2 = bytearray(data1)
+    for offset in range(100, len(data2) - 100, 256):
+        data2[offset] ^= 0xff
+    assert binary_delta(data1, bytes(data2)) == [
+        DeltaOp('modify', x, x + 1, x, x + 1)
+        for x in range(100, len(data2) - 100, 256)
+    ]
+
+
+def test_delta_texts_max_lines():
+    ops = [DeltaOp('modify', x, x + 1, x, x + 1) for x in range(10)]
+    text1, text2 = delta_texts(b'a' * 10, b'b' * 10, ops, 6)
+    assert text1.splitlines()[-1] == text2.splitlines()[-1] == \
+        '[ 7 more changed regions ]'
+    assert len(text1.splitlines()) == 7
+
+
+def test_completely_different():
+    rand = random.Random(0)
+    data1 = random_bytes(rand, DELTA_BLOCK_SIZE * 100)
+    data2 = random_bytes(rand, DELTA_BLOCK_SIZE * 50)
+    assert binary_delta(data1, data2) == [
+        DeltaOp('modify', 0, len(data1), 0, len(data2)),
+    ]
+
+
+def test_random_edits():
+    rand = random.Random(0)
+    for _ in range(100):
+        data1 = random_bytes(rand, rand.randint(0, 5000))
+        data2 = bytearray(data1)
+        for _ in range(rand.randint(0, 4)):
+            offset = rand.randint(0, len(data2))
+            size = rand.randint(0, 300)
+            data2[offset:offset + size] = \
+                random_bytes(rand, rand.randint(0, 300))
+        data2 = bytes(data2)
+        assert apply_delta(data1, data2, binary_delta(data1, data2)) == data2
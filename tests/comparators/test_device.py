@@ -25,7 +25,6 @@ from diffoscope.comparators.device import Device
 from diffoscope.comparators.utils.specialize import specialize
 
 from ..utils.data import load_fixture, get_data, normalize_zeros
-from ..utils.tools import skip_unless_tools_exist
 
 
 text_ascii1 = load_fixture('text_ascii1')
@@ -50,7 +49,6 @@ def test_identification(devnull):
     assert isinstance(devnull, Device)
 
 
-@skip_unless_tools_exist('xxd')
 def test_diff(differences):
     if os.uname()[0] == 'FreeBSD':
         expected_diff = get_data('device_expected_diff_freebsd')
@@ -59,7 +57,6 @@ def test_diff(differences):
     assert normalize_zeros(differences.unified_diff) == expected_diff
 
 
-@skip_unless_tools_exist('xxd')
 def test_diff_reverse(differences_reverse):
     if os.uname()[0] == 'FreeBSD':
         expected_diff = get_data('device_expected_diff_reverse_freebsd')
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+
+from diffoscope.comparators.utils.command import Command
+from diffoscope.comparators.utils.disassembly import split_disassembly, \
+    read_shard, compare_disassembly_shards
+
+DISASSEMBLY = [
+    b'\n',
+    b'Disassembly of section .text:\n',
+    b'\n',
+    b'0000000000000000 <f>:\n',
+    b'   0:\tc3                   \tret\n',
+    b'\n',
+    b'0000000000000001 <g>:\n',
+    b'   1:\tc3                   \tret\n',
+    b'\n',
+    b'0000000000000002 <f>:\n',
+    b'   2:\t90                   \tnop\n',
+]
+
+
+def test_split_disassembly(tmpdir):
+    path = str(tmpdir.join('disassembly'))
+    with open(path, 'wb') as f:
+        shards = split_disassembly(DISASSEMBLY, f)
+    assert list(shards) == [(None, 0), ('f', 0), ('g', 0), ('f', 1)]
+    assert b''.join(read_shard(path, shards[None, 0])) == \
+        b''.join(DISASSEMBLY[:3])
+    assert list(read_shard(path, shards['g', 0])) == DISASSEMBLY[6:9]
+    assert list(read_shard(path, shards['f', 1])) == DISASSEMBLY[9:]
+    assert shards['f', 0].digest != shards['f', 1].digest
+
+
+def test_split_disassembly_without_functions():
+    shards = split_disassembly(DISASSEMBLY[:3], io.BytesIO())
+    assert list(shards) == [(None, 0)]
+    assert split_disassembly([], io.BytesIO()) == {}
+
+
+MOVED = [
+    b'0000000000001020 <f>:\n',
+    b'    1020:\te8 0b 00 00 00       \tcall   1030 <g>\n',
+    b'    1025:\t48 8d 3d d8 0e 00 00 \tlea    0xed8(%rip),%rdi\n',
+    b'    102c:\tc3                   \tret\n',
+]
+OTHER = [
+    b'0000000000001139 <f>:\n',
+    b'    1139:\te8 12 00 00 00       \tcall   1150 <g>\n',
+    b'    113e:\t48 8d 3d bf 0d 00 00 \tlea    0xdbf(%rip),%rdi\n',
+    b'    1145:\tc3                   \tret\n',
+]
+CHANGED = OTHER[:3] + [b'    1145:\t90                   \tnop\n']
+
+
+def test_split_disassembly_normalizes_addresses():
+    def shard(lines):
+        return split_disassembly(lines, io.BytesIO())['f', 0]
+    assert shard(MOVED).digest != shard(OTHER).digest
+    assert shard(MOVED).normalized_digest == shard(OTHER).normalized_digest
+    assert shard(CHANGED).normalized_digest != shard(OTHER).normalized_digest
+
+
+class Cat(Command):
+    def cmdline(self):
+        return ['cat', self.path]
+
+
+def compare(tmpdir, lines1, lines2):
+    path1, path2 = str(tmpdir.join('1')), str(tmpdir.join('2'))
+    with open(path1, 'wb') as f:
+        f.writelines(lines1)
+    with open(path2, 'wb') as f:
+        f.writelines(lines2)
+    return compare_disassembly_shards(Cat, path1, path2, ())
+
+
+def test_compare_disassembly_shards(tmpdir):
+    g1 = [b'0000000000001030 <g>:\n', b'    1030:\tc3 \tret\n']
+    g2 = [b'0000000000001150 <g>:\n', b'    1150:\t90 \tnop\n']
+    difference = compare(tmpdir, MOVED + g1, OTHER + g2)
+    assert difference.comments == [
+        "Disassembly compared function by function; 2 of 2 functions "
+        "differ, 1 of them only in addresses",
+    ]
+    # Functions that only moved are still shown, but last.
+    assert [x.source1 for x in difference.details] == ['g', 'f']
+    assert difference.details[1].comments == ["Only addresses differ"]
+
+    assert compare(tmpdir, OTHER + g1, OTHER + g1) is None
+
+
+def test_compare_disassembly_shards_reordered(tmpdir):
+    g = [b'0000000000001150 <g>:\n', b'    1150:\tc3 \tret\n']
+    difference = compare(tmpdir, OTHER + g, g + OTHER)
+    assert difference is not None
+    assert difference.comments[-1] == "Functions are in a different order"
+    assert difference.details == []
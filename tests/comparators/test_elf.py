@@ -17,12 +17,14 @@
 # You should have received a copy of the GNU General Public License
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
+import io
 import pytest
 import os.path
 import subprocess
 
 from diffoscope.config import Config
-from diffoscope.comparators.elf import ElfFile, StaticLibFile
+from diffoscope.comparators.elf import ElfFile, StaticLibFile, \
+    ElfCodeSection, ReadelfCombined, READELF_COMBINED_COMMANDS
 from diffoscope.comparators.binary import FilesystemFile
 from diffoscope.comparators.directory import FilesystemDirectory
 from diffoscope.comparators.missing_file import MissingFile
@@ -79,6 +81,60 @@ def test_diff(obj_differences):
     assert obj_differences[0].unified_diff == expected_diff
 
 
+@skip_unless_tools_exist('readelf', 'objdump')
+@skip_if_tool_version_is('readelf', readelf_version, '2.29')
+@skip_if_binutils_does_not_support_x86()
+def test_diff_by_function(monkeypatch, obj1, obj2):
+    monkeypatch.setattr(ElfCodeSection, '_should_shard', lambda *_: True)
+    text = obj1.compare(obj2).details[0]
+    assert text.source1.startswith('objdump --line-numbers --disassemble')
+    assert text.comments == [
+        "Disassembly compared function by function; 1 of 1 functions differ",
+    ]
+    assert [x.source1 for x in text.details] == ['f']
+    expected_diff = get_data('elf_obj_expected_diff')
+    assert text.details[0].unified_diff.splitlines()[1:-1] == \
+        expected_diff.splitlines()[4:-1]
+
+
+@skip_unless_tools_exist('readelf')
+@skip_if_binutils_does_not_support_x86()
+def test_readelf_combined():
+    path = data('test1.o')
+    command = ReadelfCombined(path, READELF_COMBINED_COMMANDS)
+    output = subprocess.check_output(command.cmdline())
+    chunks = [io.BytesIO() for _ in READELF_COMBINED_COMMANDS]
+    assert command.split_output(output.splitlines(True), chunks)
+    for klass, chunk in zip(READELF_COMBINED_COMMANDS, chunks):
+        expected = subprocess.check_output(klass(path).cmdline())
+        assert chunk.getvalue() == expected
+
+
+@skip_unless_tools_exist('readelf')
+def test_identical_sections_are_skipped(obj1, obj2):
+    def section(obj, name):
+        return obj.as_container.get_member(name)
+    for name in ('.comment', '.eh_frame'):
+        assert section(obj1, name).has_same_content_as(section(obj2, name))
+    assert not section(obj1, '.text').has_same_content_as(section(obj2, '.text'))
+    assert not section(obj1, '.text').has_same_content_as(
+        MissingFile('/nonexisting', section(obj1, '.text')),
+    )
+
+
+def test_readelf_combined_unexpected_output():
+    command = ReadelfCombined('/nonexisting', READELF_COMBINED_COMMANDS)
+    chunks = [io.BytesIO() for _ in READELF_COMBINED_COMMANDS]
+    assert not command.split_output([b'unexpected\n'], chunks)
+    # Out of order
+    assert not command.split_output([
+        b'\n',
+        b'There is no dynamic section in this file.\n',
+        b'\n',
+        b'There are no program headers in this file.\n',
+    ], chunks)
+
+
 TEST_LIB1_PATH = data('test1.a')
 TEST_LIB2_PATH = data('test2.a')
 
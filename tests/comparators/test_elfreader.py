@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import struct
+import pytest
+import subprocess
+
+from diffoscope.comparators.utils.elfreader import ElfReader, \
+    ElfFormatError, open_elf
+
+from ..utils.data import data
+from ..utils.tools import skip_unless_tools_exist
+
+
+def make_elf(elf_class, endianness, sections):
+    """
+    Build a minimal ELF image with the given (name, type, flags, data)
+    sections, followed by a section name string table.
+    """
+    prefix = {'little': '<', 'big': '>'}[endianness]
+    header_format = {1: '16sHHIIIIIHHHHHH', 2: '16sHHIQQQIHHHHHH'}[elf_class]
+    section_format = {1: 'IIIIIIIIII', 2: 'IIQQQQIIQQ'}[elf_class]
+
+    names = b'\0'
+    name_offsets = []
+    for name, _, _, _ in sections:
+        name_offsets.append(len(names))
+        names += name + b'\0'
+    name_offsets.append(len(names))
+    names += b'.shstrtab\0'
+    sections = list(sections) + [(b'.shstrtab', 3, 0, names)]
+
+    body = b''
+    offset = struct.calcsize(prefix + header_format)
+    headers = [struct.pack(prefix + section_format, *([0] * 10))]
+    for name_offset, (_, type, flags, content) in zip(name_offsets, sections):
+        headers.append(struct.pack(
+            prefix + section_format,
+            name_offset, type, flags, 0, offset + len(body), len(content),
+            0, 0, 4, 0,
+        ))
+        body += content + b'\0' * (-len(content) % 4)
+
+    ident = b'\x7fELF' + bytes([elf_class, {'<': 1, '>': 2}[prefix], 1])
+    shoff = offset + len(body)
+    header = struct.pack(
+        prefix + header_format,
+        ident, 1, 62, 1, 0, 0, shoff, 0,
+        struct.calcsize(prefix + header_format), 0, 0,
+        struct.calcsize(prefix + section_format), len(headers),
+        len(headers) - 1,
+    )
+    return header + body + b''.join(headers)
+
+
+def make_note(endianness, name, type, desc):
+    prefix = {'little': '<', 'big': '>'}[endianness]
+    name += b'\0'
+    return struct.pack(prefix + 'III', len(name), len(desc), type) + \
+        name + b'\0' * (-len(name) % 4) + desc + b'\0' * (-len(desc) % 4)
+
+
+@pytest.mark.parametrize('elf_class', (1, 2))
+@pytest.mark.parametrize('endianness', ('little', 'big'))
+def test_sections(elf_class, endianness):
+    elf = ElfReader(make_elf(elf_class, endianness, [
+        (b'.text', 1, 0x6, b'\x90' * 10),
+        (b'.note.gnu.build-id', 7, 0x2, make_note(
+            endianness, b'GNU', 3, b'\x12\x34\xab',
+        )),
+        (b'.gnu_debuglink', 1, 0, b'foo.debug\0\0\0\xde\xad\xbe\xef'),
+        (b'.bss', 8, 0x3, b''),
+    ]))
+    assert [x.name for x in elf.sections] == [
+        '', '.text', '.note.gnu.build-id', '.gnu_debuglink', '.bss', '.shstrtab',
+    ]
+    text = elf.get_section('.text')
+    assert text.type_name == 'PROGBITS'
+    assert text.flag_letters == 'AX'
+    assert elf.section_data(text) == b'\x90' * 10
+    assert elf.get_section('.bss').type_name == 'NOBITS'
+    assert elf.get_section('.missing') is None
+    assert elf.build_id() == '1234ab'
+    assert elf.debug_link() == 'foo.debug'
+
+
+def test_no_build_id_or_debug_link():
+    elf = ElfReader(make_elf(2, 'little', [(b'.text', 1, 0x6, b'\xc3')]))
+    assert elf.build_id() is None
+    assert elf.debug_link() is None
+
+
+@pytest.mark.parametrize('content', (
+    b'',
+    b'not an ELF file',
+    b'\x7fELF\x03\x01\x01',
+    b'!<arch>\n',
+))
+def test_invalid(content):
+    with pytest.raises(ElfFormatError):
+        ElfReader(content)
+
+
+def test_truncated():
+    content = make_elf(2, 'little', [(b'.text', 1, 0x6, b'\xc3')])
+    with pytest.raises(ElfFormatError):
+        ElfReader(content[:-1])
+
+
+@skip_unless_tools_exist('readelf')
+@pytest.mark.parametrize('filename', ('test1.o', 'test1.a'))
+def test_matches_readelf(filename):
+    output = subprocess.check_output(
+        ['readelf', '--wide', '--section-headers', data(filename)],
+    ).decode('utf-8')
+    with open_elf(data(filename)) as elf:
+        for section in elf.sections[1:]:
+            assert '] {:<17} {:<15} '.format(
+                section.name,
+                section.type_name,
+            ) in output
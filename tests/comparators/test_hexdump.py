@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import os
+import subprocess
+
+from diffoscope.config import Config
+from diffoscope.difference import Difference
+from diffoscope.comparators.binary import FilesystemFile
+from diffoscope.comparators.utils.hexdump import hexdump, differing_ranges, \
+    hexdump_feeder, HEXDUMP_CHUNK_SIZE, HEXDUMP_CONTEXT_LINES, \
+    HEXDUMP_LINE_SIZE
+from diffoscope.comparators.utils.specialize import specialize
+
+from ..utils.data import data
+from ..utils.tools import skip_unless_tools_exist
+
+
+def dump(content, *args):
+    return b''.join(hexdump(io.BytesIO(content), *args))
+
+
+@skip_unless_tools_exist('xxd')
+def test_same_as_xxd(tmpdir):
+    for size in (0, 1, 5, 16, 17, 32, HEXDUMP_CHUNK_SIZE + 3):
+        path = str(tmpdir.join('file%d' % size))
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        with open(path, 'rb') as f:
+            assert b''.join(hexdump(f)) == subprocess.check_output(['xxd', path])
+
+
+def test_hexdump():
+    assert dump(b'hello') == \
+        b'00000000: 6865 6c6c 6f                             hello\n'
+
+
+def test_hexdump_range():
+    content = bytes(range(64))
+    assert dump(content, 16, 32) == \
+        b'00000010: 1011 1213 1415 1617 1819 1a1b 1c1d 1e1f  ................\n'
+
+
+def test_differing_ranges():
+    size = HEXDUMP_CHUNK_SIZE * 3
+    content1 = bytearray(size)
+    content2 = bytearray(size)
+    content2[100] = content2[HEXDUMP_CHUNK_SIZE * 2 + 1] = 1
+    ranges = differing_ranges(io.BytesIO(content1), io.BytesIO(content2))
+    margin = HEXDUMP_CONTEXT_LINES * HEXDUMP_LINE_SIZE
+    assert ranges == [
+        (0, 112 + margin),
+        (HEXDUMP_CHUNK_SIZE * 2 - margin, HEXDUMP_CHUNK_SIZE * 2 + 16 + margin),
+    ]
+
+
+def test_differing_ranges_identical():
+    with open(data('binary1'), 'rb') as f1, open(data('binary1'), 'rb') as f2:
+        assert differing_ranges(f1, f2) == []
+
+
+def test_compare_only_differing_ranges(tmpdir):
+    content = bytearray(os.urandom(HEXDUMP_CHUNK_SIZE * 2))
+    path1 = str(tmpdir.join('file1'))
+    path2 = str(tmpdir.join('file2'))
+    with open(path1, 'wb') as f:
+        f.write(content)
+    content[1000:1002] = b'XY'
+    content[50000] ^= 0xff
+    with open(path2, 'wb') as f:
+        f.write(content)
+
+    file1 = specialize(FilesystemFile(path1))
+    file2 = specialize(FilesystemFile(path2))
+    whole = Difference.from_feeder(
+        hexdump_feeder(path1), hexdump_feeder(path2), path1, path2)
+    assert file1.compare_bytes(file2).unified_diff == whole.unified_diff
+
+
+def test_compare_binary_delta(monkeypatch, tmpdir):
+    monkeypatch.setattr(Config(), 'max_diff_input_lines', 20)
+    content = os.urandom(4096)
+    path1 = str(tmpdir.join('file1'))
+    path2 = str(tmpdir.join('file2'))
+    with open(path1, 'wb') as f:
+        f.write(content)
+    with open(path2, 'wb') as f:
+        f.write(content[:1000] + b'hello' + content[1000:3000] + content[3100:])
+
+    file1 = specialize(FilesystemFile(path1))
+    file2 = specialize(FilesystemFile(path2))
+    difference = file1.compare_bytes(file2)
+    assert difference.comment == \
+        'Binary delta: 1 insert (5 bytes), 1 delete (100 bytes), 0 modify (0 bytes)'
+    assert 'Too much input' not in difference.unified_diff
+    assert '+000003e8: 6865 6c6c 6f' in difference.unified_diff
+    assert '[ delete: 0x00000bb8-0x00000c1c (100 bytes) -> ' \
+        '0x00000bbd-0x00000bbd (0 bytes) ]' in difference.unified_diff
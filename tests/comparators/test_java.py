@@ -17,14 +17,20 @@
 # You should have received a copy of the GNU General Public License
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
+import os
 import pytest
+import zipfile
 import subprocess
 
+from diffoscope import tools
 from diffoscope.config import Config
+from diffoscope.comparators import java
 from diffoscope.comparators.java import ClassFile
+from diffoscope.comparators.binary import FilesystemFile
 from diffoscope.comparators.missing_file import MissingFile
+from diffoscope.comparators.utils.specialize import specialize
 
-from ..utils.data import load_fixture, get_data
+from ..utils.data import load_fixture, get_data, data
 from ..utils.tools import skip_unless_tools_exist, skip_unless_tool_is_at_least
 
 
@@ -66,3 +72,95 @@ def test_compare_non_existing(monkeypatch, class1):
     difference = class1.compare(MissingFile('/nonexisting', class1))
     assert difference.source2 == '/nonexisting'
     assert len(difference.details) > 0
+
+
+FAKE_JAVAP = """#!/bin/sh
+echo "$@" >> {log}
+for x; do
+    case "$x" in -*) continue ;; esac
+    echo "Classfile $(realpath "$x")"
+    echo "  Last modified today; size 1 bytes"
+    echo "  MD5 checksum 0"
+    od -An -tx1 -v "$x"
+done
+"""
+
+
+def make_jar(path, classes):
+    with zipfile.ZipFile(path, 'w') as jar:
+        for name, content in classes.items():
+            jar.writestr(name, content)
+    return specialize(FilesystemFile(path))
+
+
+def javap_differences(jar1, jar2):
+    return sorted(
+        x.unified_diff
+        for x in jar1.compare(jar2).traverse_depth()
+        if x.source1.startswith('javap ')
+    )
+
+
+@pytest.fixture
+def fake_javap(monkeypatch, tmpdir):
+    log = str(tmpdir.join('log'))
+    javap = tmpdir.join('javap')
+    javap.write(FAKE_JAVAP.format(log=log))
+    javap.chmod(0o755)
+    monkeypatch.setenv('PATH', '{}:{}'.format(tmpdir, os.environ['PATH']))
+    tools.find_executable.cache_clear()
+    yield log
+    tools.find_executable.cache_clear()
+
+
+@skip_unless_tools_exist('zipinfo')
+def test_batched_javap(monkeypatch, tmpdir, fake_javap):
+    log = fake_javap
+    with open(data('Test1.class'), 'rb') as f:
+        test1 = f.read()
+    with open(data('Test2.class'), 'rb') as f:
+        test2 = f.read()
+    classes1 = {'Same.class': test1}
+    classes2 = {'Same.class': test1}
+    for x in range(10):
+        classes1['C{}.class'.format(x)] = test1 + bytes([x])
+        classes2['C{}.class'.format(x)] = (test1 if x % 2 else test2) + bytes([x])
+
+    def run():
+        if os.path.exists(log):
+            os.remove(log)
+        jar1 = make_jar(str(tmpdir.join('1.jar')), classes1)
+        jar2 = make_jar(str(tmpdir.join('2.jar')), classes2)
+        differences = javap_differences(jar1, jar2)
+        with open(log) as f:
+            return differences, f.read().splitlines()
+
+    batched, invocations = run()
+    assert len(batched) == 5
+    assert len(invocations) == 2
+    assert all(len(x.split()) == len(java.JAVAP_ARGS) - 1 + 5 for x in invocations)
+
+    monkeypatch.setattr(java, 'get_batch_outputs', lambda *args: None)
+    one_by_one, invocations = run()
+    assert len(invocations) == 10
+    assert batched == one_by_one
+
+
+def test_split_javap_output(tmpdir):
+    paths = [str(tmpdir.join('A.class')), str(tmpdir.join('B.class'))]
+    lines = [
+        b'Classfile ' + os.fsencode(os.path.realpath(paths[0])) + b'\n',
+        b'  MD5 checksum 0\n',
+        b'a\n',
+        b'Classfile ' + os.fsencode(os.path.realpath(paths[1])) + b'\n',
+        b'b\n',
+    ]
+    with open(str(tmpdir.join('out')), 'w+b') as out:
+        shards = java.split_javap_output(paths, lines, out)
+        out.seek(0)
+        assert out.read() == b'a\nb\n'
+    assert [(x.offset, x.length) for x in shards] == [(0, 2), (2, 2)]
+
+    with open(str(tmpdir.join('out')), 'w+b') as out:
+        assert java.split_javap_output(paths[::-1], lines, out) is None
+        assert java.split_javap_output(paths + paths, lines, out) is None
@@ -24,6 +24,7 @@ import subprocess
 from diffoscope.path import set_path
 from diffoscope.locale import set_locale
 from diffoscope.progress import ProgressManager
+from diffoscope.streaming import StreamManager
 from diffoscope.comparators import ComparatorManager
 
 
@@ -50,6 +51,11 @@ def reset_progress():
     ProgressManager().reset()
 
 
+@pytest.fixture(autouse=True)
+def reset_streaming():
+    StreamManager().reset()
+
+
 def pytest_report_header(config):
     if config.option.verbose == 0:
         return
@@ -18,11 +18,18 @@
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
 import io
+import sys
 import itertools
 import pytest
+import threading
+import subprocess
 
+from diffoscope import feeders
+from diffoscope.diff import reverse_unified_diff
 from diffoscope.config import Config
+from diffoscope.scheduler import Scheduler
 from diffoscope.difference import Difference
+from diffoscope.comparators.utils.command import Command
 
 
 def assert_size(diff, size):
@@ -104,3 +111,162 @@ def test_non_str_arguments_to_source1_source2():
 
         with pytest.raises(TypeError):
             Difference.from_text_readers(a, b, *x)
+
+
+def make_deep_tree(depth):
+    root = node = Difference("0", "path1", "path2")
+    for x in range(depth):
+        child = Difference("0", "path1/%d" % x, "path2/%d" % x)
+        node.add_details([child])
+        node = child
+    return root
+
+
+def test_traverse_deep_tree():
+    depth = sys.getrecursionlimit() * 2
+    diff = make_deep_tree(depth)
+    assert len(list(diff.traverse_depth())) == depth + 1
+    assert len(list(diff.traverse_depth(3))) == 4
+    assert len(list(diff.traverse_breadth())) == depth + 1
+    assert diff.equals(diff.fmap(lambda x: x))
+    assert_size(diff, sum(d.size_self() for d in diff.traverse_depth()))
+
+
+def test_traverse_wide_tree():
+    diff = Difference("0", "path1", "path2")
+    diff.add_details([
+        Difference("0", "path1/%d" % x, "path2/%d" % x) for x in range(10000)
+    ])
+    assert [d.source1 for d in diff.traverse_breadth()] == \
+        [d.source1 for d in diff.traverse_depth()]
+    assert_algebraic_properties(diff, diff.size())
+
+
+def test_fmap_order():
+    diff = make_deep_tree(2)
+    diff.add_details([Difference("0", "path1/x", "path2/x")])
+    visited = []
+
+    def f(node):
+        visited.append(node.source1)
+        return node
+    diff.fmap(f)
+    assert visited == ['path1/1', 'path1/0', 'path1/x', 'path1']
+
+
+def test_reverse_is_a_view():
+    d = Difference("@@ -1,2 +1 @@\n-a\n-b\n+c\n", "path1", "path2", comment="x")
+    d.add_details([Difference("@@ -1 +1 @@\n-d\n+e\n", "path1/a", "path2/a")])
+    r = d.get_reverse()
+    assert r.source1 == "path2"
+    assert r.unified_diff == "@@ -1 +1,2 @@\n+a\n+b\n-c\n"
+    assert list(r.unified_diff_lines()) == ["@@ -1 +1,2 @@\n", "+a\n", "+b\n", "-c\n"]
+    # Sizes come from the original, and no joined copy of the diff is kept.
+    assert r.size() == d.size()
+    assert r.unified_diff not in vars(r).values()
+    assert r.details[0].unified_diff == "@@ -1 +1 @@\n+d\n-e\n"
+    r.add_comment("y")
+    r.add_details([Difference("f", "path2/b", "path1/b")])
+    assert d.comments == ["x"]
+    assert len(d.details) == 1
+    assert_algebraic_properties(d, d.size())
+
+
+def test_reverse_keeps_line_lengths():
+    assert reverse_unified_diff("@@  -1,2  +3 @@\n-a\n") == "@@  -3  +1,2 @@\n+a\n"
+
+
+def test_map_lines_is_a_view():
+    d = Difference("-a\n+b\n", "path1", "path2", comment="c\nd")
+    m = d.map_lines(str.upper, lambda x: x * 2)
+    assert m.unified_diff == "-A\n+B\n"
+    assert m.comments == ["c\nc\ndd"]
+    assert Difference(None, "path1", "path2").map_lines(str.upper, str).unified_diff is None
+    assert m.size_self() == d.size_self() + 3
+
+
+def test_size_updates_shared_details():
+    leaf = Difference("-a\n", "path1/a", "path2/a")
+    d = Difference(None, "path1", "path2", details=[leaf])
+    m = d.map_lines(str.upper, str)
+    root = Difference(None, "path1", "path2", details=[d, m])
+    leaf.add_comment("0123456789")
+    assert_size(root, 10 + 2 * (10 + 14 + 3 + 10))
+
+    del root, m
+    leaf.add_comment("x")
+    assert len(leaf._parents) == 1
+    assert_size(d, 10 + 14 + 3 + 10 + 1)
+
+
+def test_size_updates_propagate_to_ancestors():
+    leaf = Difference("0123456789", "path1/a/b", "path2/a/b")
+    child = Difference(None, "path1/a", "path2/a", details=[leaf])
+    d = Difference("0123456789", "path1", "path2")
+    d.add_details([child])
+    assert_size(d, 20 + 14 + 28)
+    leaf.add_comment("lol1")
+    assert leaf.size_self() == 32
+    assert_size(d, 20 + 14 + 32)
+    child.add_details([Difference("0", "p1", "p2")])
+    assert_size(d, 20 + 14 + 32 + 5)
+    r = d.get_reverse()
+    assert_size(r, d.size())
+    r.details[0].add_comment("lol2")
+    assert_size(r, d.size() + 4)
+
+
+class Echo(Command):
+    # Closes stderr before exiting, and fails for "fail".
+    def cmdline(self):
+        return [
+            'sh', '-c', 'exec 2>&-; sleep 0.1; echo "$1"; test "$1" != fail',
+            'sh', self.path,
+        ]
+
+
+def test_diff_without_dev_fd(monkeypatch):
+    monkeypatch.setattr('diffoscope.diff.have_dev_fd', lambda: False)
+    difference = Difference.from_text('a\n', 'b\n', 'a', 'b')
+    assert difference.unified_diff == '@@ -1 +1 @@\n-a\n+b\n'
+
+
+def test_diff_joins_all_feeders():
+    def failing(out_file):
+        raise ValueError()
+
+    command = Echo('b')
+    command.start()
+    with pytest.raises(ValueError):
+        Difference.from_feeder(
+            failing,
+            feeders.from_command(command),
+            'a',
+            'b',
+        )
+    # The command was waited for even though the other feeder failed.
+    assert command.poll() is not None
+    assert not Scheduler()._running
+
+
+def test_from_commands_after_failures(monkeypatch):
+    monkeypatch.setattr(Config(), 'jobs', 2)
+    result = []
+
+    def run():
+        for _ in range(Config().jobs + 1):
+            with pytest.raises(subprocess.CalledProcessError):
+                Difference.from_commands([(Echo, 'fail', 'b')])
+        result.extend(Difference.from_commands([
+            (Echo, 'a', 'b'),
+            (Echo, 'c', 'c'),
+        ]))
+
+    # Used to wait forever for the slots of the failed commands.
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert not Scheduler()._running
+    assert '+b' in result[0].unified_diff
+    assert result[1] is None
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+import pytest
+import threading
+
+from diffoscope import executor
+from diffoscope.config import Config
+
+
+def test_run_all_keeps_order(monkeypatch):
+    monkeypatch.setattr(Config(), 'jobs', 4)
+
+    def f(x):
+        time.sleep(0.01 * (5 - x))
+        return x
+    assert executor.run_all((f, (x,), {}) for x in range(5)) == list(range(5))
+
+
+def test_run_all_raises(monkeypatch):
+    monkeypatch.setattr(Config(), 'jobs', 4)
+    results = []
+
+    def f(x):
+        if x == 1:
+            raise ValueError(x)
+        results.append(x)
+    with pytest.raises(ValueError):
+        executor.run_all((f, (x,), {}) for x in range(3))
+    # The other jobs still ran to completion
+    assert sorted(results) == [0, 2]
+
+
+def test_single_job_runs_inline(monkeypatch):
+    monkeypatch.setattr(Config(), 'jobs', 1)
+    future = executor.submit(threading.current_thread)
+    assert future.done()
+    assert future.result() is threading.current_thread()
+
+
+def test_nested_submit(monkeypatch):
+    monkeypatch.setattr(Config(), 'jobs', 2)
+
+    def outer(x):
+        return sum(executor.run_all((abs, (-x,), {}) for _ in range(3)))
+    assert executor.run_all((outer, (x,), {}) for x in range(4)) == \
+        [0, 3, 6, 9]
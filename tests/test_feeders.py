@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# Copyright © 2017 diffoscope contributors
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import os
+import hashlib
+
+from multiprocessing.dummy import Queue
+
+from diffoscope.config import Config
+from diffoscope.feeders import from_raw_reader, from_command, CommandPump, \
+    FEEDER_BATCH_SIZE
+from diffoscope.comparators.utils.command import Command
+
+
+class CountingWriter(io.BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        return super().write(data)
+
+
+def feed(lines):
+    out = CountingWriter()
+    end_nl = from_raw_reader(iter(lines))(out)
+    return out, end_nl
+
+
+def test_from_raw_reader_batches_writes():
+    lines = [b'%d\n' % x for x in range(10000)]
+    out, _ = feed(lines)
+    assert out.getvalue() == b''.join(lines)
+    assert out.writes < 10
+
+
+def test_from_raw_reader_long_line():
+    line = b'x' * (FEEDER_BATCH_SIZE * 3 + 1)
+    out, _ = feed([b'a\n', line, b'b\n'])
+    assert out.getvalue() == b'a\n' + line + b'b\n'
+
+
+def test_from_raw_reader_too_much_input(monkeypatch):
+    monkeypatch.setattr(Config(), 'max_diff_input_lines', 20)
+    lines = [b'%d\n' % x for x in range(30)]
+    out, end_nl = feed(lines)
+    assert out.getvalue() == b''.join(lines[:19]) + \
+        "[ Too much input for diff (SHA1: {}) ]\n".format(
+            hashlib.sha1(b''.join(lines)).hexdigest()).encode('utf-8')
+    assert end_nl
+
+
+class Seq(Command):
+    def cmdline(self):
+        return ['seq', self.path]
+
+
+def pump(command):
+    read, write = os.pipe()
+    end_nl_q = Queue()
+    command.start()
+    writer = CommandPump(command, write, end_nl_q)
+    writer.start()
+    with open(read, 'rb') as f:
+        out = f.read()
+    writer.join()
+    return out, end_nl_q.get()
+
+
+def test_command_pump_matches_feeder(monkeypatch):
+    for max_lines in (float('inf'), 20000):
+        monkeypatch.setattr(Config(), 'max_diff_input_lines', max_lines)
+        command = Seq('30000')
+        command.start()
+        expected = CountingWriter()
+        expected_end_nl = from_command(command)(expected)
+        assert pump(Seq('30000')) == (expected.getvalue(), expected_end_nl)
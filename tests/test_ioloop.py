@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import pytest
+import threading
+
+from diffoscope.ioloop import IOLoop
+from diffoscope.comparators.utils.command import Command
+
+
+def test_call_soon():
+    done = threading.Event()
+    result = []
+
+    def call(x):
+        result.append((x, threading.current_thread().name))
+        done.set()
+    IOLoop().call_soon(call, 42)
+    assert done.wait(5)
+    assert result == [(42, 'diffoscope-ioloop')]
+
+
+def test_reader():
+    read, write = os.pipe()
+    done = threading.Event()
+    chunks = []
+
+    def on_readable(fd):
+        data = os.read(fd, 4096)
+        chunks.append(data)
+        if not data:
+            IOLoop().remove_reader(fd)
+            os.close(fd)
+            done.set()
+    IOLoop().call_soon(IOLoop().add_reader, read, on_readable)
+    os.write(write, b'abc')
+    os.write(write, b'def')
+    os.close(write)
+    assert done.wait(5)
+    assert b''.join(chunks) == b'abcdef'
+
+
+class Noisy(Command):
+    def cmdline(self):
+        return ['sh', '-c', 'seq {} >&2; printf end >&2'.format(self.path)]
+
+
+@pytest.mark.parametrize('lines', [3, 100])
+def test_command_stderr(lines):
+    command = Noisy(str(lines))
+    command.start()
+    assert command.stdout.read() == b''
+    assert command.wait() == 0
+    expected = ''.join('{}\n'.format(x) for x in range(1, 51)[:lines])
+    if lines < Command.MAX_STDERR_LINES:
+        expected += 'end'
+    else:
+        expected += '[ {} lines ignored ]\n'.format(lines + 1 - Command.MAX_STDERR_LINES)
+    assert command.stderr_content == expected
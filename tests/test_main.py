@@ -134,7 +134,7 @@ def test_list_tools(capsys):
     assert ret == 0
     assert err == ''
     assert 'External-Tools-Required: ' in out
-    assert 'xxd,' in out
+    assert 'readelf,' in out
 
 
 def test_profiling(capsys):
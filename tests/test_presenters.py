@@ -20,12 +20,18 @@
 import io
 import os
 import re
+import gzip
+import json
 import pytest
 
 from diffoscope.main import main
+from diffoscope.config import Config
 from diffoscope.readers import load_diff_from_path
-from diffoscope.presenters.utils import create_limited_print_func, PrintLimitReached, PartialString
+from diffoscope.presenters.utils import create_limited_print_func, PrintLimitReached, PartialString, \
+    Presenter
 from diffoscope.presenters.json import JSONPresenter
+from diffoscope.presenters.html import html
+from diffoscope.comparators.utils import compare
 
 from .utils import diff_expand
 from .utils.data import cwd_data, data, get_data
@@ -76,6 +82,19 @@ def test_text_option_is_default(capsys):
     assert out == get_data('output.txt')
 
 
+@pytest.mark.parametrize('diff', (
+    'a\nb\n \n\n',
+    ' \n\n \na\n',
+    'a\nb\nc\nd\ne',
+    '\n \n',
+))
+def test_indent_lines(diff):
+    lines = diff.splitlines(True)
+    for batch in (1, 2, 3, 10):
+        assert '\n'.join(Presenter.indent_lines(lines, '> ', batch)) == \
+            Presenter.indent(diff, '> ')
+
+
 def test_text_proper_indentation(capsys):
     out = run(capsys, pair=('archive1.tar', 'archive2.tar'))
 
@@ -99,6 +118,24 @@ def test_text_option_with_file(tmpdir, capsys):
         assert f.read() == get_data('output.txt')
 
 
+def test_text_option_with_compressed_file(tmpdir, capsys):
+    report_path = str(tmpdir.join('report.txt.gz'))
+
+    out = run(capsys, '--text', report_path, pair=('output.json',))
+
+    assert out == ''
+
+    with gzip.open(report_path, 'rt', encoding='utf-8') as f:
+        assert f.read() == get_data('output.txt')
+
+    # No timestamp is stored, so the same report compresses the same.
+    with open(report_path, 'rb') as f:
+        compressed = f.read()
+    run(capsys, '--text', report_path, pair=('output.json',))
+    with open(report_path, 'rb') as f:
+        assert f.read() == compressed
+
+
 def test_text_option_with_stdiout(capsys):
     out = run(capsys, '--text', '-')
 
@@ -123,6 +160,14 @@ def test_json(capsys):
     assert out == get_data('output.json')
 
 
+def test_json_is_written_incrementally():
+    difference = load_diff_from_path(data('output.json'))
+    lines = []
+    JSONPresenter(lines.append).start(difference)
+    assert len(lines) > 1
+    assert '\n'.join(lines) + '\n' == get_data('output.json')
+
+
 def test_no_report_option(capsys):
     out = run(capsys)
 
@@ -178,6 +223,153 @@ def test_html_regression_875281(tmpdir, capsys):
     assert out == ''
 
 
+def read_all(directory):
+    result = {}
+    for root, _, filenames in os.walk(directory):
+        for x in filenames:
+            with open(os.path.join(root, x), 'rb') as f:
+                result[os.path.relpath(os.path.join(root, x), directory)] = f.read()
+    return result
+
+
+def test_multiple_outputs_in_one_traversal(tmpdir, capsys):
+    outputs = (
+        ('--text', 'report.txt'),
+        ('--json', 'report.json'),
+        ('--markdown', 'report.md'),
+        ('--restructured-text', 'report.rst'),
+        ('--html', 'report.html'),
+        ('--html-dir', 'html-dir'),
+    )
+    args = ('--max-text-report-size', '200')
+
+    separate, together = tmpdir.mkdir('separate'), tmpdir.mkdir('together')
+    for option, name in outputs:
+        run(capsys, option, str(separate.join(name)), *args, pair=('output.json',))
+    run(capsys, *args, *(
+        x for option, name in outputs for x in (option, str(together.join(name)))
+    ), pair=('output.json',))
+
+    separately = read_all(str(separate))
+    assert len(separately) > len(outputs)
+    assert read_all(str(together)) == separately
+
+
+@pytest.mark.parametrize('option', ('--text', '--json', '--markdown'))
+def test_stream(tmpdir, capsys, monkeypatch, option):
+    monkeypatch.setattr(Config(), 'max_text_report_size', 0)
+    pair = []
+    for name, fmt in (('a', 'line {}\n'), ('b', 'line {} changed\n')):
+        p = tmpdir.mkdir(name)
+        for x in range(4):
+            p.join(str(x)).write(''.join(fmt.format(y) for y in range(x)))
+            p.ensure_dir('sub', str(x)).join('x').write(fmt.format(x))
+        pair.append(str(p))
+    args = (option, '-', '--exclude-directory-metadata')
+    expected = run(capsys, *args, pair=tuple(pair))
+
+    # Record what has been written when the last file is about to be compared.
+    written = []
+    orig_compare_files = compare.compare_files
+
+    def compare_files(file1, file2, *args, **kwargs):
+        if file1.name == os.path.join(pair[0], 'sub', '3', 'x'):
+            written.append(capsys.readouterr().out)
+        return orig_compare_files(file1, file2, *args, **kwargs)
+    monkeypatch.setattr(compare, 'compare_files', compare_files)
+
+    out = run(capsys, '--stream', *args, pair=tuple(pair))
+    assert len(written) == 1
+    assert 'line 2 changed' in written[0]
+    assert written[0] + out == expected
+
+
+@pytest.mark.parametrize('args', (
+    (),
+    ('--max-page-diff-block-lines', '16', '--max-diff-block-lines', '40'),
+))
+def test_html_dir_jobs(tmpdir, capsys, monkeypatch, args):
+    monkeypatch.setattr(html, 'PARALLEL_MIN_SIZE', 0)
+    for x in ('jobs', 'max_page_diff_block_lines', 'max_diff_block_lines'):
+        monkeypatch.setattr(Config(), x, getattr(Config(), x))
+    pair = []
+    for name, fmt in (('a', 'line {}\n'), ('b', 'line {} changed\n')):
+        p = tmpdir.mkdir(name)
+        for x in range(5):
+            p.join(str(x)).write(''.join(fmt.format(y) for y in range(50 * x)))
+        pair.append(str(p))
+    for jobs in ('1', '3'):
+        run(capsys, '--html-dir', str(tmpdir.join(jobs)), '--jobs', jobs,
+            '--exclude-directory-metadata', *args, pair=tuple(pair))
+    assert read_all(str(tmpdir.join('3'))) == read_all(str(tmpdir.join('1')))
+
+
+def read_chunk(directory, name):
+    with gzip.open(os.path.join(directory, 'chunks', '%s.json.gz' % name)) as f:
+        return json.loads(f.read().decode('ascii'))
+
+
+def test_html_lazy_dir(tmpdir, capsys, monkeypatch):
+    monkeypatch.setattr(Config(), 'max_page_diff_block_lines',
+                        Config().max_page_diff_block_lines)
+    lazy_dir = str(tmpdir.join('target'))
+    out = run(capsys, '--html-lazy-dir', lazy_dir,
+              '--max-page-diff-block-lines', '3', pair=('output.json',))
+
+    assert out == ''
+    with open(os.path.join(lazy_dir, 'index.html'), 'r', encoding='utf-8') as f:
+        assert 'id="lazy-root"' in extract_body(f.read())
+
+    difference = load_diff_from_path(data('output.json'))
+    root = read_chunk(lazy_dir, 0)
+    assert root['source1'] == difference.source1
+    assert [x[1] for x in root['details']] == \
+        [x.source1 for x in difference.details]
+
+    index = read_chunk(lazy_dir, 'index')
+    assert index[0] == [None, difference.source1, difference.source2]
+    for number, child in zip((x[0] for x in root['details']), difference.details):
+        assert index[number][0] == 0
+        chunk = read_chunk(lazy_dir, number)
+        if child.unified_diff is None:
+            assert chunk['diff'] is None
+            continue
+        pages = [chunk['diff']] + [
+            read_chunk(lazy_dir, '%d-%d' % (number, x))
+            for x in range(1, chunk['pages'])
+        ]
+        assert '\n'.join(pages) == child.unified_diff
+
+
+def test_html_convert_lines():
+    diffon, diffoff = '\x01', '\x02'
+    assert html.convert('a\tb<c', 1) == \
+        'a<span class="diffponct">\xbb</span>' + '\xa0' * 6 + '\u200bb&lt;c'
+    assert html.convert('x' * 25) == 'x' * 21 + '\u200b' + 'x' * 4
+    assert html.convert(diffon + 'a b' + diffoff, 1, 'ins') == \
+        '<ins>a<span class="diffponct">\xb7</span>\u200bb</ins>'
+    assert html.convert('a\x05b') == 'a<em>\\x5</em>b'
+
+    # Lines converted together come out as if converted one by one, even
+    # when some of them need the slower path.
+    lines = ['a\tb', '', 'x' * 50, 'y\x05\tz', diffon + 'c\t' + diffoff, '\x0f']
+    assert html.convert_lines(lines, 1, 'del') == \
+        [html.convert(x, 1, 'del') for x in lines]
+
+
+def test_html_diff_prefix():
+    diff = '@@ -1,14 +1,13 @@\n' + ''.join('-%d\n' % x for x in range(8)) + \
+        ''.join('+%d\n' % x for x in range(6)) + ' a\n' + '-b\n' + \
+        '\\ No newline at end of file\n' + '+c\n' + ' d\n' * 4
+    lines = diff.splitlines(True)
+    for rows in range(12):
+        prefix, complete = html.diff_prefix(iter(lines), rows)
+        assert html.render_rows(prefix, False, 0, rows) == \
+            html.render_rows(diff, False, 0, rows)
+        assert complete == (prefix == diff)
+    assert html.diff_prefix(iter(lines), None) == (diff, True)
+
+
 def test_limited_print():
     def fake(x): return None
     with pytest.raises(PrintLimitReached):
@@ -220,6 +412,24 @@ def test_partial_string_cont():
     assert t.size(hole_size=5) == 27
 
 
+def test_partial_string_versions():
+    # Earlier versions stay usable after filling holes in later ones
+    children = [object() for _ in range(50)]
+    page = PartialString("[{0}]", None).pformat({None: PartialString(
+        "".join("<{%d}>" % i for i in range(len(children))), *children)})
+    versions = [page]
+    for i, x in enumerate(children):
+        versions.append(versions[-1].pformat({x: PartialString("{0}", i)}))
+    assert versions[-1].holes == tuple(range(len(children)))
+    for i, x in enumerate(versions):
+        assert x.holes == tuple(range(i)) + tuple(children[i:])
+        assert x.size(0) == 2 + 2 * len(children)
+        expected = "[%s]" % "".join("<%d>" % j for j in range(len(children)))
+        assert x.formatl(*range(i), *range(i, len(children))) == expected
+    assert versions[0].pformatl(*range(len(children))) == \
+        PartialString("[" + "".join("<%d>" % i for i in range(len(children))) + "]")
+
+
 def test_partial_string_numl():
     tmpl = PartialString.numl("{0} {1} {2}", 2, object())
     assert tmpl.holes[:2] == (0, 1)
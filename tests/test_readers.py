@@ -17,13 +17,23 @@
 # You should have received a copy of the GNU General Public License
 # along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
 
+import io
+import json
 import pytest
 
 from diffoscope.main import main
+from diffoscope.readers import binary
+from diffoscope.difference import Difference
 from diffoscope.comparators.utils.compare import compare_root_paths
 from diffoscope.readers import load_diff_from_path
+from diffoscope.compression import open_decompressed
+from diffoscope.readers.json import JSONReaderV1, JSONTokenizer
+from diffoscope.readers.utils import UnrecognizedFormatError
+from diffoscope.readers.binary import BinaryReport
+from diffoscope.presenters.json import JSONPresenter
+from diffoscope.presenters.binary import BinaryReportPresenter
 
-from .utils.data import cwd_data, get_data
+from .utils.data import cwd_data, data, get_data
 
 
 def run_read_write(capsys, diff, *args):
@@ -48,3 +58,106 @@ def run_diff_read(diffpath):
 def test_json(capsys):
     run_read_write(capsys, 'output.json', '--json', '-')
     run_diff_read('output.json')
+
+
+class SmallReads(io.StringIO):
+    def read(self, size=-1):
+        return super().read(min(size, 7))
+
+
+def test_json_read_incrementally():
+    expected = get_data('output.json')
+    diff = JSONReaderV1().load(SmallReads(expected), 'output.json')
+    lines = []
+    JSONPresenter(lines.append).start(diff)
+    assert '\n'.join(lines) + '\n' == expected
+
+
+@pytest.mark.parametrize('val', [
+    '[1, -2.5e-3, 10, true, false, null, "a\\\\\\"b", {"c": [[], {}]}]',
+    '1234567890',
+])
+def test_json_tokenizer(val):
+    assert JSONTokenizer(SmallReads(val), chunk_size=3).read_value() == \
+        json.loads(val)
+
+
+@pytest.mark.parametrize('val, exc', [
+    ('[]', UnrecognizedFormatError),
+    ('{"source1": "a", "source2": "b", "unified_diff": null}', UnrecognizedFormatError),
+    ('{"source1": "a", "source2": ', UnrecognizedFormatError),
+    ('{"diffoscope-json-version": 2, "source1": ', UnrecognizedFormatError),
+    ('{"diffoscope-json-version": 1, "source1": "a"', ValueError),
+    ('{"diffoscope-json-version": 1, "source1": "a}', ValueError),
+])
+def test_json_invalid(val, exc):
+    with pytest.raises(exc):
+        JSONReaderV1().load(io.StringIO(val), 'invalid.json')
+
+
+def test_binary_report(capsys, tmpdir):
+    report = str(tmpdir.join('output.bin'))
+    with pytest.raises(SystemExit) as exc:
+        main((data('output.json'), '--binary-report', report))
+    assert exc.value.code == 1
+
+    with pytest.raises(SystemExit):
+        main((report, '--json', '-'))
+    out, err = capsys.readouterr()
+    assert out == get_data('output.json')
+
+
+@pytest.mark.parametrize('suffix', ('.gz', '.xz'))
+@pytest.mark.parametrize('option', ('--json', '--binary-report'))
+def test_compressed_report(capsys, tmpdir, option, suffix):
+    report = str(tmpdir.join('output' + suffix))
+    with pytest.raises(SystemExit) as exc:
+        main((data('output.json'), option, report))
+    assert exc.value.code == 1
+
+    with open(report, 'rb') as fp:
+        assert open_decompressed(fp) is not None
+
+    with pytest.raises(SystemExit):
+        main((report, '--json', '-'))
+    out, err = capsys.readouterr()
+    assert out == get_data('output.json')
+
+
+def test_binary_report_random_access():
+    diff = load_diff_from_path(data('output.json'))
+    output = io.BytesIO()
+    BinaryReportPresenter(output).start(diff)
+    report = BinaryReport(output.getvalue())
+
+    assert len(report) == len(list(diff.traverse_breadth()))
+    for number, node in enumerate(diff.traverse_breadth()):
+        assert report.lookup(report.path(number)) == number
+        assert report.unified_diff(number) == node.unified_diff
+        assert ''.join(report.unified_diff_lines(number)) == \
+            (node.unified_diff or '')
+        assert report.difference(number).equals(node)
+    assert report.lookup(['does-not-exist']) is None
+
+
+def test_binary_report_streams_unified_diff(monkeypatch):
+    monkeypatch.setattr(binary, 'BLOB_CHUNK_SIZE', 7)
+    diff = Difference(
+        ''.join('-\xe9{0}\n+\xfc{0}\n'.format(x) for x in range(1000)),
+        'a',
+        'b',
+        comment='c',
+    )
+    output = io.BytesIO()
+    BinaryReportPresenter(output).start(diff)
+    difference = BinaryReport(output.getvalue()).difference()
+
+    assert list(difference.unified_diff_lines()) == \
+        list(diff.unified_diff_lines())
+    assert difference._unified_diff_size() == len(diff.unified_diff)
+    assert difference.get_reverse().size() == diff.size()
+
+
+def test_binary_report_invalid():
+    with pytest.raises(UnrecognizedFormatError):
+        BinaryReport(b'DFSCOPE\x00' + b'\x00' * 64)
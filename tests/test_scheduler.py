@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+# diffoscope: in-depth comparison of files, archives, and directories
+#
+# diffoscope is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# diffoscope is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with diffoscope.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import pytest
+import threading
+import subprocess
+
+from diffoscope import scheduler
+from diffoscope.config import Config
+from diffoscope.scheduler import Scheduler
+
+
+@pytest.fixture(autouse=True)
+def empty_scheduler():
+    # Don't depend on whether tests run before ours gave up all their slots,
+    # but make sure ours do.
+    Scheduler().reset()
+    yield
+    assert not Scheduler()._running
+
+
+def acquire_in_thread(tool):
+    result = {}
+
+    def run():
+        result['slot'] = Scheduler().acquire(tool)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, result
+
+
+def test_slot_limit(monkeypatch):
+    monkeypatch.setattr(Config(), 'jobs', 1)
+    with Scheduler().slot('readelf'):
+        # Processes started by the same thread are not held back...
+        with Scheduler().slot('diff'):
+            pass
+        # ...but other threads have to wait.
+        thread, result = acquire_in_thread('objdump')
+        thread.join(0.3)
+        assert thread.is_alive()
+    thread.join(5)
+    assert not thread.is_alive()
+    Scheduler().release(result['slot'])
+
+
+def test_weights(monkeypatch):
+    monkeypatch.setattr(Config(), 'jobs', 3)
+    assert scheduler.tool_weight('/usr/bin/apktool') > 3
+    with Scheduler().slot('readelf'):
+        thread, result = acquire_in_thread('apktool')
+        thread.join(0.3)
+        assert thread.is_alive()
+    thread.join(5)
+    Scheduler().release(result['slot'])
+
+
+def test_memory_budget(monkeypatch):
+    monkeypatch.setattr(Config(), 'jobs', 4)
+    monkeypatch.setattr(Config(), 'max_process_memory', 1)
+    with Scheduler().slot('sleep') as slot:
+        slot.pid = os.getpid()
+        assert scheduler.process_rss(slot.pid) > 1
+        thread, result = acquire_in_thread('readelf')
+        thread.join(0.3)
+        assert thread.is_alive()
+    thread.join(5)
+    assert not thread.is_alive()
+    Scheduler().release(result['slot'])
+
+
+def test_subprocess_wrappers():
+    assert scheduler.check_output(['echo', 'foo']) == b'foo\n'
+    assert scheduler.call(['false']) == 1
+    assert scheduler.check_call(['true']) == 0
+    with pytest.raises(subprocess.CalledProcessError):
+        scheduler.check_call(['false'])
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        scheduler.check_output(['sh', '-c', 'echo bar; exit 2'])
+    assert e.value.output == b'bar\n'